@@ -1,3 +1,4 @@
+from datetime import timedelta
 from pathlib import Path
 
 
@@ -24,6 +25,7 @@ INSTALLED_APPS = [
     'corsheaders',
     'rest_framework',
     'rest_framework.authtoken',
+    'rest_framework_simplejwt.token_blacklist',
     'core',
 ]
 
@@ -59,7 +61,8 @@ TEMPLATES = [
 # Configuración de REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'core.autenticacion.TokenCacheadoAuthentication',
+        'core.autenticacion.JWTCacheadoAuthentication',
         #'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -67,6 +70,99 @@ REST_FRAMEWORK = {
     ]
 }
 
+# Búsqueda de productos. Backends disponibles en core.busqueda.backends:
+#   IndiceMemoriaBackend  -> índice invertido en memoria (por defecto)
+#   MySQLFulltextBackend  -> índice FULLTEXT de alkosto_db
+#   SQLiteFTS5Backend     -> tabla virtual FTS5 (pruebas / despliegues pequeños)
+#   OrmBackend            -> icontains (sin índice, solo como respaldo)
+# Las correcciones ("quisiste decir") salen del índice en memoria: con FTS5,
+# FULLTEXT u ORM /api/buscar/ no sugiere nada.
+BUSQUEDA = {
+    'BACKEND': 'core.busqueda.backends.IndiceMemoriaBackend',
+    # Cuántos resultados devuelve /api/buscar/ al ordenar por relevancia
+    'RESULTADOS_RELEVANCIA': 48,
+    # BM25 (K1, B, PESOS_CAMPOS) e impulsos de negocio; ver core.busqueda.ranking
+    'RELEVANCIA': {
+        'IMPULSO_VENTAS': 0.05,
+        'IMPULSO_DESTACADO': 0.1,
+        'IMPULSO_CALIFICACION': 0.02,
+    },
+    # Grupos de sinónimos: buscar cualquiera de las palabras encuentra a las demás
+    'SINONIMOS': [
+        ['celular', 'smartphone'],
+        ['portatil', 'laptop'],
+        ['nevera', 'refrigerador'],
+    ],
+    # Bordes de los rangos de precio de las facetas (el último rango queda abierto)
+    'FACETAS': {
+        'RANGOS_PRECIO': [0, 200000, 500000, 1000000, 2000000, 5000000],
+    },
+    # /api/buscar/autocompletar/: sugerencias por tipo y segundos entre sincronizaciones con la BD
+    'AUTOCOMPLETAR': {
+        'LIMITE': 5,
+        'SINCRONIZAR_CADA': 2.0,
+    },
+}
+
+# Respuestas cacheadas de los endpoints de catálogo (ver core.cache). Se invalidan
+# por versión de modelo; el TIMEOUT (segundos) acota lo que puede durar una
+# respuesta vieja tras una escritura sin señales (QuerySet.update, bulk_create, SQL).
+# Nivel local por proceso: MAX_BYTES y TIMEOUT_LOCAL; ESPERA_CALCULO es cuánto
+# espera un worker el resultado que otro está calculando antes de calcularlo él.
+CACHE_RESPUESTAS = {
+    'TIMEOUT': 10 * 60,
+    'MAX_BYTES': 32 * 1024 * 1024,
+    'TIMEOUT_LOCAL': 300,
+    'ESPERA_CALCULO': 5.0,
+    # Listados con stale-while-revalidate (ProductoViewSet.list, /api/categoria/<slug>/):
+    # pasado TTL_SUAVE se sirve la copia y se refresca en fondo; si la BD falla, hasta TTL_DURO
+    'REVALIDACION': {
+        'TTL_SUAVE': 30,
+        'TTL_DURO': 60 * 60,
+    },
+}
+
+# Credenciales que emiten login y registro: 'token' (authtoken) o 'jwt' (SIMPLE_JWT).
+# Ambos esquemas se aceptan siempre en Authorization ("Token ..." / "Bearer ...").
+# En modo 'jwt' el logout revoca el access token anotándolo en CACHES['default'],
+# que por eso tiene que ser compartido: con un cache por proceso el token seguiría
+# valiendo en los otros workers hasta vencer (ACCESS_TOKEN_LIFETIME).
+AUTENTICACION = {
+    'MODO': 'token',
+}
+
+# Access tokens cortos y refresh tokens que rotan: el refresh usado (o el del
+# logout) queda en la lista negra de token_blacklist
+SIMPLE_JWT = {
+    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=5),
+    'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
+    'ROTATE_REFRESH_TOKENS': True,
+    'BLACKLIST_AFTER_ROTATION': True,
+    'UPDATE_LAST_LOGIN': False,
+    'USER_ID_FIELD': 'id_usuario',
+    'AUTH_HEADER_TYPES': ('Bearer',),
+    # Cambiar la contraseña invalida todos los JWT emitidos antes
+    'CHECK_REVOKE_TOKEN': True,
+}
+
+# Token -> usuario cacheado (ver core.autenticacion). TIMEOUT_LOCAL acota cuánto
+# puede seguir aceptando un worker un token revocado en otro.
+CACHE_TOKENS = {
+    'TIMEOUT': 15 * 60,
+    'MAX_BYTES': 8 * 1024 * 1024,
+    'TIMEOUT_LOCAL': 5,
+}
+
+# Vencimiento de los tokens de authtoken (ver core.autenticacion): vencen tras TTL
+# segundos sin usarse; el último uso se anota como mucho cada PRECISION_USO
+# segundos y se escribe en lote. `python manage.py limpiar_tokens` borra los
+# vencidos de a LOTE por transacción.
+EXPIRACION_TOKENS = {
+    'TTL': 14 * 24 * 60 * 60,
+    'PRECISION_USO': 5 * 60,
+    'LOTE': 1000,
+}
+
 CSRF_COOKIE_HTTPONLY = False
 WSGI_APPLICATION = 'alkosto_backend.wsgi.application'
 CORS_ALLOW_CREDENTIALS = True
@@ -74,6 +170,12 @@ CORS_ALLOW_CREDENTIALS = True
 # Permitir todas las conexiones del frontend (en desarrollo)
 CORS_ALLOW_ALL_ORIGINS = True
 
+# Las sesiones solo guardan el id del carrito anónimo (ver core.carrito) y el
+# login por sesión del admin: en una cookie firmada no cuestan escrituras en la
+# base de datos. Con una cache compartida (Redis, Memcached) configurada en
+# CACHES, 'django.contrib.sessions.backends.cache' también sirve.
+SESSION_ENGINE = 'django.contrib.sessions.backends.signed_cookies'
+
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
@@ -89,6 +191,84 @@ DATABASES = {
     }
 }
 
+# Cache compartido por todos los workers y procesos: guarda las versiones de las
+# respuestas cacheadas (core.cache), los token buckets de login y registro
+# (core.limites), los JWT revocados (core.autenticacion) y el turno de purga.
+# El de Django por defecto (LocMemCache) es de cada proceso y no sirve para nada
+# de eso; `python manage.py check --deploy` lo avisa (ver core.checks).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://localhost:6379/1',
+    }
+}
+
+
+# Último acceso de los usuarios escrito en lote (ver core.escritura_diferida): se
+# vacía al terminar una petición cada INTERVALO segundos o al juntar MAX_PENDIENTES
+ESCRITURA_DIFERIDA = {
+    'INTERVALO': 5.0,
+    'MAX_PENDIENTES': 1000,
+}
+
+# Hash de contraseñas (ver core.hashing): scrypt con parámetros elegidos por
+# `python manage.py ajustar_hasher`, en un pool de HILOS con COLA acotada; si no
+# hay lugar en ESPERA_COLA segundos se responde 503 con Retry-After.
+# PBKDF2 queda para verificar los hashes existentes, que se migran al iniciar sesión.
+PASSWORD_HASHERS = [
+    'core.hashing.ScryptAjustadoPasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+]
+
+HASH_PASSWORD = {
+    'HILOS': 4,
+    'COLA': 16,
+    'ESPERA_COLA': 2.0,
+    'SCRYPT': {
+        'WORK_FACTOR': 2 ** 14,
+        'BLOCK_SIZE': 8,
+        'PARALLELISM': 1,
+    },
+}
+
+# Reservas de stock de los carritos (ver core.reservas): cada item aparta sus
+# unidades por TTL segundos desde su último cambio; `python manage.py
+# liberar_reservas` devuelve las vencidas de a LOTE items por transacción.
+RESERVAS = {
+    'TTL': 15 * 60,
+    'LOTE': 500,
+}
+
+# Purga de carritos anónimos abandonados y sesiones vencidas (ver core.purga):
+# `python manage.py purgar_carritos` borra los carritos sin cambios en EDAD
+# segundos de a LOTE filas por transacción, con PAUSA segundos entre lotes. Con
+# INTERVALO, además, un worker purga LOTES_POR_TURNO lotes cada INTERVALO segundos.
+PURGA_CARRITOS = {
+    'EDAD': 30 * 24 * 60 * 60,
+    'LOTE': 1000,
+    'PAUSA': 0.1,
+    'INTERVALO': None,
+    'LOTES_POR_TURNO': 1,
+}
+
+# Intentos de login y registro (ver core.limites): token bucket por IP y por email
+# de CAPACIDAD intentos que se recarga en PERIODO segundos; al agotarse se
+# responde 429 con Retry-After sin llegar a derivar la contraseña. La IP es
+# REMOTE_ADDR; detrás de un proxy (nginx, balanceador) hay que declarar en
+# REST_FRAMEWORK['NUM_PROXIES'] cuántos completan X-Forwarded-For.
+LIMITE_AUTENTICACION = {
+    'ACTIVO': True,
+    'LOGIN': {
+        'IP': {'CAPACIDAD': 30, 'PERIODO': 60},
+        'EMAIL': {'CAPACIDAD': 10, 'PERIODO': 10 * 60},
+    },
+    'REGISTRO': {
+        'IP': {'CAPACIDAD': 20, 'PERIODO': 60 * 60},
+        'EMAIL': {'CAPACIDAD': 5, 'PERIODO': 60 * 60},
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'alkosto_backend.settings')
 
 application = get_wsgi_application()
+
+# Construir el índice de búsqueda antes de atender la primera petición
+from core.busqueda import precalentar  # noqa: E402
+
+precalentar()
@@ -0,0 +1,315 @@
+"""
+Autenticación del API: tokens de `authtoken` con cache y modo JWT.
+
+`TokenAuthentication` de DRF consulta `authtoken_token` JOIN `usuarios` en
+cada petición autenticada. `TokenCacheadoAuthentication` resuelve el token
+desde el cache de dos niveles (ver `core.cache.niveles`): un LRU acotado en
+bytes por proceso delante del cache de Django, así que en régimen estable
+autenticar no cuesta consultas.
+
+Con `settings.AUTENTICACION['MODO'] = 'jwt'` el login y el registro emiten
+en cambio un access token corto y un refresh token que rota en cada uso
+(simplejwt, ver `SIMPLE_JWT`). `JWTCacheadoAuthentication` valida la firma
+sin base de datos, consulta la lista de revocados (access tokens cerrados
+con logout) en el cache de Django y toma el usuario del mismo cache de dos
+niveles. La lista solo vale para todos los workers si `CACHES['default']`
+es compartido (Redis, Memcached); con uno por proceso, un access cerrado en
+un worker se sigue aceptando en los demás hasta que vence. Ambos esquemas
+se aceptan siempre, para poder cambiar de modo sin cerrar las sesiones
+abiertas.
+
+En el cache solo hay valores planos: del token, su usuario, su emisión y su
+último uso; del usuario, sus campos sin la contraseña y la huella que
+simplejwt usa para invalidar los JWT al cambiarla. Cada petición arma con
+ellos instancias nuevas (`from_db`), así que los hilos no comparten objetos
+que puedan modificar, y la contraseña queda diferida: se consulta solo si
+se usa (p. ej. al cambiarla).
+
+Las entradas se invalidan (ver `core.signals`) cuando:
+- se borra o regenera el token (logout),
+- se guarda o se borra el usuario (cambio de contraseña, desactivación,
+  edición de perfil).
+
+La invalidación borra el nivel compartido y el LRU del proceso que escribe;
+los demás workers pueden seguir aceptando el token hasta `TIMEOUT_LOCAL`
+segundos, que por eso es corto.
+
+Los tokens de `authtoken` vencen tras `EXPIRACION_TOKENS['TTL']` segundos
+sin usarse (`UsoToken.ultimo_uso`; sin ese registro, desde
+`Token.created`). El último uso se anota como mucho una vez cada
+`PRECISION_USO` segundos por token y se escribe en lote con la escritura
+diferida (ver `core.escritura_diferida`), así que autenticar sigue sin
+escribir en la base de datos en cada petición. Un token vencido se rechaza,
+el login emite otro y `python manage.py limpiar_tokens` borra los vencidos
+en lotes.
+"""
+
+import hashlib
+import time
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import router, transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .cache import CacheDosNiveles
+from .escritura_diferida import buffer_usos_token
+
+MODO_TOKEN = 'token'
+MODO_JWT = 'jwt'
+
+PREFIJO = 'token'
+PREFIJO_USUARIO = 'usuario'
+PREFIJO_REVOCADO = 'jwt:revocado'
+MAX_BYTES_POR_DEFECTO = 8 * 1024 * 1024
+TIMEOUT_POR_DEFECTO = 15 * 60
+TIMEOUT_LOCAL_POR_DEFECTO = 5
+TTL_POR_DEFECTO = 14 * 24 * 60 * 60
+PRECISION_USO_POR_DEFECTO = 5 * 60
+LOTE_LIMPIEZA_POR_DEFECTO = 1000
+
+
+def parametros():
+    return getattr(settings, 'CACHE_TOKENS', {})
+
+
+def parametros_expiracion():
+    return getattr(settings, 'EXPIRACION_TOKENS', {})
+
+
+def modo():
+    """'token' (claves de `authtoken`) o 'jwt'."""
+    return getattr(settings, 'AUTENTICACION', {}).get('MODO', MODO_TOKEN)
+
+
+def emitir_credenciales(user):
+    """Las credenciales que devuelven login y registro según el modo configurado."""
+    if modo() == MODO_JWT:
+        refresh = RefreshToken.for_user(user)
+        return {'access': str(refresh.access_token), 'refresh': str(refresh)}
+    token = Token.objects.select_related('uso').filter(user=user).first()
+    if token is not None and token_vencido(datos_token(token)):
+        token.delete()
+        token = None
+    if token is None:
+        token, _ = Token.objects.get_or_create(user=user)
+    return {'token': token.key}
+
+
+def datos_token(token):
+    """Lo que se cachea de un token (con `uso` precargado): usuario, emisión y último uso."""
+    uso = getattr(token, 'uso', None)
+    return {
+        'id_usuario': token.user_id,
+        'creado': token.created,
+        'ultimo_uso': None if uso is None else uso.ultimo_uso,
+    }
+
+
+def ultimo_uso(datos):
+    """Último uso según `datos_token`; sin registro, la emisión."""
+    return datos['ultimo_uso'] or datos['creado']
+
+
+def token_vencido(datos, ahora=None):
+    ttl = timedelta(seconds=parametros_expiracion().get('TTL', TTL_POR_DEFECTO))
+    return ultimo_uso(datos) + ttl <= (ahora or timezone.now())
+
+
+def limpiar_tokens_vencidos(lote=None):
+    """
+    Borra los tokens vencidos de a `lote` por transacción (cortas, para no
+    retener bloqueos); devuelve cuántos se borraron.
+    """
+    from .models import UsoToken
+
+    lote = lote or parametros_expiracion().get('LOTE', LOTE_LIMPIEZA_POR_DEFECTO)
+    # Los usos pendientes de este proceso cuentan antes de decidir
+    buffer_usos_token().vaciar()
+    limite = timezone.now() - timedelta(seconds=parametros_expiracion().get('TTL', TTL_POR_DEFECTO))
+    borrados = 0
+    for vencidos in (
+        # Por el índice de `ultimo_uso`, y los emitidos antes de registrar usos
+        UsoToken.objects.filter(ultimo_uso__lt=limite).order_by('ultimo_uso').values_list('token', flat=True),
+        Token.objects.filter(uso__isnull=True, created__lt=limite).values_list('key', flat=True),
+    ):
+        while True:
+            with transaction.atomic():
+                claves = list(vencidos[:lote])
+                if claves:
+                    borrados += Token.objects.filter(key__in=claves).delete()[1].get(Token._meta.label, 0)
+            if len(claves) < lote:
+                break
+    return borrados
+
+
+@lru_cache(maxsize=None)
+def cache_tokens():
+    """Instancia (única por proceso) configurada con `settings.CACHE_TOKENS`."""
+    return CacheDosNiveles(
+        max_bytes=parametros().get('MAX_BYTES', MAX_BYTES_POR_DEFECTO),
+        timeout_local=parametros().get('TIMEOUT_LOCAL', TIMEOUT_LOCAL_POR_DEFECTO),
+    )
+
+
+def clave_token(key):
+    # El token en claro no se usa como clave del cache compartido
+    return f'{PREFIJO}:{hashlib.sha256(key.encode()).hexdigest()}'
+
+
+def invalidar_token(key):
+    cache_tokens().delete(clave_token(key))
+
+
+def invalidar_usuario(id_usuario):
+    cache_tokens().delete(f'{PREFIJO_USUARIO}:{id_usuario}')
+
+
+def datos_usuario(id_usuario):
+    """
+    Campos del usuario con ese id (sin la contraseña) y la huella de su
+    contraseña, o None; leídos del cache de dos niveles.
+    """
+    return cache_tokens().obtener_o_calcular(
+        f'{PREFIJO_USUARIO}:{id_usuario}', lambda: _consultar_usuario(id_usuario),
+        timeout=parametros().get('TIMEOUT', TIMEOUT_POR_DEFECTO)
+    )
+
+
+def usuario_cacheado(id_usuario):
+    """Instancia nueva del usuario con ese id (o None) armada desde el cache."""
+    datos = datos_usuario(id_usuario)
+    return None if datos is None else _armar_usuario(datos)
+
+
+def _consultar_usuario(id_usuario):
+    modelo = get_user_model()
+    user = modelo.objects.filter(**{jwt_settings.USER_ID_FIELD: id_usuario}).first()
+    if user is None:
+        return None
+    return {
+        'campos': {
+            campo.attname: getattr(user, campo.attname)
+            for campo in modelo._meta.concrete_fields if campo.name != 'password'
+        },
+        'huella_password': get_md5_hash_password(user.password),
+    }
+
+
+def _armar_usuario(datos):
+    # La contraseña queda diferida: solo se consulta si se usa
+    modelo = get_user_model()
+    campos = datos['campos']
+    return modelo.from_db(router.db_for_read(modelo), list(campos), list(campos.values()))
+
+
+def revocar_acceso(token):
+    """Rechaza un access token hasta que expire por sí solo (logout)."""
+    restante = int(token['exp'] - time.time())
+    if restante > 0:
+        cache.set(f'{PREFIJO_REVOCADO}:{token[jwt_settings.JTI_CLAIM]}', 1, timeout=restante)
+
+
+def acceso_revocado(token):
+    return cache.get(f'{PREFIJO_REVOCADO}:{token[jwt_settings.JTI_CLAIM]}') is not None
+
+
+def cerrar_credenciales(user, acceso, refresh=None):
+    """
+    Logout en ambos modos: borra las claves de `authtoken`, revoca el access
+    token con que se autenticó la petición y pone el refresh en la lista negra.
+    """
+    Token.objects.filter(user=user).delete()
+    if isinstance(acceso, AccessToken):
+        revocar_acceso(acceso)
+    if refresh:
+        try:
+            RefreshToken(refresh).blacklist()
+        except TokenError as error:
+            raise InvalidToken(error.args[0])
+
+
+class TokenCacheadoAuthentication(TokenAuthentication):
+    """`TokenAuthentication` que resuelve token -> usuario desde el cache."""
+
+    def authenticate_credentials(self, key):
+        datos = cache_tokens().obtener_o_calcular(
+            clave_token(key), lambda: self.consultar_token(key),
+            timeout=parametros().get('TIMEOUT', TIMEOUT_POR_DEFECTO)
+        )
+        if datos is None:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        user = usuario_cacheado(datos['id_usuario'])
+        if user is None or not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        ahora = timezone.now()
+        if token_vencido(datos, ahora):
+            raise exceptions.AuthenticationFailed(_('Token vencido, inicia sesión de nuevo.'))
+        self.registrar_uso(key, datos, ahora)
+        model = self.get_model()
+        token = model.from_db(
+            router.db_for_read(model), ['key', 'user_id', 'created'], [key, user.pk, datos['creado']]
+        )
+        token.user = user
+        return (user, token)
+
+    def consultar_token(self, key):
+        """Usuario, emisión y último uso del token, o None si no existe (lo que no se cachea)."""
+        token = self.get_model().objects.select_related('uso').filter(key=key).first()
+        return None if token is None else datos_token(token)
+
+    def registrar_uso(self, key, datos, ahora):
+        anterior = datos['ultimo_uso']
+        precision = parametros_expiracion().get('PRECISION_USO', PRECISION_USO_POR_DEFECTO)
+        if anterior is None or (ahora - anterior).total_seconds() < precision:
+            return
+        # Pendiente de escribir en lote; se cachea una copia con el uso nuevo
+        # (la leída puede estar en manos de otros hilos) para que los demás
+        # workers no vean el plazo anterior
+        buffer_usos_token().registrar(key, ultimo_uso=ahora)
+        cache_tokens().set(
+            clave_token(key), {**datos, 'ultimo_uso': ahora},
+            timeout=parametros().get('TIMEOUT', TIMEOUT_POR_DEFECTO)
+        )
+
+
+class JWTCacheadoAuthentication(JWTAuthentication):
+    """`JWTAuthentication` sin consultas: revocados y usuarios salen del cache."""
+
+    def get_validated_token(self, raw_token):
+        token = super().get_validated_token(raw_token)
+        if acceso_revocado(token):
+            raise InvalidToken(_('Token revocado'))
+        return token
+
+    def get_user(self, validated_token):
+        try:
+            id_usuario = validated_token[jwt_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        datos = datos_usuario(id_usuario)
+        if datos is None:
+            raise exceptions.AuthenticationFailed(_('User not found'), code='user_not_found')
+        user = _armar_usuario(datos)
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        if jwt_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+            jwt_settings.REVOKE_TOKEN_CLAIM
+        ) != datos['huella_password']:
+            raise exceptions.AuthenticationFailed(
+                _("The user's password has been changed."), code='password_changed'
+            )
+        return user
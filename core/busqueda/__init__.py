@@ -0,0 +1,93 @@
+"""
+Subsistema de búsqueda de productos.
+
+Las vistas solo usan `filtrar_por_texto`, `rankear_por_relevancia`,
+`sugerir_correccion`, `autocompletar`, `contar_facetas` y
+`paginar_catalogo`; el backend
+concreto (índice en memoria, FTS5, FULLTEXT u ORM) se elige en
+`settings.BUSQUEDA['BACKEND']`.
+"""
+
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.utils.module_loading import import_string
+
+from .autocompletar import indice_autocompletado
+from .columnas import catalogo_columnar, filtros_desde_parametros
+from .indice import indice_productos
+
+BACKEND_POR_DEFECTO = 'core.busqueda.backends.IndiceMemoriaBackend'
+RESULTADOS_RELEVANCIA_POR_DEFECTO = 48
+
+
+@lru_cache(maxsize=None)
+def obtener_backend():
+    """Instancia (única por proceso) del backend configurado."""
+    ruta = getattr(settings, 'BUSQUEDA', {}).get('BACKEND', BACKEND_POR_DEFECTO)
+    return import_string(ruta)()
+
+
+def filtrar_por_texto(queryset, consulta):
+    """Restringe `queryset` a los productos cuyo texto coincide con `consulta`."""
+    return obtener_backend().filtrar(queryset, consulta)
+
+
+def rankear_por_relevancia(queryset, consulta, limite=None):
+    """
+    Top-`limite` de `queryset` ordenado por relevancia para `consulta`, como
+    `(lista, total)`, o None si el backend configurado no puntúa.
+    """
+    if limite is None:
+        limite = getattr(settings, 'BUSQUEDA', {}).get(
+            'RESULTADOS_RELEVANCIA', RESULTADOS_RELEVANCIA_POR_DEFECTO
+        )
+    return obtener_backend().rankear(queryset, consulta, limite)
+
+
+def sugerir_correccion(consulta):
+    """
+    Consulta corregida ("did you mean") por el backend configurado, o None;
+    solo el índice en memoria sugiere (ver `core.busqueda.backends`).
+    """
+    return obtener_backend().sugerir(consulta)
+
+
+def autocompletar(consulta, limite=None):
+    """Productos, categorías y marcas que empiezan por `consulta`, por ventas (solo memoria)."""
+    return indice_autocompletado.completar(consulta, limite)
+
+
+def contar_facetas(parametros, consulta=None):
+    """
+    Conteos por categoría, marca, oferta, disponibilidad y rango de precio para
+    los filtros de `parametros` (query params) y el texto `consulta`, desde la
+    instantánea columnar en memoria.
+    """
+    ids = obtener_backend().ids(consulta) if consulta else None
+    return catalogo_columnar.facetas(filtros_desde_parametros(parametros), ids)
+
+
+def paginar_catalogo(parametros, campos, despues=None, limite=24):
+    """
+    Ids de una página del listado de productos filtrado por `parametros`
+    (los de `ProductoViewSet`, incluido `search`) y ordenado por `campos`,
+    resuelta en el catálogo columnar. None si algún campo de orden no está
+    en columnas (p. ej. `nombre`) y hay que ir a la base de datos.
+    """
+    if not catalogo_columnar.puede_ordenar(campos):
+        return None
+    consulta = parametros.get('search')
+    ids = obtener_backend().ids(consulta) if consulta else None
+    return catalogo_columnar.pagina(filtros_desde_parametros(parametros), campos, ids, despues, limite)
+
+
+def precalentar():
+    """Prepara el backend al arrancar el proceso; si la BD no responde se hará en la primera búsqueda."""
+    try:
+        obtener_backend().precalentar()
+        indice_autocompletado.construir()
+        catalogo_columnar.construir()
+    except DatabaseError:
+        pass
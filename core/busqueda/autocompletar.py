@@ -0,0 +1,360 @@
+"""
+Autocompletado de la caja de búsqueda (productos, categorías y marcas).
+
+Cada tipo de sugerencia vive en un trie de palabras: una entrada ("Smart TV
+Samsung 55") se cuelga de cada una de sus palabras, así que "sam" y "tv" la
+encuentran. Cada nodo guarda su top-K por ventas, de modo que una consulta de
+una palabra es un recorrido de `len(prefijo)` nodos sin tocar la base de datos.
+
+Las categorías y marcas pesan lo que suman las ventas de sus productos
+activos; ese agregado se ajusta con cada fila de producto que cambia.
+
+Mantenimiento:
+- Las señales de `Producto`, `Categoria` y `Marca` (ver `core.signals`)
+  actualizan el índice al confirmarse cada escritura.
+- Para cambios que no pasan por señales, el índice se sincroniza por firma del
+  catálogo (ver `core.busqueda.catalogo`) como mucho cada
+  `BUSQUEDA['AUTOCOMPLETAR']['SINCRONIZAR_CADA']` segundos, para que cada
+  tecla no pague consultas a la base de datos.
+"""
+
+import bisect
+import heapq
+import time
+from collections import Counter, namedtuple
+
+from django.conf import settings
+
+from ..models import Categoria, Marca
+from .catalogo import IndiceCatalogo
+from .texto import tokenizar
+
+# Sugerencias que guarda cada nodo (máximo que se puede pedir por tipo)
+CAPACIDAD = 10
+
+PARAMETROS_POR_DEFECTO = {
+    'LIMITE': 5,
+    'SINCRONIZAR_CADA': 2.0,
+}
+
+Entrada = namedtuple('Entrada', 'peso palabras datos')
+
+
+def parametros():
+    return {**PARAMETROS_POR_DEFECTO, **getattr(settings, 'BUSQUEDA', {}).get('AUTOCOMPLETAR', {})}
+
+
+class _Nodo:
+    __slots__ = ('hijos', 'claves', 'mejores', 'sucio')
+
+    def __init__(self):
+        self.hijos = {}
+        # Entradas con una palabra que termina exactamente en este nodo
+        self.claves = set()
+        # Top-CAPACIDAD del subárbol como (-peso, clave), ordenado
+        self.mejores = []
+        self.sucio = False
+
+
+class TrieAutocompletado:
+    """Trie de palabras con top-K por nodo. No es thread-safe por sí solo."""
+
+    def __init__(self, capacidad=CAPACIDAD):
+        self.capacidad = capacidad
+        self._raiz = _Nodo()
+        self._entradas = {}
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def poner(self, clave, texto, peso, datos, diferido=False):
+        """
+        Agrega o actualiza una entrada. Con `diferido` los nodos tocados quedan
+        marcados para recalcular (carga masiva; ver `recalcular`).
+        """
+        palabras = frozenset(tokenizar(texto))
+        anterior = self._entradas.get(clave)
+        if anterior is not None and (anterior.palabras != palabras or peso < anterior.peso):
+            # Bajar de peso o cambiar de palabras puede sacarla de algún top-K: se recalcula
+            self.quitar(clave)
+        self._entradas[clave] = Entrada(peso, palabras, datos)
+        for palabra in palabras:
+            nodo = self._raiz
+            for caracter in palabra:
+                hijo = nodo.hijos.get(caracter)
+                if hijo is None:
+                    hijo = nodo.hijos[caracter] = _Nodo()
+                nodo = hijo
+                if diferido:
+                    nodo.sucio = True
+                else:
+                    self._ofrecer(nodo, clave, peso)
+            nodo.claves.add(clave)
+
+    def quitar(self, clave):
+        entrada = self._entradas.pop(clave, None)
+        if entrada is None:
+            return
+        for palabra in entrada.palabras:
+            camino = [self._raiz]
+            for caracter in palabra:
+                camino.append(camino[-1].hijos[caracter])
+            camino[-1].claves.discard(clave)
+            for nodo in camino[1:]:
+                if any(otra == clave for _, otra in nodo.mejores):
+                    nodo.sucio = True
+            # Podar las ramas que quedaron vacías
+            for posicion in range(len(palabra), 0, -1):
+                nodo = camino[posicion]
+                if nodo.hijos or nodo.claves:
+                    break
+                del camino[posicion - 1].hijos[palabra[posicion - 1]]
+
+    def recalcular(self):
+        """Recalcula los top-K pendientes (después de una carga diferida)."""
+        for hijo in self._raiz.hijos.values():
+            if hijo.sucio:
+                self._recalcular(hijo)
+
+    def completar(self, terminos, limite):
+        """
+        Datos de las `limite` entradas de más peso que tienen, para cada término,
+        alguna palabra que empieza por él.
+        """
+        nodo = self._nodo(terminos[-1])
+        if nodo is None:
+            return []
+        if nodo.sucio:
+            self._recalcular(nodo)
+        previos = terminos[:-1]
+        if not previos:
+            return [self._entradas[clave].datos for _, clave in nodo.mejores[:limite]]
+
+        # El top-K del último término filtrado es exacto si alcanza para `limite`
+        seleccion = [
+            clave for _, clave in nodo.mejores
+            if self._coincide(self._entradas[clave], previos)
+        ]
+        if len(seleccion) < limite and len(nodo.mejores) == self.capacidad:
+            # Si no alcanza, se recorren las entradas del término previo más largo
+            selectivo = self._nodo(max(previos, key=len))
+            if selectivo is None:
+                return []
+            claves = self._claves_bajo(selectivo)
+            seleccion = [
+                clave for _, clave in heapq.nsmallest(
+                    limite,
+                    ((-self._entradas[clave].peso, clave) for clave in claves
+                     if self._coincide(self._entradas[clave], terminos))
+                )
+            ]
+        return [self._entradas[clave].datos for clave in seleccion[:limite]]
+
+    # Internos
+
+    def _ofrecer(self, nodo, clave, peso):
+        if nodo.sucio:
+            return
+        mejores = nodo.mejores
+        for posicion, (_, otra) in enumerate(mejores):
+            if otra == clave:
+                del mejores[posicion]
+                break
+        candidato = (-peso, clave)
+        if len(mejores) < self.capacidad or candidato < mejores[-1]:
+            bisect.insort(mejores, candidato)
+            del mejores[self.capacidad:]
+
+    def _recalcular(self, nodo):
+        # El top-K de un nodo sale de los top-K de sus hijos y de sus propias entradas
+        candidatos = {clave: -self._entradas[clave].peso for clave in nodo.claves}
+        for hijo in nodo.hijos.values():
+            if hijo.sucio:
+                self._recalcular(hijo)
+            for peso, clave in hijo.mejores:
+                candidatos[clave] = peso
+        nodo.mejores = heapq.nsmallest(
+            self.capacidad, ((peso, clave) for clave, peso in candidatos.items())
+        )
+        nodo.sucio = False
+
+    def _nodo(self, prefijo):
+        nodo = self._raiz
+        for caracter in prefijo:
+            nodo = nodo.hijos.get(caracter)
+            if nodo is None:
+                return None
+        return nodo
+
+    @staticmethod
+    def _claves_bajo(nodo):
+        claves = set()
+        pila = [nodo]
+        while pila:
+            actual = pila.pop()
+            claves.update(actual.claves)
+            pila.extend(actual.hijos.values())
+        return claves
+
+    @staticmethod
+    def _coincide(entrada, terminos):
+        return all(
+            any(palabra.startswith(termino) for palabra in entrada.palabras)
+            for termino in terminos
+        )
+
+
+class IndiceAutocompletado(IndiceCatalogo):
+    """Tries de productos, categorías y marcas, pesados por `total_ventas`."""
+
+    columnas = IndiceCatalogo.columnas + ('nombre', 'total_ventas', 'id_categoria_id', 'id_marca_id')
+
+    def __init__(self):
+        super().__init__()
+        self._productos = TrieAutocompletado()
+        self._categorias = TrieAutocompletado()
+        self._marcas = TrieAutocompletado()
+        # id_producto -> (id_categoria, id_marca, ventas) de los productos activos
+        self._filas = {}
+        self._ventas_categoria = Counter()
+        self._ventas_marca = Counter()
+        self._datos_categoria = {}
+        self._datos_marca = {}
+        self._ultima_sincronizacion = None
+
+    def construir(self):
+        super().construir()
+        self._sincronizar_nombres()
+
+    def completar(self, consulta, limite=None):
+        """Sugerencias para `consulta` agrupadas por tipo."""
+        config = parametros()
+        limite = min(max(limite or config['LIMITE'], 1), CAPACIDAD)
+        terminos = tokenizar(consulta)
+        if not terminos:
+            return {'productos': [], 'categorias': [], 'marcas': []}
+        ahora = time.monotonic()
+        if (not self._construido or self._ultima_sincronizacion is None
+                or ahora - self._ultima_sincronizacion >= config['SINCRONIZAR_CADA']):
+            self._ultima_sincronizacion = ahora
+            self.sincronizar()
+            self._sincronizar_nombres()
+        with self._lock:
+            return {
+                'productos': self._productos.completar(terminos, limite),
+                'categorias': self._categorias.completar(terminos, limite),
+                'marcas': self._marcas.completar(terminos, limite),
+            }
+
+    def indexar_categoria(self, categoria):
+        with self._lock:
+            if self._construido:
+                self._poner_categoria(categoria.pk, categoria.nombre, categoria.slug, categoria.activa)
+
+    def eliminar_categoria(self, id_categoria):
+        with self._lock:
+            if self._construido:
+                self._poner_categoria(id_categoria, None, None, False)
+
+    def indexar_marca(self, marca):
+        with self._lock:
+            if self._construido:
+                self._poner_marca(marca.pk, marca.nombre, marca.activa)
+
+    def eliminar_marca(self, id_marca):
+        with self._lock:
+            if self._construido:
+                self._poner_marca(id_marca, None, False)
+
+    def _sincronizar_nombres(self):
+        """Recarga nombres de categorías y marcas activas (tablas pequeñas) y aplica las diferencias."""
+        categorias = {
+            id_categoria: (nombre, slug)
+            for id_categoria, nombre, slug in Categoria.objects.filter(activa=True).values_list(
+                'id_categoria', 'nombre', 'slug'
+            )
+        }
+        marcas = dict(Marca.objects.filter(activa=True).values_list('id_marca', 'nombre'))
+        with self._lock:
+            for id_categoria in set(self._datos_categoria) - set(categorias):
+                self._poner_categoria(id_categoria, None, None, False)
+            for id_categoria, (nombre, slug) in categorias.items():
+                anterior = self._datos_categoria.get(id_categoria)
+                if anterior is None or (anterior['nombre'], anterior['slug']) != (nombre, slug):
+                    self._poner_categoria(id_categoria, nombre, slug, True)
+            for id_marca in set(self._datos_marca) - set(marcas):
+                self._poner_marca(id_marca, None, False)
+            for id_marca, nombre in marcas.items():
+                anterior = self._datos_marca.get(id_marca)
+                if anterior is None or anterior['nombre'] != nombre:
+                    self._poner_marca(id_marca, nombre, True)
+
+    # Internos (se llaman con el lock tomado)
+
+    def _reiniciar(self):
+        self._productos = TrieAutocompletado()
+        self._categorias = TrieAutocompletado()
+        self._marcas = TrieAutocompletado()
+        self._filas = {}
+        self._ventas_categoria = Counter()
+        self._ventas_marca = Counter()
+        self._datos_categoria = {}
+        self._datos_marca = {}
+
+    def _completar_construccion(self):
+        self._productos.recalcular()
+
+    def _aplicar_fila(self, fila, incremental):
+        id_producto, activo, _, nombre, ventas, id_categoria, id_marca = fila
+        self._retirar(id_producto, incremental)
+        if not activo:
+            return
+        ventas = ventas or 0
+        self._filas[id_producto] = (id_categoria, id_marca, ventas)
+        self._productos.poner(
+            id_producto, nombre, ventas,
+            {'id_producto': id_producto, 'nombre': nombre},
+            diferido=not incremental
+        )
+        self._sumar_ventas(id_categoria, id_marca, ventas, incremental)
+
+    def _retirar(self, id_producto, incremental):
+        fila = self._filas.pop(id_producto, None)
+        if fila is None:
+            return
+        self._productos.quitar(id_producto)
+        id_categoria, id_marca, ventas = fila
+        self._sumar_ventas(id_categoria, id_marca, -ventas, incremental)
+
+    def _sumar_ventas(self, id_categoria, id_marca, ventas, publicar):
+        self._ventas_categoria[id_categoria] += ventas
+        if id_marca is not None:
+            self._ventas_marca[id_marca] += ventas
+        if publicar and ventas:
+            datos = self._datos_categoria.get(id_categoria)
+            if datos is not None:
+                self._categorias.poner(id_categoria, datos['nombre'], self._ventas_categoria[id_categoria], datos)
+            datos = self._datos_marca.get(id_marca)
+            if datos is not None:
+                self._marcas.poner(id_marca, datos['nombre'], self._ventas_marca[id_marca], datos)
+
+    def _poner_categoria(self, id_categoria, nombre, slug, activa):
+        if not activa:
+            self._datos_categoria.pop(id_categoria, None)
+            self._categorias.quitar(id_categoria)
+            return
+        datos = {'id_categoria': id_categoria, 'nombre': nombre, 'slug': slug}
+        self._datos_categoria[id_categoria] = datos
+        self._categorias.poner(id_categoria, nombre, self._ventas_categoria[id_categoria], datos)
+
+    def _poner_marca(self, id_marca, nombre, activa):
+        if not activa:
+            self._datos_marca.pop(id_marca, None)
+            self._marcas.quitar(id_marca)
+            return
+        datos = {'id_marca': id_marca, 'nombre': nombre}
+        self._datos_marca[id_marca] = datos
+        self._marcas.poner(id_marca, nombre, self._ventas_marca[id_marca], datos)
+
+
+indice_autocompletado = IndiceAutocompletado()
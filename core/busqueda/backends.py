@@ -0,0 +1,136 @@
+"""
+Backends intercambiables para la búsqueda de texto de productos.
+
+El backend activo se elige con `settings.BUSQUEDA['BACKEND']`:
+
+- `IndiceMemoriaBackend`: índice invertido en memoria del proceso (por defecto).
+- `SQLiteFTS5Backend`: tabla virtual FTS5 `productos_fts` (pruebas y despliegues pequeños).
+- `MySQLFulltextBackend`: índice FULLTEXT sobre `productos` (producción).
+- `OrmBackend`: los `icontains` de siempre, portable pero con recorrido completo.
+
+Solo `IndiceMemoriaBackend` sugiere correcciones ("quisiste decir"): salen de
+su índice de trigramas, y mantenerlo en los demás backends costaría la
+memoria y la sincronización que ellos existen para evitar.
+
+Las tablas/índices de los backends SQL los crean las migraciones
+`0003_busqueda_sqlite_fts5` y `0004_busqueda_mysql_fulltext`.
+"""
+
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from ..models import Producto
+from .indice import CAMPOS_INDEXADOS, indice_productos
+from .texto import analizar, variantes
+
+
+class BackendBusqueda:
+    """Interfaz común: restringir un queryset de `Producto` a un texto de búsqueda."""
+
+    def filtrar(self, queryset, consulta):
+        raise NotImplementedError
+
+    def ids(self, consulta):
+        """Ids de los productos activos que coinciden con `consulta`."""
+        productos = self.filtrar(Producto.objects.filter(activo=True), consulta)
+        return set(productos.values_list('id_producto', flat=True))
+
+    def rankear(self, queryset, consulta, limite):
+        """
+        Los `limite` productos de `queryset` (ya filtrado por texto) más relevantes
+        para `consulta`, como `(lista, total)`. None si el backend no sabe puntuar.
+        """
+        return None
+
+    def sugerir(self, consulta):
+        """Consulta corregida si algún término no existe, o None si no hace falta o no se sabe."""
+        return None
+
+    def precalentar(self):
+        """Preparar estructuras antes de la primera petición (opcional)."""
+
+
+class OrmBackend(BackendBusqueda):
+    """Fallback portable: OR de `icontains` sobre los campos de texto."""
+
+    def filtrar(self, queryset, consulta):
+        return queryset.filter(self.condicion(consulta))
+
+    @staticmethod
+    def condicion(texto):
+        condicion = Q()
+        for campo in CAMPOS_INDEXADOS:
+            condicion |= Q(**{f'{campo}__icontains': texto})
+        return condicion
+
+
+class IndiceMemoriaBackend(BackendBusqueda):
+    """Índice invertido en memoria (ver `core.busqueda.indice`)."""
+
+    def filtrar(self, queryset, consulta):
+        ids = indice_productos.buscar(consulta)
+        if ids is None:
+            return queryset.none()
+        return queryset.filter(id_producto__in=ids)
+
+    def ids(self, consulta):
+        return indice_productos.buscar(consulta) or set()
+
+    def rankear(self, queryset, consulta, limite):
+        candidatos = list(queryset.values_list('id_producto', flat=True))
+        mejores = indice_productos.mejores(consulta, candidatos, limite)
+        productos = queryset.in_bulk(mejores)
+        return [productos[i] for i in mejores if i in productos], len(candidatos)
+
+    def sugerir(self, consulta):
+        return indice_productos.sugerir(consulta)
+
+    def precalentar(self):
+        indice_productos.construir()
+
+
+class SQLiteFTS5Backend(BackendBusqueda):
+    """Consulta la tabla virtual `productos_fts` (contenido externo sobre `productos`)."""
+
+    tabla = 'productos_fts'
+
+    def filtrar(self, queryset, consulta):
+        terminos = analizar(consulta)
+        if not terminos:
+            return queryset.none()
+        # Cada raíz como prefijo (OR con sus sinónimos); FTS5 combina los grupos con AND
+        expresion = ' '.join(
+            '(' + ' OR '.join(f'"{variante}"*' for variante in variantes(termino)) + ')'
+            for termino in terminos
+        )
+        return queryset.filter(id_producto__in=RawSQL(
+            f'SELECT rowid FROM {self.tabla} WHERE {self.tabla} MATCH %s', [expresion]
+        ))
+
+
+class MySQLFulltextBackend(BackendBusqueda):
+    """`MATCH ... AGAINST` en modo booleano sobre el índice FULLTEXT de `productos`."""
+
+    # innodb_ft_min_token_size por defecto; términos más cortos no están en el índice
+    longitud_minima = 3
+
+    def filtrar(self, queryset, consulta):
+        terminos = analizar(consulta)
+        if not terminos:
+            return queryset.none()
+        indexables = [t for t in terminos if len(t) >= self.longitud_minima]
+        for termino in terminos:
+            if len(termino) < self.longitud_minima:
+                # Términos cortos ("tv", "4k") no están en el índice: resolverlos con el ORM
+                queryset = queryset.filter(OrmBackend.condicion(termino))
+        if not indexables:
+            return queryset
+        expresion = ' '.join(
+            '+(' + ' '.join(f'{variante}*' for variante in variantes(termino)) + ')'
+            for termino in indexables
+        )
+        columnas = ', '.join(CAMPOS_INDEXADOS)
+        return queryset.extra(
+            where=[f'MATCH ({columnas}) AGAINST (%s IN BOOLEAN MODE)'],
+            params=[expresion]
+        )
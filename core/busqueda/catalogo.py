@@ -0,0 +1,146 @@
+"""
+Base de los índices en memoria alimentados con filas de `Producto`.
+
+Cada índice declara las columnas que necesita y cómo aplicar/retirar una fila;
+esta clase se encarga de la construcción completa y de la sincronización por
+"firma" (máximo id y máxima fecha de actualización), que detecta escrituras que
+no pasan por señales: `bulk_create`, otros procesos/workers o rollbacks.
+
+La firma sale de los índices de `id_producto` y `updated_at`, y dentro de una
+petición se calcula una sola vez (ver `abrir_ronda`): buscar, corregir,
+rankear y contar facetas sincronizan cada uno su índice, pero comparten la
+misma consulta.
+"""
+
+import threading
+
+from django.db.models import Max, Q
+
+from ..models import Producto
+
+# Firma memorizada durante la petición en curso del hilo (ver core.signals)
+_ronda = threading.local()
+
+
+def abrir_ronda():
+    """Desde aquí hasta `cerrar_ronda`, la firma del catálogo se consulta una sola vez."""
+    _ronda.activa = True
+    _ronda.firma = None
+
+
+def cerrar_ronda():
+    _ronda.activa = False
+    _ronda.firma = None
+
+
+def firma_catalogo():
+    """Máximo id y máxima fecha de actualización de `productos`."""
+    activa = getattr(_ronda, 'activa', False)
+    if activa and _ronda.firma is not None:
+        return _ronda.firma
+    firma = Producto.objects.aggregate(
+        ultimo_id=Max('id_producto'),
+        ultima_modificacion=Max('updated_at')
+    )
+    if activa:
+        _ronda.firma = firma
+    return firma
+
+
+class IndiceCatalogo:
+    """Índice derivado del catálogo que se mantiene al día por deltas."""
+
+    # Las tres primeras columnas son fijas; las subclases agregan las suyas
+    columnas = ('id_producto', 'activo', 'updated_at')
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._construido = False
+        self._ultimo_id = None
+        self._ultima_modificacion = None
+
+    def construir(self):
+        """Reconstruye el índice completo desde la base de datos."""
+        filas = Producto.objects.values_list(*self.columnas)
+        with self._lock:
+            self._reiniciar()
+            self._ultimo_id = None
+            self._ultima_modificacion = None
+            for fila in filas.iterator(chunk_size=2000):
+                self._aplicar(fila, incremental=False)
+            self._completar_construccion()
+            self._construido = True
+
+    def indexar(self, producto):
+        """
+        Agrega o actualiza un producto (los inactivos se retiran del índice).
+        No mueve la firma: escrituras de otros workers anteriores a esta aún
+        deben llegar por `sincronizar`, que reaplicará esta fila sin costo extra.
+        """
+        fila = tuple(getattr(producto, columna) for columna in self.columnas)
+        with self._lock:
+            if self._construido:
+                self._aplicar_fila(fila, incremental=True)
+
+    def eliminar(self, id_producto):
+        """Retira un producto del índice."""
+        with self._lock:
+            if self._construido:
+                self._retirar(id_producto, incremental=True)
+
+    def sincronizar(self):
+        """
+        Compara la firma del catálogo con la del índice y aplica solo los cambios.
+        Si la firma retrocede (rollback, borrado masivo) se reconstruye completo.
+        """
+        firma = firma_catalogo()
+        with self._lock:
+            if not self._construido:
+                necesita_reconstruir = True
+            elif (firma['ultimo_id'], firma['ultima_modificacion']) == (
+                self._ultimo_id, self._ultima_modificacion
+            ):
+                return
+            else:
+                necesita_reconstruir = (
+                    firma['ultimo_id'] is None
+                    or self._ultimo_id is None
+                    or self._ultima_modificacion is None
+                    or firma['ultimo_id'] < self._ultimo_id
+                    or firma['ultima_modificacion'] < self._ultima_modificacion
+                )
+            desde_id = self._ultimo_id
+            desde_fecha = self._ultima_modificacion
+
+        if necesita_reconstruir:
+            self.construir()
+            return
+
+        cambios = Producto.objects.filter(
+            Q(updated_at__gte=desde_fecha) | Q(id_producto__gt=desde_id)
+        ).values_list(*self.columnas)
+        with self._lock:
+            for fila in cambios:
+                self._aplicar(fila, incremental=True)
+
+    def _aplicar(self, fila, incremental):
+        id_producto, _, modificado = fila[:3]
+        self._aplicar_fila(fila, incremental)
+        if self._ultimo_id is None or id_producto > self._ultimo_id:
+            self._ultimo_id = id_producto
+        if modificado and (self._ultima_modificacion is None or modificado > self._ultima_modificacion):
+            self._ultima_modificacion = modificado
+
+    # A implementar por cada índice (se llaman con el lock tomado)
+
+    def _reiniciar(self):
+        raise NotImplementedError
+
+    def _completar_construccion(self):
+        """Trabajo diferido al final de `construir` (ordenar, agregar, etc.)."""
+
+    def _aplicar_fila(self, fila, incremental):
+        raise NotImplementedError
+
+    def _retirar(self, id_producto, incremental):
+        raise NotImplementedError
@@ -0,0 +1,328 @@
+"""
+Instantánea columnar del catálogo activo: facetas y listados sin SQL.
+
+Cada atributo filtrable u ordenable de `Producto` vive en un arreglo NumPy
+(una posición por producto). Con eso:
+
+- Los conteos por categoría, marca, destacado, oferta, disponibilidad y rango
+  de precio salen de máscaras booleanas y `bincount` vectorizados, en lugar
+  de un GROUP BY por faceta. Las facetas son disyuntivas: cada una se cuenta
+  con todos los filtros del contexto excepto el suyo, para que el cliente vea
+  cuántos productos tendría al cambiar esa opción.
+- Los filtros y órdenes de `ProductoViewSet` se evalúan como máscaras más
+  `argpartition`/`lexsort` sobre los candidatos, respetando el cursor de la
+  paginación keyset; a la base de datos solo se le piden las filas de la
+  página (ver `PaginacionKeyset.paginate_catalogo`).
+
+La instantánea se mantiene al día igual que el índice de búsqueda: señales en
+cada save/delete y sincronización por firma del catálogo (ver
+`core.busqueda.catalogo`). Las bajas dejan la posición libre para reutilizarla.
+"""
+
+import calendar
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+
+import numpy as np
+from django.conf import settings
+
+from .catalogo import IndiceCatalogo
+
+RANGOS_PRECIO_POR_DEFECTO = (0, 200000, 500000, 1000000, 2000000, 5000000)
+
+_CAPACIDAD_INICIAL = 1024
+
+# Atributo -> tipo de cada columna
+_COLUMNAS_NUMPY = {
+    '_id': np.int64,
+    '_precio': np.float64,
+    '_categoria': np.int64,
+    '_marca': np.int64,
+    '_disponible': np.int64,
+    '_destacado': bool,
+    '_oferta': bool,
+    '_ventas': np.int64,
+    '_calificacion': np.float64,
+    '_creado': np.int64,
+    '_vivo': bool,
+}
+
+# Campos de `Producto` por los que se puede ordenar en memoria
+_COLUMNAS_ORDEN = {
+    'id_producto': '_id',
+    'precio': '_precio',
+    'total_ventas': '_ventas',
+    'calificacion_promedio': '_calificacion',
+    'created_at': '_creado',
+}
+
+FiltrosCatalogo = namedtuple(
+    'FiltrosCatalogo',
+    'categoria marca precio_min precio_max destacados oferta disponible',
+    defaults=(None, None, None, None, False, False, False)
+)
+
+
+def _entero(valor):
+    try:
+        return int(valor) if valor not in (None, '') else None
+    except (TypeError, ValueError):
+        # Un id que no es número no coincide con ningún producto
+        return -1
+
+
+def _precio(valor):
+    try:
+        return float(Decimal(valor)) if valor not in (None, '') else None
+    except (InvalidOperation, TypeError, ValueError):
+        return None
+
+
+def _bandera(valor):
+    return bool(valor) and str(valor).lower() == 'true'
+
+
+def _microsegundos(fecha):
+    """Fecha como microsegundos desde la época (exacto, sin pasar por float)."""
+    return calendar.timegm(fecha.utctimetuple()) * 1000000 + fecha.microsecond
+
+
+def _numero(campo, valor):
+    """Valor de un campo de `Producto` en la escala de su columna."""
+    if campo == 'created_at':
+        return _microsegundos(valor)
+    return float(valor) if isinstance(valor, Decimal) else valor
+
+
+def filtros_desde_parametros(parametros):
+    """Los filtros de `ProductoViewSet.get_queryset` leídos de los query params."""
+    return FiltrosCatalogo(
+        categoria=_entero(parametros.get('categoria')),
+        marca=_entero(parametros.get('marca')),
+        precio_min=_precio(parametros.get('precio_min')),
+        precio_max=_precio(parametros.get('precio_max')),
+        destacados=_bandera(parametros.get('destacados')),
+        oferta=_bandera(parametros.get('oferta')),
+        disponible=_bandera(parametros.get('disponible')),
+    )
+
+
+class CatalogoColumnar(IndiceCatalogo):
+    """Columnas NumPy de los productos activos, con posiciones reutilizables."""
+
+    columnas = IndiceCatalogo.columnas + (
+        'precio', 'id_categoria_id', 'id_marca_id', 'stock', 'stock_reservado', 'destacado', 'en_oferta',
+        'total_ventas', 'calificacion_promedio', 'created_at',
+    )
+
+    def __init__(self):
+        super().__init__()
+        self._reiniciar()
+
+    # Consultas
+
+    def facetas(self, filtros, ids=None):
+        """
+        Conteos por faceta para `filtros` (y, si se da, restringidos a `ids`,
+        p. ej. las coincidencias de una búsqueda de texto).
+        """
+        self.sincronizar()
+        bordes = np.asarray(
+            getattr(settings, 'BUSQUEDA', {}).get('FACETAS', {}).get(
+                'RANGOS_PRECIO', RANGOS_PRECIO_POR_DEFECTO
+            ),
+            dtype=np.float64
+        )
+        with self._lock:
+            n = self._tope
+            precio = self._precio[:n]
+            categoria = self._categoria[:n]
+            marca = self._marca[:n]
+            destacado = self._destacado[:n]
+            oferta = self._oferta[:n]
+            disponible = self._disponible[:n] > 0
+
+            base = self._vivo[:n].copy()
+            if ids is not None:
+                base &= self._en(ids, n)
+            mascaras = self._mascaras(filtros, n)
+
+            def sin(faceta):
+                mascara = base.copy()
+                for nombre, otra in mascaras.items():
+                    if nombre != faceta and otra is not None:
+                        mascara &= otra
+                return mascara
+
+            todos = sin(None)
+            en_rango = sin('rangos_precio')
+            por_categoria = np.bincount(categoria[sin('categorias')])
+            por_marca = np.bincount(marca[sin('marcas')])
+            con_destacado = sin('destacados')
+            con_oferta = sin('oferta')
+            con_disponible = sin('disponible')
+            por_rango = np.bincount(
+                np.searchsorted(bordes, precio[en_rango], side='right'), minlength=len(bordes) + 1
+            )
+            precios = precio[en_rango]
+
+        return {
+            'total': int(todos.sum()),
+            'categorias': self._conteos(por_categoria, 'id_categoria'),
+            'marcas': self._conteos(por_marca, 'id_marca'),
+            'destacados': self._si_no(destacado[con_destacado]),
+            'oferta': self._si_no(oferta[con_oferta]),
+            'disponible': self._si_no(disponible[con_disponible]),
+            'rangos_precio': [
+                {
+                    'desde': float(bordes[i - 1]) if i else None,
+                    'hasta': float(bordes[i]) if i < len(bordes) else None,
+                    'cantidad': int(cantidad),
+                }
+                for i, cantidad in enumerate(por_rango) if cantidad
+            ],
+            'precio_min': float(precios.min()) if precios.size else None,
+            'precio_max': float(precios.max()) if precios.size else None,
+        }
+
+    @staticmethod
+    def puede_ordenar(campos):
+        return all(campo.lstrip('-') in _COLUMNAS_ORDEN for campo in campos)
+
+    def pagina(self, filtros, campos, ids=None, despues=None, limite=24):
+        """
+        Ids (en orden) de hasta `limite` productos que cumplen `filtros`, están
+        en `ids` si se da, y van después de los valores `despues` (cursor)
+        según `campos` (p. ej. `('-precio', '-id_producto')`).
+        """
+        self.sincronizar()
+        with self._lock:
+            n = self._tope
+            mascara = self._vivo[:n].copy()
+            if ids is not None:
+                mascara &= self._en(ids, n)
+            for otra in self._mascaras(filtros, n).values():
+                if otra is not None:
+                    mascara &= otra
+            posiciones = np.flatnonzero(mascara)
+
+            # Claves con signo: en orden descendente se niega la columna y todo es "mayor que"
+            signos = [-1 if campo.startswith('-') else 1 for campo in campos]
+            claves = [
+                signo * getattr(self, _COLUMNAS_ORDEN[campo.lstrip('-')])[posiciones]
+                for campo, signo in zip(campos, signos)
+            ]
+            if despues is not None:
+                posteriores = np.zeros(posiciones.size, dtype=bool)
+                iguales = np.ones(posiciones.size, dtype=bool)
+                for campo, signo, clave, valor in zip(campos, signos, claves, despues):
+                    valor = signo * _numero(campo.lstrip('-'), valor)
+                    posteriores |= iguales & (clave > valor)
+                    iguales &= clave == valor
+                posiciones = posiciones[posteriores]
+                claves = [clave[posteriores] for clave in claves]
+
+            if posiciones.size > limite:
+                # Solo se ordenan los candidatos que pueden entrar en la página (empates incluidos)
+                umbral = np.partition(claves[0], limite - 1)[limite - 1]
+                dentro = claves[0] <= umbral
+                posiciones = posiciones[dentro]
+                claves = [clave[dentro] for clave in claves]
+            orden = np.lexsort(claves[::-1])[:limite]
+            return self._id[posiciones[orden]].tolist()
+
+    def _mascaras(self, filtros, n):
+        """Una máscara por faceta (None si el filtro no está activo)."""
+        return {
+            'categorias': self._categoria[:n] == filtros.categoria if filtros.categoria is not None else None,
+            'marcas': self._marca[:n] == filtros.marca if filtros.marca is not None else None,
+            'rangos_precio': self._mascara_precio(self._precio[:n], filtros),
+            'destacados': self._destacado[:n] if filtros.destacados else None,
+            'oferta': self._oferta[:n] if filtros.oferta else None,
+            'disponible': self._disponible[:n] > 0 if filtros.disponible else None,
+        }
+
+    def _en(self, ids, n):
+        return np.isin(self._id[:n], np.fromiter(ids, dtype=np.int64, count=len(ids)))
+
+    @staticmethod
+    def _mascara_precio(precio, filtros):
+        if filtros.precio_min is None and filtros.precio_max is None:
+            return None
+        mascara = np.ones(precio.shape, dtype=bool)
+        if filtros.precio_min is not None:
+            mascara &= precio >= filtros.precio_min
+        if filtros.precio_max is not None:
+            mascara &= precio <= filtros.precio_max
+        return mascara
+
+    @staticmethod
+    def _conteos(por_id, clave):
+        ids = np.flatnonzero(por_id)
+        # El id 0 agrupa los productos sin marca
+        ids = ids[ids > 0]
+        orden = np.argsort(-por_id[ids], kind='stable')
+        return [{clave: int(i), 'cantidad': int(por_id[i])} for i in ids[orden]]
+
+    @staticmethod
+    def _si_no(valores):
+        si = int(np.count_nonzero(valores))
+        return {'si': si, 'no': int(valores.size - si)}
+
+    # Internos (se llaman con el lock tomado)
+
+    def _reiniciar(self):
+        self._posiciones = {}
+        self._libres = []
+        self._tope = 0
+        for atributo, tipo in _COLUMNAS_NUMPY.items():
+            setattr(self, atributo, np.zeros(_CAPACIDAD_INICIAL, dtype=tipo))
+
+    def _aplicar_fila(self, fila, incremental):
+        (id_producto, activo, _, precio, id_categoria, id_marca, stock, reservado, destacado,
+         en_oferta, ventas, calificacion, creado) = fila
+        if not activo:
+            self._retirar(id_producto, incremental)
+            return
+        posicion = self._posiciones.get(id_producto)
+        if posicion is None:
+            posicion = self._reservar()
+            self._posiciones[id_producto] = posicion
+        self._id[posicion] = id_producto
+        self._precio[posicion] = float(precio or 0)
+        self._categoria[posicion] = id_categoria
+        self._marca[posicion] = id_marca or 0
+        # Disponible es lo que no apartaron los carritos (ver core.reservas)
+        self._disponible[posicion] = (stock or 0) - (reservado or 0)
+        self._destacado[posicion] = bool(destacado)
+        self._oferta[posicion] = bool(en_oferta)
+        self._ventas[posicion] = ventas or 0
+        self._calificacion[posicion] = float(calificacion or 0)
+        self._creado[posicion] = _microsegundos(creado) if creado else 0
+        self._vivo[posicion] = True
+
+    def _retirar(self, id_producto, incremental):
+        posicion = self._posiciones.pop(id_producto, None)
+        if posicion is None:
+            return
+        self._vivo[posicion] = False
+        self._libres.append(posicion)
+
+    def _reservar(self):
+        if self._libres:
+            return self._libres.pop()
+        if self._tope == len(self._id):
+            self._crecer()
+        self._tope += 1
+        return self._tope - 1
+
+    def _crecer(self):
+        capacidad = len(self._id) * 2
+        for atributo in _COLUMNAS_NUMPY:
+            anterior = getattr(self, atributo)
+            nuevo = np.zeros(capacidad, dtype=anterior.dtype)
+            nuevo[:len(anterior)] = anterior
+            setattr(self, atributo, nuevo)
+
+
+catalogo_columnar = CatalogoColumnar()
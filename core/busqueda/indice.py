@@ -0,0 +1,265 @@
+"""
+Índice invertido en memoria sobre los campos de texto de `Producto`.
+
+Reemplaza los cuatro `icontains` (nombre, descripción, descripción corta y SKU)
+por búsquedas en un diccionario término -> ids, de modo que el costo de una
+consulta depende del número de coincidencias y no del tamaño del catálogo.
+Cada posting guarda la frecuencia del término por campo para poder puntuar
+con BM25 (ver `core.busqueda.ranking`). Los términos de nombres de producto y
+de marcas alimentan además un índice de trigramas para corregir errores de
+digitación (ver `core.busqueda.trigramas`). Los términos del índice y de las
+consultas salen del mismo análisis (raíces y sinónimos, ver `core.busqueda.texto`).
+
+El índice se mantiene al día por dos caminos:
+- Las señales de `Producto` (ver `core.signals`) lo actualizan en cada save/delete.
+- Antes de cada búsqueda se sincroniza por firma del catálogo
+  (ver `core.busqueda.catalogo`).
+"""
+
+import bisect
+from collections import Counter, namedtuple
+
+from django.db.models import Count, Max
+
+from ..models import Marca
+from . import ranking
+from .catalogo import IndiceCatalogo
+from .texto import analizar, raiz, tokenizar, variantes
+from .trigramas import IndiceTrigramas
+
+CAMPOS_INDEXADOS = ('nombre', 'descripcion', 'descripcion_corta', 'sku')
+
+# Lo que el índice sabe de cada producto activo
+Documento = namedtuple('Documento', 'terminos terminos_nombre longitudes ventas destacado calificacion')
+
+
+class IndiceInvertido(IndiceCatalogo):
+    """Índice término -> {id: frecuencias por campo}, con búsqueda por prefijo."""
+
+    columnas = IndiceCatalogo.columnas + (
+        'total_ventas', 'destacado', 'calificacion_promedio',
+    ) + CAMPOS_INDEXADOS
+
+    def __init__(self):
+        super().__init__()
+        self._postings = {}
+        self._documentos = {}
+        self._longitud_total = [0] * len(CAMPOS_INDEXADOS)
+        # Vocabulario ordenado para resolver prefijos con bisect
+        self._vocabulario = []
+        self._trigramas = IndiceTrigramas()
+        self._terminos_marca = {}
+        self._firma_marcas = None
+
+    # Construcción y mantenimiento
+
+    def indexar_marca(self, marca):
+        """Agrega o actualiza el nombre de una marca en el vocabulario de corrección."""
+        with self._lock:
+            if self._construido:
+                self._aplicar_marca(marca.pk, marca.nombre if marca.activa else '')
+
+    def eliminar_marca(self, id_marca):
+        with self._lock:
+            if self._construido:
+                self._aplicar_marca(id_marca, '')
+
+    # Consultas
+
+    def buscar(self, consulta):
+        """
+        Devuelve el conjunto de ids cuyos textos contienen todos los términos
+        de la consulta (cada término se compara como prefijo), o None si la
+        consulta no tiene términos buscables.
+        """
+        terminos = analizar(consulta)
+        if not terminos:
+            return None
+        self.sincronizar()
+        with self._lock:
+            conjuntos = [self._ids_con_prefijo(termino) for termino in set(terminos)]
+        conjuntos.sort(key=len)
+        resultado = conjuntos[0]
+        for ids in conjuntos[1:]:
+            if not resultado:
+                break
+            resultado &= ids
+        return resultado
+
+    def sugerir(self, consulta):
+        """
+        Consulta corregida ("samsumg" -> "samsung") o None si todos sus términos
+        existen en el catálogo o no hay corrección lo bastante cercana.
+        """
+        terminos = tokenizar(consulta)
+        if not terminos:
+            return None
+        self.sincronizar()
+        with self._lock:
+            desconocidos = [
+                t for t in terminos if t not in self._trigramas and not self._tiene_prefijo(raiz(t))
+            ]
+        if not desconocidos:
+            return None
+        self._sincronizar_marcas()
+        corregidos = []
+        with self._lock:
+            for termino in terminos:
+                if termino in desconocidos:
+                    termino = self._trigramas.corregir(termino) or termino
+                corregidos.append(termino)
+        if corregidos == terminos:
+            return None
+        return ' '.join(corregidos)
+
+    def mejores(self, consulta, candidatos, limite):
+        """
+        Los `limite` ids de `candidatos` con mayor relevancia para `consulta`
+        (BM25 por campos + señales de negocio), en orden descendente.
+        """
+        terminos = set(analizar(consulta))
+        parametros = ranking.parametros()
+        with self._lock:
+            total_documentos = len(self._documentos)
+            promedios = [
+                total / total_documentos if total_documentos else 0.0
+                for total in self._longitud_total
+            ]
+            acumulado = {i: 0.0 for i in candidatos if i in self._documentos}
+            # Término a término: cada prefijo de la consulta aporta el mejor de sus términos expandidos
+            for termino in terminos:
+                mejor = {}
+                for postings in self._postings_con_prefijo(termino):
+                    idf = ranking.idf(len(postings), total_documentos)
+                    if len(postings) <= len(acumulado):
+                        pares = ((i, f) for i, f in postings.items() if i in acumulado)
+                    else:
+                        pares = ((i, postings[i]) for i in acumulado if i in postings)
+                    for id_producto, frecuencias in pares:
+                        puntaje = idf * ranking.frecuencia_saturada(
+                            frecuencias, self._documentos[id_producto].longitudes,
+                            promedios, parametros
+                        )
+                        if puntaje > mejor.get(id_producto, 0.0):
+                            mejor[id_producto] = puntaje
+                for id_producto, puntaje in mejor.items():
+                    acumulado[id_producto] += puntaje
+            puntajes = (
+                (ranking.combinar(puntaje, self._documentos[id_producto], parametros), id_producto)
+                for id_producto, puntaje in acumulado.items()
+            )
+            return [id_producto for _, id_producto in ranking.top_k(puntajes, limite)]
+
+    def _sincronizar_marcas(self):
+        """Recarga los nombres de marca si cambió su firma (pocas filas; solo se usa al corregir)."""
+        activas = Marca.objects.filter(activa=True)
+        firma = activas.aggregate(cantidad=Count('id_marca'), ultimo_id=Max('id_marca'))
+        with self._lock:
+            if firma == self._firma_marcas:
+                return
+        marcas = list(activas.values_list('id_marca', 'nombre'))
+        with self._lock:
+            for id_marca in list(self._terminos_marca):
+                self._aplicar_marca(id_marca, '')
+            for id_marca, nombre in marcas:
+                self._aplicar_marca(id_marca, nombre)
+            self._firma_marcas = firma
+
+    def _tiene_prefijo(self, termino):
+        for prefijo in variantes(termino):
+            posicion = bisect.bisect_left(self._vocabulario, prefijo)
+            if posicion < len(self._vocabulario) and self._vocabulario[posicion].startswith(prefijo):
+                return True
+        return False
+
+    def _ids_con_prefijo(self, prefijo):
+        ids = set()
+        for postings in self._postings_con_prefijo(prefijo):
+            ids.update(postings)
+        return ids
+
+    def _postings_con_prefijo(self, termino):
+        """Postings de los términos del vocabulario que empiezan por `termino` o por un sinónimo suyo."""
+        vocabulario = self._vocabulario
+        vistos = set()
+        for prefijo in variantes(termino):
+            posicion = bisect.bisect_left(vocabulario, prefijo)
+            while posicion < len(vocabulario) and vocabulario[posicion].startswith(prefijo):
+                if vocabulario[posicion] not in vistos:
+                    vistos.add(vocabulario[posicion])
+                    yield self._postings[vocabulario[posicion]]
+                posicion += 1
+
+    # Internos (se llaman con el lock tomado)
+
+    def _reiniciar(self):
+        self._postings = {}
+        self._documentos = {}
+        self._longitud_total = [0] * len(CAMPOS_INDEXADOS)
+        self._vocabulario = []
+        self._trigramas = IndiceTrigramas()
+        self._terminos_marca = {}
+
+    def _completar_construccion(self):
+        self._firma_marcas = None
+        self._vocabulario = sorted(self._postings)
+
+    def _aplicar_fila(self, fila, incremental):
+        id_producto, activo, _, ventas, destacado, calificacion = fila[:6]
+        self._retirar(id_producto, incremental)
+        if activo:
+            frecuencias = {}
+            longitudes = []
+            for posicion, texto in enumerate(fila[6:]):
+                tokens = analizar(texto)
+                longitudes.append(len(tokens))
+                self._longitud_total[posicion] += len(tokens)
+                for termino, veces in Counter(tokens).items():
+                    frecuencias.setdefault(termino, [0] * len(CAMPOS_INDEXADOS))[posicion] = veces
+            # La corrección trabaja con palabras completas, no con raíces
+            terminos_nombre = set(tokenizar(fila[6]))
+            for termino in terminos_nombre:
+                self._trigramas.agregar(termino)
+            for termino, por_campo in frecuencias.items():
+                postings = self._postings.get(termino)
+                if postings is None:
+                    postings = self._postings[termino] = {}
+                    if incremental:
+                        bisect.insort(self._vocabulario, termino)
+                postings[id_producto] = tuple(por_campo)
+            self._documentos[id_producto] = Documento(
+                frozenset(frecuencias), tuple(terminos_nombre), tuple(longitudes),
+                ventas or 0, bool(destacado), float(calificacion or 0)
+            )
+
+    def _retirar(self, id_producto, incremental):
+        documento = self._documentos.pop(id_producto, None)
+        if documento is None:
+            return
+        for posicion, longitud in enumerate(documento.longitudes):
+            self._longitud_total[posicion] -= longitud
+        for termino in documento.terminos_nombre:
+            self._trigramas.quitar(termino)
+        for termino in documento.terminos:
+            postings = self._postings.get(termino)
+            if postings is None:
+                continue
+            postings.pop(id_producto, None)
+            if not postings:
+                del self._postings[termino]
+                if incremental:
+                    posicion = bisect.bisect_left(self._vocabulario, termino)
+                    if posicion < len(self._vocabulario) and self._vocabulario[posicion] == termino:
+                        del self._vocabulario[posicion]
+
+    def _aplicar_marca(self, id_marca, nombre):
+        for termino in self._terminos_marca.pop(id_marca, ()):
+            self._trigramas.quitar(termino)
+        terminos = set(tokenizar(nombre))
+        for termino in terminos:
+            self._trigramas.agregar(termino)
+        if terminos:
+            self._terminos_marca[id_marca] = terminos
+
+
+indice_productos = IndiceInvertido()
@@ -0,0 +1,70 @@
+"""
+Puntuación de relevancia para la búsqueda de productos.
+
+BM25 por campos (BM25F): la frecuencia de cada término se pondera por campo
+(nombre > descripción corta > descripción > SKU), se normaliza por la longitud
+del campo y luego se satura con k1. El puntaje textual se multiplica por
+impulsos de negocio (ventas, destacado, calificación) configurables en
+`settings.BUSQUEDA['RELEVANCIA']`, así un éxito de ventas sube en el ranking
+pero no aparece por encima de coincidencias textuales claramente mejores.
+"""
+
+import heapq
+import math
+
+from django.conf import settings
+
+PARAMETROS_POR_DEFECTO = {
+    'K1': 1.2,
+    'B': 0.75,
+    # Mismo orden que indice.CAMPOS_INDEXADOS: nombre, descripcion, descripcion_corta, sku
+    'PESOS_CAMPOS': {'nombre': 3.0, 'descripcion': 1.0, 'descripcion_corta': 2.0, 'sku': 0.8},
+    # Factores: puntaje * (1 + ventas*log1p(total_ventas) + destacado + calificacion*estrellas)
+    'IMPULSO_VENTAS': 0.05,
+    'IMPULSO_DESTACADO': 0.1,
+    'IMPULSO_CALIFICACION': 0.02,
+}
+
+
+def parametros():
+    """Parámetros vigentes: los de settings sobre los valores por defecto."""
+    from .indice import CAMPOS_INDEXADOS
+
+    configurados = getattr(settings, 'BUSQUEDA', {}).get('RELEVANCIA', {})
+    valores = {**PARAMETROS_POR_DEFECTO, **configurados}
+    pesos = {**PARAMETROS_POR_DEFECTO['PESOS_CAMPOS'], **configurados.get('PESOS_CAMPOS', {})}
+    valores['PESOS_CAMPOS'] = tuple(pesos[campo] for campo in CAMPOS_INDEXADOS)
+    return valores
+
+
+def idf(documentos_con_termino, total_documentos):
+    """IDF de BM25 (variante siempre positiva)."""
+    return math.log(1 + (total_documentos - documentos_con_termino + 0.5) / (documentos_con_termino + 0.5))
+
+
+def frecuencia_saturada(frecuencias, longitudes, promedios, parametros):
+    """Frecuencia ponderada por campo y normalizada por longitud, saturada con k1."""
+    b = parametros['B']
+    ponderada = 0.0
+    for frecuencia, longitud, promedio, peso in zip(
+        frecuencias, longitudes, promedios, parametros['PESOS_CAMPOS']
+    ):
+        if frecuencia:
+            normalizacion = 1 - b + b * (longitud / promedio if promedio else 1)
+            ponderada += peso * frecuencia / normalizacion
+    return ponderada * (parametros['K1'] + 1) / (parametros['K1'] + ponderada)
+
+
+def combinar(puntaje_texto, documento, parametros):
+    """Mezcla el puntaje textual con las señales de negocio del producto."""
+    return puntaje_texto * (
+        1
+        + parametros['IMPULSO_VENTAS'] * math.log1p(documento.ventas)
+        + parametros['IMPULSO_DESTACADO'] * documento.destacado
+        + parametros['IMPULSO_CALIFICACION'] * documento.calificacion
+    )
+
+
+def top_k(puntajes, k):
+    """Los k pares (puntaje, id) más altos usando un heap acotado (no ordena todo)."""
+    return heapq.nlargest(k, puntajes)
@@ -0,0 +1,93 @@
+"""
+Utilidades de texto para el subsistema de búsqueda.
+
+Toda cadena que entra al índice (catálogo) o que llega como consulta pasa por
+el mismo análisis:
+
+1. `tokenizar`: minúsculas, sin tildes y partida en términos alfanuméricos, de
+   modo que "Cámara", "CAMARA" y "camara" producen el mismo término.
+2. `raiz`: stemmer liviano para español (plurales y vocal final de género),
+   de modo que "cámaras" y "cámara" comparten raíz ("camar").
+3. `variantes`: sinónimos (celular/smartphone, portátil/laptop...) expresados
+   como raíces; una consulta por cualquiera de ellos encuentra a los demás.
+
+La raíz de una palabra siempre es un prefijo de ella, así que buscar por
+prefijo sobre raíces sigue funcionando mientras el usuario escribe. Los
+resultados por término se cachean: el vocabulario de consultas es pequeño y
+muy repetitivo.
+"""
+
+import re
+import unicodedata
+from functools import lru_cache
+
+from django.conf import settings
+
+_PATRON_TOKEN = re.compile(r'[a-z0-9]+')
+
+_VOCALES = 'aeiou'
+
+SINONIMOS_POR_DEFECTO = (
+    ('celular', 'smartphone'),
+    ('portatil', 'laptop'),
+    ('nevera', 'refrigerador'),
+)
+
+
+def plegar_acentos(texto):
+    """Pasa a minúsculas y elimina diacríticos: 'Portátil Ñandú' -> 'portatil nandu'."""
+    descompuesto = unicodedata.normalize('NFKD', texto.lower())
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c))
+
+
+def tokenizar(texto):
+    """Divide el texto en términos alfanuméricos normalizados."""
+    if not texto:
+        return []
+    return _PATRON_TOKEN.findall(plegar_acentos(texto))
+
+
+@lru_cache(maxsize=50000)
+def raiz(termino):
+    """
+    Stemmer liviano: quita el plural y la vocal final de género.
+    'televisores' -> 'televisor', 'cámaras' -> 'camar', 'blancos' -> 'blanc'.
+    Códigos y términos cortos ('a54', 'tv', 'led') se dejan igual.
+    """
+    if len(termino) <= 3 or not termino.isalpha():
+        return termino
+    if termino.endswith('es') and len(termino) > 5 and termino[-3] not in _VOCALES:
+        return termino[:-2]
+    if termino.endswith('s'):
+        termino = termino[:-1]
+    if len(termino) > 4 and termino[-1] in 'aoe':
+        termino = termino[:-1]
+    return termino
+
+
+def analizar(texto):
+    """Términos de índice/consulta: tokens normalizados reducidos a su raíz."""
+    return [raiz(token) for token in tokenizar(texto)]
+
+
+@lru_cache(maxsize=1)
+def _tabla_sinonimos():
+    grupos = getattr(settings, 'BUSQUEDA', {}).get('SINONIMOS', SINONIMOS_POR_DEFECTO)
+    tabla = {}
+    for grupo in grupos:
+        raices = tuple(dict.fromkeys(r for palabra in grupo for r in analizar(palabra)))
+        for r in raices:
+            tabla[r] = tuple(dict.fromkeys(tabla.get(r, (r,)) + raices))
+    return tabla
+
+
+@lru_cache(maxsize=10000)
+def variantes(termino):
+    """La raíz `termino` seguida de las raíces de sus sinónimos."""
+    return _tabla_sinonimos().get(termino, (termino,))
+
+
+def limpiar_caches():
+    """Olvida sinónimos y variantes cacheados (p. ej. al cambiar `settings.BUSQUEDA`)."""
+    _tabla_sinonimos.cache_clear()
+    variantes.cache_clear()
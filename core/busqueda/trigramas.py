@@ -0,0 +1,113 @@
+"""
+Índice de trigramas para tolerar errores de digitación ("samsumg", "televisro").
+
+Se indexan los términos de los nombres de producto y de las marcas. Para
+corregir un término desconocido primero se podan candidatos con los trigramas
+que comparte (solo se miran las listas de esos trigramas, nunca todo el
+vocabulario) y luego se calcula la distancia de edición acotada sobre los
+pocos candidatos que sobreviven.
+"""
+
+from collections import Counter
+
+# Candidatos (por trigramas compartidos) sobre los que se calcula distancia de edición
+MAX_CANDIDATOS = 40
+
+
+def trigramas(termino):
+    """Trigramas con relleno estilo pg_trgm: 'tv' -> {'  t', ' tv', 'tv '}."""
+    relleno = f'  {termino} '
+    return {relleno[i:i + 3] for i in range(len(relleno) - 2)}
+
+
+def distancia_maxima(termino):
+    """Errores tolerados según la longitud del término."""
+    if len(termino) <= 3:
+        return 0
+    if len(termino) <= 5:
+        return 1
+    return 2
+
+
+def distancia_edicion(a, b, limite):
+    """
+    Distancia de Damerau-Levenshtein (transposiciones adyacentes) acotada:
+    devuelve `limite + 1` en cuanto se sabe que la supera.
+    """
+    if abs(len(a) - len(b)) > limite:
+        return limite + 1
+    anterior2 = None
+    anterior = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        actual = [i] + [0] * len(b)
+        minimo_fila = i
+        for j in range(1, len(b) + 1):
+            costo = 0 if a[i - 1] == b[j - 1] else 1
+            valor = min(anterior[j] + 1, actual[j - 1] + 1, anterior[j - 1] + costo)
+            if (anterior2 is not None and i > 1 and j > 1
+                    and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                valor = min(valor, anterior2[j - 2] + 1)
+            actual[j] = valor
+            minimo_fila = min(minimo_fila, valor)
+        if minimo_fila > limite:
+            return limite + 1
+        anterior2, anterior = anterior, actual
+    return anterior[len(b)]
+
+
+class IndiceTrigramas:
+    """Vocabulario con conteo de uso y listas trigrama -> términos. No es thread-safe por sí solo."""
+
+    def __init__(self):
+        self._frecuencias = Counter()
+        self._postings = {}
+
+    def __contains__(self, termino):
+        return termino in self._frecuencias
+
+    def agregar(self, termino):
+        self._frecuencias[termino] += 1
+        if self._frecuencias[termino] == 1:
+            for trigrama in trigramas(termino):
+                self._postings.setdefault(trigrama, set()).add(termino)
+
+    def quitar(self, termino):
+        if termino not in self._frecuencias:
+            return
+        self._frecuencias[termino] -= 1
+        if self._frecuencias[termino] > 0:
+            return
+        del self._frecuencias[termino]
+        for trigrama in trigramas(termino):
+            terminos = self._postings.get(trigrama)
+            if terminos is not None:
+                terminos.discard(termino)
+                if not terminos:
+                    del self._postings[trigrama]
+
+    def corregir(self, termino):
+        """El término conocido más parecido a `termino`, o None si ninguno está lo bastante cerca."""
+        limite = distancia_maxima(termino)
+        if limite == 0:
+            return None
+        propios = trigramas(termino)
+        compartidos = Counter()
+        for trigrama in propios:
+            compartidos.update(self._postings.get(trigrama, ()))
+        # Cada error (o transposición) altera a lo sumo 4 trigramas
+        minimo = max(1, len(propios) - 4 * limite)
+        candidatos = [
+            (cantidad, candidato) for candidato, cantidad in compartidos.items()
+            if cantidad >= minimo and abs(len(candidato) - len(termino)) <= limite
+        ]
+        candidatos.sort(reverse=True)
+
+        mejor = None
+        for _, candidato in candidatos[:MAX_CANDIDATOS]:
+            distancia = distancia_edicion(termino, candidato, limite)
+            if distancia > limite:
+                continue
+            clave = (distancia, -self._frecuencias[candidato])
+            if mejor is None or clave < mejor[0]:
+                mejor = (clave, candidato)
+        return mejor[1] if mejor else None
@@ -0,0 +1,14 @@
+"""
+Cache de respuestas del API.
+
+Las vistas usan `cachear_respuesta` (vistas de función) o
+`RespuestaCacheadaMixin` (ViewSets); las señales de `core.signals` llaman a
+`incrementar_version` en cada escritura sobre un modelo del que dependen.
+Las respuestas viven en un cache de dos niveles (`cache_respuestas()`: LRU
+del proceso delante del cache de Django) con cálculo único por clave; los
+listados críticos usan `respuesta_revalidada` (stale-while-revalidate).
+"""
+
+from .niveles import CacheDosNiveles, CacheLRU, cache_respuestas
+from .respuestas import RespuestaCacheadaMixin, cachear_respuesta, respuesta_cacheada, respuesta_revalidada
+from .versiones import incrementar as incrementar_version
@@ -0,0 +1,226 @@
+"""
+Cache de dos niveles con protección contra estampidas.
+
+1. Un LRU en memoria del proceso, acotado en bytes (el tamaño de cada valor
+   es el de su pickle, que es lo que ocuparía en el cache compartido) y con
+   un TTL propio (`TIMEOUT_LOCAL`) que limita cuánto puede quedar desfasado
+   respecto del nivel 2. Los valores se comparten entre hilos: no se mutan.
+2. El cache configurado en Django (`CACHES['default']`), compartido por
+   todos los workers.
+
+`obtener_o_calcular` lee del nivel 1, luego del 2, y solo si ambos fallan
+calcula el valor. Los fallos concurrentes de una misma clave se agrupan:
+
+- Dentro del proceso, el primer hilo calcula y los demás esperan su resultado.
+- Entre procesos, el que calcula toma un candado con `cache.add`; los demás
+  consultan el nivel 2 durante `ESPERA_CALCULO` segundos antes de rendirse
+  y calcular por su cuenta.
+
+Los contadores (`estadisticas`) sirven para dimensionar `MAX_BYTES`.
+"""
+
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache as cache_compartido
+
+MAX_BYTES_POR_DEFECTO = 32 * 1024 * 1024
+ESPERA_CALCULO_POR_DEFECTO = 5.0
+TIMEOUT_LOCAL_POR_DEFECTO = 300
+# Cada cuánto se vuelve a mirar el nivel 2 mientras otro proceso calcula
+_INTERVALO_ESPERA = 0.05
+
+
+class CacheLRU:
+    """LRU en memoria con capacidad en bytes y expiración por entrada."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.expulsiones = 0
+        self._entradas = OrderedDict()  # clave -> (valor, tamaño, expira)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def get(self, clave, defecto=None):
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                return defecto
+            if entrada[2] is not None and entrada[2] <= time.monotonic():
+                self._quitar(clave)
+                return defecto
+            self._entradas.move_to_end(clave)
+            return entrada[0]
+
+    def set(self, clave, valor, tamano, timeout=None):
+        if tamano > self.max_bytes:
+            # No cabe: guardarlo vaciaría el cache entero
+            return
+        expira = time.monotonic() + timeout if timeout is not None else None
+        with self._lock:
+            if clave in self._entradas:
+                self._quitar(clave)
+            self._entradas[clave] = (valor, tamano, expira)
+            self.bytes += tamano
+            while self.bytes > self.max_bytes:
+                self._quitar(next(iter(self._entradas)))
+                self.expulsiones += 1
+
+    def delete(self, clave):
+        with self._lock:
+            if clave in self._entradas:
+                self._quitar(clave)
+
+    def clear(self):
+        with self._lock:
+            self._entradas.clear()
+            self.bytes = 0
+
+    def _quitar(self, clave):
+        self.bytes -= self._entradas.pop(clave)[1]
+
+
+class _Vuelo:
+    """Un cálculo en curso que otros hilos esperan."""
+
+    def __init__(self):
+        self.listo = threading.Event()
+        self.valor = None
+        self.error = None
+
+
+class CacheDosNiveles:
+    """LRU local delante del cache de Django, con cálculo único por clave."""
+
+    def __init__(self, max_bytes=MAX_BYTES_POR_DEFECTO, espera_calculo=ESPERA_CALCULO_POR_DEFECTO,
+                 timeout_local=TIMEOUT_LOCAL_POR_DEFECTO):
+        self.local = CacheLRU(max_bytes)
+        self.timeout_local = timeout_local
+        self.espera_calculo = espera_calculo
+        self._vuelos = {}
+        self._lock = threading.Lock()
+        self._contadores = dict.fromkeys(
+            ('aciertos_local', 'aciertos_compartido', 'fallos', 'agrupados'), 0
+        )
+
+    def get(self, clave):
+        valor = self.local.get(clave)
+        if valor is not None:
+            self._contar('aciertos_local')
+            return valor
+        valor = cache_compartido.get(clave)
+        if valor is not None:
+            self._contar('aciertos_compartido')
+            # El TTL restante del nivel 2 no se conoce; el local lo acota `timeout_local`
+            self.local.set(clave, valor, _tamano(valor), self.timeout_local)
+        return valor
+
+    def set(self, clave, valor, timeout=None):
+        local = self.timeout_local if timeout is None else min(timeout, self.timeout_local)
+        self.local.set(clave, valor, _tamano(valor), local)
+        cache_compartido.set(clave, valor, timeout=timeout)
+
+    def delete(self, clave):
+        self.local.delete(clave)
+        cache_compartido.delete(clave)
+
+    def obtener_o_calcular(self, clave, calcular, timeout=None, aceptar=None):
+        """
+        El valor de `clave`, o el que devuelve `calcular()` (una sola vez por
+        clave aunque haya fallos concurrentes). Si `calcular` devuelve None el
+        resultado no se guarda. `aceptar(valor)` permite descartar un valor
+        guardado que ya no sirve (p. ej. de una versión anterior).
+        """
+        valor = self.get(clave)
+        if valor is not None and (aceptar is None or aceptar(valor)):
+            return valor
+
+        with self._lock:
+            vuelo = self._vuelos.get(clave)
+            lider = vuelo is None
+            if lider:
+                vuelo = self._vuelos[clave] = _Vuelo()
+        if not lider:
+            self._contar('agrupados')
+            vuelo.listo.wait()
+            if vuelo.error is not None:
+                raise vuelo.error
+            return vuelo.valor
+
+        try:
+            vuelo.valor = self._calcular(clave, calcular, timeout, aceptar)
+            return vuelo.valor
+        except BaseException as error:
+            vuelo.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._vuelos[clave]
+            vuelo.listo.set()
+
+    def estadisticas(self):
+        with self._lock:
+            datos = dict(self._contadores)
+        datos.update(
+            expulsiones=self.local.expulsiones,
+            entradas=len(self.local),
+            bytes=self.local.bytes,
+            max_bytes=self.local.max_bytes,
+        )
+        return datos
+
+    def limpiar(self):
+        """Vacía el nivel local y reinicia los contadores."""
+        self.local.clear()
+        self.local.expulsiones = 0
+        with self._lock:
+            for contador in self._contadores:
+                self._contadores[contador] = 0
+
+    def _calcular(self, clave, calcular, timeout, aceptar):
+        candado = f'{clave}:calculando'
+        if not cache_compartido.add(candado, 1, timeout=max(int(self.espera_calculo), 1)):
+            # Otro proceso ya lo está calculando: esperar a que lo publique
+            limite = time.monotonic() + self.espera_calculo
+            while time.monotonic() < limite:
+                time.sleep(_INTERVALO_ESPERA)
+                valor = self.get(clave)
+                if valor is not None and (aceptar is None or aceptar(valor)):
+                    self._contar('agrupados')
+                    return valor
+            candado = None
+        self._contar('fallos')
+        try:
+            valor = calcular()
+            if valor is not None:
+                self.set(clave, valor, timeout)
+            return valor
+        finally:
+            if candado is not None:
+                cache_compartido.delete(candado)
+
+    def _contar(self, contador):
+        with self._lock:
+            self._contadores[contador] += 1
+
+
+def _tamano(valor):
+    return len(pickle.dumps(valor, pickle.HIGHEST_PROTOCOL))
+
+
+@lru_cache(maxsize=None)
+def cache_respuestas():
+    """Instancia (única por proceso) configurada con `settings.CACHE_RESPUESTAS`."""
+    parametros = getattr(settings, 'CACHE_RESPUESTAS', {})
+    return CacheDosNiveles(
+        max_bytes=parametros.get('MAX_BYTES', MAX_BYTES_POR_DEFECTO),
+        espera_calculo=parametros.get('ESPERA_CALCULO', ESPERA_CALCULO_POR_DEFECTO),
+        timeout_local=parametros.get('TIMEOUT_LOCAL', TIMEOUT_LOCAL_POR_DEFECTO),
+    )
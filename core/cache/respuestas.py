@@ -0,0 +1,166 @@
+"""
+Cache de respuestas GET de los endpoints de catálogo.
+
+Los listados de productos destacados, en oferta y más vendidos, y los de
+categorías y marcas son iguales para cualquier visitante. Su respuesta se
+guarda con una clave formada por:
+
+- el nombre del endpoint,
+- las versiones de los modelos de los que depende (ver `core.cache.versiones`),
+- el host, la ruta y los query params normalizados (ordenados y sin vacíos).
+
+Se guardan en el cache de dos niveles (ver `core.cache.niveles`), así que un
+fallo con mucho tráfico se calcula una sola vez.
+
+Los listados que deben seguir respondiendo con la base de datos degradada
+usan `respuesta_revalidada`: la clave no lleva la versión (va dentro de la
+entrada) y se sirve la copia vieja mientras se recalcula
+(ver `core.cache.revalidacion`).
+
+Una escritura sobre cualquiera de esos modelos que emite señales cambia la
+clave, de modo que deja de servirse la respuesta vieja. Las que no las
+emiten (`QuerySet.update`, `bulk_create`, SQL directo) deben llamar a
+`incrementar_version`; si no, el `TIMEOUT` de `settings.CACHE_RESPUESTAS`
+acota cuánto puede seguir sirviéndose la copia vieja.
+"""
+
+import hashlib
+import threading
+from functools import wraps
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.response import Response
+
+from .niveles import cache_respuestas
+from .revalidacion import obtener_revalidando
+from .versiones import versiones
+
+PREFIJO = 'respuesta'
+TIMEOUT_POR_DEFECTO = 10 * 60
+TTL_SUAVE_POR_DEFECTO = 30
+TTL_DURO_POR_DEFECTO = 60 * 60
+
+
+def parametros():
+    return getattr(settings, 'CACHE_RESPUESTAS', {})
+
+
+def clave_respuesta(nombre, modelos, request):
+    """Clave de la respuesta de `nombre` para `request` con las versiones actuales."""
+    return f'{PREFIJO}:{nombre}:{_version(modelos)}:{_firma(request)}'
+
+
+def respuesta_cacheada(nombre, modelos, request, calcular):
+    """
+    La respuesta cacheada de `nombre`, o la que produce `calcular()` (que se
+    guarda si es un 200). Solo se cachean GET/HEAD.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return calcular()
+    calculada = None
+
+    def datos_respuesta():
+        nonlocal calculada
+        calculada = calcular()
+        if calculada.status_code != status.HTTP_200_OK:
+            return None
+        return calculada.data, dict(calculada.items())
+
+    guardada = cache_respuestas().obtener_o_calcular(
+        clave_respuesta(nombre, modelos, request), datos_respuesta,
+        timeout=parametros().get('TIMEOUT', TIMEOUT_POR_DEFECTO)
+    )
+    if calculada is not None:
+        return calculada
+    if guardada is None:
+        # Otro hilo la calculó pero no era cacheable (p. ej. un 404): se calcula aquí
+        return calcular()
+    datos, encabezados = guardada
+    return Response(datos, headers=encabezados)
+
+
+def respuesta_revalidada(nombre, modelos, request, calcular):
+    """
+    Como `respuesta_cacheada`, pero con stale-while-revalidate: pasado el TTL
+    suave se sirve la copia guardada y se recalcula en un hilo de fondo, y si
+    la base de datos falla se sigue sirviendo hasta el TTL duro.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return calcular()
+    calculada = None
+    hilo = threading.get_ident()
+
+    def datos_respuesta():
+        nonlocal calculada
+        respuesta = calcular()
+        if threading.get_ident() == hilo:
+            calculada = respuesta
+        if respuesta.status_code != status.HTTP_200_OK:
+            return None
+        return respuesta.data, dict(respuesta.items())
+
+    revalidacion = parametros().get('REVALIDACION', {})
+    guardada = obtener_revalidando(
+        cache_respuestas(), f'{PREFIJO}:{nombre}:{_firma(request)}', datos_respuesta,
+        version=_version(modelos),
+        ttl_suave=revalidacion.get('TTL_SUAVE', TTL_SUAVE_POR_DEFECTO),
+        ttl_duro=revalidacion.get('TTL_DURO', TTL_DURO_POR_DEFECTO),
+    )
+    if calculada is not None:
+        return calculada
+    if guardada is None:
+        return calcular()
+    datos, encabezados = guardada
+    return Response(datos, headers=encabezados)
+
+
+def _firma(request):
+    """Host, ruta y query params normalizados (ordenados y sin vacíos)."""
+    consulta = sorted(
+        (parametro, valor)
+        for parametro, valores in request.query_params.lists()
+        for valor in valores if valor != ''
+    )
+    return hashlib.md5(repr((request.get_host(), request.path, consulta)).encode()).hexdigest()
+
+
+def _version(modelos):
+    return '.'.join(str(v) for v in versiones(modelos))
+
+
+def cachear_respuesta(*modelos, revalidar=False):
+    """
+    Decorador para vistas de función (`@api_view`) que dependen de `modelos`;
+    con `revalidar=True` usa `respuesta_revalidada`.
+    """
+    cachear = respuesta_revalidada if revalidar else respuesta_cacheada
+
+    def decorador(vista):
+        nombre = vista.__name__
+
+        @wraps(vista)
+        def envoltura(request, *args, **kwargs):
+            return cachear(
+                nombre, modelos, request, lambda: vista(request, *args, **kwargs)
+            )
+        return envoltura
+    return decorador
+
+
+class RespuestaCacheadaMixin:
+    """Cachea `list` y `retrieve` de un ViewSet; `modelos_cache` son sus dependencias."""
+
+    modelos_cache = ()
+
+    def list(self, request, *args, **kwargs):
+        return respuesta_cacheada(
+            f'{type(self).__name__}.list', self.modelos_cache, request,
+            lambda: super(RespuestaCacheadaMixin, self).list(request, *args, **kwargs)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return respuesta_cacheada(
+            f'{type(self).__name__}.retrieve', self.modelos_cache, request,
+            lambda: super(RespuestaCacheadaMixin, self).retrieve(request, *args, **kwargs)
+        )
@@ -0,0 +1,86 @@
+"""
+Stale-while-revalidate sobre el cache de dos niveles.
+
+Cada entrada guarda su valor, cuándo se calculó y la versión de los datos de
+los que sale (ver `core.cache.versiones`), y vive en el cache hasta su TTL
+duro. Al leerla:
+
+- Misma versión y antes del TTL suave: se sirve tal cual.
+- Misma versión y pasado el TTL suave: se sirve la copia vieja de inmediato
+  y un hilo de fondo la recalcula (una vez por clave).
+- Versión distinta (hubo escrituras) o sin entrada: se recalcula en el
+  momento, con cálculo único por clave. Si la base de datos falla se sirve
+  la copia vieja mientras exista.
+
+Así, con la base de datos lenta o caída, la navegación sigue respondiendo
+con lo último conocido hasta el TTL duro.
+"""
+
+import logging
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import Error as ErrorBaseDatos
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+Entrada = namedtuple('Entrada', 'valor creada version')
+
+HILOS_REFRESCO = 2
+
+_refrescando = set()
+_lock = threading.Lock()
+_ejecutor = ThreadPoolExecutor(max_workers=HILOS_REFRESCO, thread_name_prefix='revalidacion')
+
+
+def obtener_revalidando(cache, clave, calcular, version, ttl_suave, ttl_duro):
+    """
+    El valor de `clave` según la política de arriba. `calcular()` devuelve el
+    valor nuevo (None si no debe guardarse); `version` identifica los datos
+    vigentes.
+    """
+    entrada = cache.get(clave)
+    if entrada is not None and entrada.version == version:
+        if time.time() - entrada.creada >= ttl_suave:
+            _refrescar_en_fondo(cache, clave, calcular, version, ttl_duro)
+        return entrada.valor
+
+    def calcular_entrada():
+        valor = calcular()
+        return Entrada(valor, time.time(), version) if valor is not None else None
+
+    try:
+        nueva = cache.obtener_o_calcular(
+            clave, calcular_entrada, timeout=ttl_duro, aceptar=lambda e: e.version == version
+        )
+    except ErrorBaseDatos:
+        if entrada is None:
+            raise
+        logger.warning('Base de datos no disponible; se sirve la copia anterior de %s', clave, exc_info=True)
+        return entrada.valor
+    return nueva.valor if nueva is not None else None
+
+
+def _refrescar_en_fondo(cache, clave, calcular, version, ttl_duro):
+    with _lock:
+        if clave in _refrescando:
+            return
+        _refrescando.add(clave)
+    _ejecutor.submit(_refrescar, cache, clave, calcular, version, ttl_duro)
+
+
+def _refrescar(cache, clave, calcular, version, ttl_duro):
+    try:
+        valor = calcular()
+        if valor is not None:
+            cache.set(clave, Entrada(valor, time.time(), version), timeout=ttl_duro)
+    except Exception:
+        # La copia vieja se sigue sirviendo hasta su TTL duro
+        logger.warning('No se pudo revalidar %s', clave, exc_info=True)
+    finally:
+        with _lock:
+            _refrescando.discard(clave)
+        connections.close_all()
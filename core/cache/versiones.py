@@ -0,0 +1,49 @@
+"""
+Contadores de versión por modelo, compartidos entre workers vía el cache de Django.
+
+El cache por defecto (`CACHES['default']`) tiene que ser compartido (Redis,
+Memcached): con uno por proceso, las escrituras de un worker no invalidan las
+respuestas guardadas por los demás.
+
+Cada escritura confirmada sobre un modelo versionado incrementa su contador
+(ver `core.signals`). Las claves de las respuestas cacheadas incluyen las
+versiones de los modelos de los que dependen, así que tras una escritura las
+entradas viejas simplemente dejan de consultarse y expiran solas.
+"""
+
+import time
+
+from django.core.cache import cache
+
+PREFIJO = 'version'
+
+
+def clave(modelo):
+    return f'{PREFIJO}:{modelo._meta.label_lower}'
+
+
+def versiones(modelos):
+    """Versión actual de cada modelo, en el mismo orden (una sola ida al cache)."""
+    claves = [clave(modelo) for modelo in modelos]
+    actuales = cache.get_many(claves)
+    faltantes = [c for c in claves if c not in actuales]
+    for c in faltantes:
+        # Si el contador se perdió (reinicio, expulsión) arranca en un valor
+        # que no puede repetir uno anterior y resucitar entradas viejas
+        cache.add(c, _semilla(), timeout=None)
+    if faltantes:
+        actuales.update(cache.get_many(faltantes))
+    return [actuales.get(c, 0) for c in claves]
+
+
+def incrementar(modelo):
+    """Invalida todas las respuestas que dependen de `modelo`."""
+    c = clave(modelo)
+    try:
+        cache.incr(c)
+    except ValueError:
+        cache.add(c, _semilla(), timeout=None)
+
+
+def _semilla():
+    return time.time_ns() // 1000
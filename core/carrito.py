@@ -0,0 +1,274 @@
+"""
+Carrito actual de la petición: del usuario autenticado o de la sesión anónima.
+
+El carrito anónimo no se identifica con la clave de la sesión sino con un id
+aleatorio guardado *dentro* de ella (`request.session['carrito']`). Así:
+
+- Nada se crea al leer: un visitante nuevo que abre el carrito no genera
+  sesión, ni fila en `carritos`, ni cookie; el carrito existe desde que se
+  agrega el primer producto.
+- El carrito funciona con cualquier `SESSION_ENGINE`, incluidos los que no
+  escriben en la base de datos (`signed_cookies`, `cache`), donde la clave de
+  sesión cambia o no está respaldada por una fila.
+
+Para leerlo, `leer_carrito` trae el carrito, sus items y los campos de tarjeta
+de sus productos (con la imagen principal como subconsulta) en tres consultas
+fijas, tenga uno o treinta items; los totales salen de esas filas.
+"""
+
+import secrets
+
+from django.db import IntegrityError, connections, transaction
+from django.db.models import F, OuterRef, Prefetch, Subquery
+from django.utils import timezone
+
+from .models import Carrito, CarritoItem, ImagenProducto, Producto
+from .reservas import StockInsuficiente, ajustar_reservas, eliminar_items, expiracion, reservar_item
+
+CLAVE_SESION = 'carrito'
+# La marcada como principal; si ninguna lo está, la primera de la galería
+ORDEN_IMAGEN_PRINCIPAL = ('-es_principal', 'orden_display', 'id_imagen')
+# Campos de `ProductoTarjetaSerializer`
+CAMPOS_TARJETA = (
+    'id_producto', 'nombre', 'sku', 'precio', 'precio_original',
+    'descuento_porcentaje', 'stock', 'activo', 'en_oferta',
+)
+
+
+def productos_tarjeta():
+    """Productos con solo los campos de tarjeta y la URL de su imagen principal."""
+    imagen = ImagenProducto.objects.filter(
+        id_producto=OuterRef('pk')
+    ).order_by(*ORDEN_IMAGEN_PRINCIPAL).values('url_imagen')[:1]
+    return Producto.objects.only(*CAMPOS_TARJETA).annotate(url_imagen_principal=Subquery(imagen))
+
+
+def items_con_producto():
+    return CarritoItem.objects.order_by('id_item').prefetch_related(
+        Prefetch('id_producto', queryset=productos_tarjeta())
+    )
+
+
+def clave_carrito(request, crear=False):
+    """Id del carrito anónimo guardado en la sesión; con `crear`, lo genera si falta."""
+    clave = request.session.get(CLAVE_SESION)
+    if clave is None and crear:
+        clave = secrets.token_urlsafe(24)
+        request.session[CLAVE_SESION] = clave
+    return clave
+
+
+def olvidar_carrito(request):
+    request.session.pop(CLAVE_SESION, None)
+
+
+def carrito_actual(request, crear=False):
+    """
+    Carrito del usuario autenticado o de la sesión anónima. Sin `crear`
+    devuelve `None` si todavía no existe, sin escribir nada.
+    """
+    filtro = _filtro_carrito(request, crear)
+    if filtro is None:
+        return None
+    if crear:
+        return Carrito.objects.get_or_create(**filtro)[0]
+    return Carrito.objects.filter(**filtro).first()
+
+
+def leer_carrito(request):
+    """Como `carrito_actual`, pero con items y productos precargados para serializarlo."""
+    filtro = _filtro_carrito(request)
+    if filtro is None:
+        return None
+    return Carrito.objects.filter(**filtro).prefetch_related(
+        Prefetch('items', queryset=items_con_producto())
+    ).first()
+
+
+def sumar_al_carrito(request, producto, cantidad):
+    """
+    Suma `cantidad` unidades de `producto` al carrito actual y aparta el stock;
+    devuelve el item. Sin leer-modificar-guardar, que con dos agregados en
+    paralelo perdía uno:
+
+        UPDATE carrito_items SET cantidad = cantidad + n WHERE id_carrito = ... AND id_producto = ...
+
+    y solo si no había item, un INSERT (si otra petición lo insertó primero,
+    la restricción única lo rechaza y se repite el UPDATE). El UPDATE deja la
+    fila bloqueada hasta el final de la transacción, así que la reserva se
+    ajusta a la cantidad resultante sin carreras. Solo se escriben las
+    columnas que cambian. Lanza `StockInsuficiente` sin dejar nada escrito, y
+    `ValueError` si `cantidad` es menor que 1.
+    """
+    if cantidad < 1:
+        raise ValueError(f'Cantidad a agregar menor que 1: {cantidad}')
+    with transaction.atomic():
+        # El carrito se crea con el primer producto agregado
+        carrito = carrito_actual(request, crear=True)
+        items = CarritoItem.objects.filter(id_carrito=carrito, id_producto=producto)
+        if not _incrementar(items, cantidad):
+            try:
+                with transaction.atomic():
+                    CarritoItem.objects.create(
+                        id_carrito=carrito, id_producto=producto,
+                        cantidad=cantidad, precio_unitario=producto.precio
+                    )
+            except IntegrityError:
+                # Solo si otra petición insertó el mismo item primero; otro error se propaga
+                if not _incrementar(items, cantidad):
+                    raise
+        item = items.select_for_update().get()
+        reservar_item(item, item.cantidad)
+        items.update(reservado=item.reservado, reserva_expira=item.reserva_expira)
+    item.id_producto = producto
+    return item
+
+
+def fusionar_carritos(origen, destino):
+    """
+    Pasa los items de `origen` (el carrito anónimo) a `destino` (el del
+    usuario) y borra `origen`. Antes era una consulta y un guardado por item,
+    unas 80 consultas con 40 items en medio del login; ahora son fijas:
+
+    - Una lectura de los items de ambos carritos.
+    - Un solo INSERT ... ON CONFLICT (`bulk_create` con `update_conflicts`)
+      con la fila final de cada producto de `origen`: los que `destino` no
+      tenía se insertan con su `precio_unitario` original; los que tenía
+      suman cantidad y reserva, y conservan su precio y su fecha de alta.
+    - Un UPDATE que deja en 0 lo reservado de `origen` (las unidades pasaron a
+      `destino`, no se liberan) y el borrado de `origen` con sus items.
+
+    Debe llamarse dentro de una transacción.
+    """
+    items = list(CarritoItem.objects.select_for_update().filter(id_carrito__in=[origen, destino]))
+    existentes = {item.id_producto_id: item for item in items if item.id_carrito_id == destino.pk}
+    fusionados = []
+    for item in items:
+        if item.id_carrito_id != origen.pk:
+            continue
+        fusionado = CarritoItem(
+            id_carrito=destino, id_producto_id=item.id_producto_id, cantidad=item.cantidad,
+            precio_unitario=item.precio_unitario, reservado=item.reservado,
+            reserva_expira=item.reserva_expira
+        )
+        existente = existentes.get(item.id_producto_id)
+        if existente is not None:
+            fusionado.cantidad += existente.cantidad
+            fusionado.reservado += existente.reservado
+            if existente.reserva_expira and (
+                fusionado.reserva_expira is None or existente.reserva_expira > fusionado.reserva_expira
+            ):
+                fusionado.reserva_expira = existente.reserva_expira
+        fusionados.append(fusionado)
+
+    if fusionados:
+        # MySQL resuelve el conflicto con cualquier clave única y no acepta que se indique cuál
+        con_destino = connections[CarritoItem.objects.db].features.supports_update_conflicts_with_target
+        CarritoItem.objects.bulk_create(
+            fusionados,
+            update_conflicts=True,
+            unique_fields=['id_carrito', 'id_producto'] if con_destino else None,
+            update_fields=['cantidad', 'reservado', 'reserva_expira', 'updated_at']
+        )
+        CarritoItem.objects.filter(id_carrito=origen, reservado__gt=0).update(reservado=0)
+    origen.delete()
+
+
+def aplicar_lote(request, operaciones):
+    """
+    Aplica `operaciones` (`{'operacion', 'id_producto', 'cantidad'}`, en orden)
+    al carrito actual, todas o ninguna. Devuelve los errores por producto;
+    si la lista está vacía, se aplicaron.
+
+    En una transacción: los productos se leen en una consulta y los items
+    existentes en otra; la cantidad final de cada producto se calcula en
+    memoria y la diferencia con lo ya reservado se aparta en un solo UPDATE
+    condicional (ver `core.reservas`), que es también la validación de stock.
+    Después, un INSERT con los items nuevos, un UPDATE con los modificados y
+    un DELETE con los quitados.
+    """
+    ids = {operacion['id_producto'] for operacion in operaciones}
+    with transaction.atomic():
+        productos = Producto.objects.filter(activo=True).only('id_producto', 'precio').in_bulk(ids)
+        carrito = carrito_actual(request)
+        existentes = {}
+        if carrito is not None:
+            existentes = {
+                item.id_producto_id: item
+                for item in CarritoItem.objects.select_for_update().filter(
+                    id_carrito=carrito, id_producto__in=ids
+                )
+            }
+
+        finales = {pk: item.cantidad for pk, item in existentes.items()}
+        for operacion in operaciones:
+            pk = operacion['id_producto']
+            if operacion['operacion'] == 'agregar':
+                finales[pk] = finales.get(pk, 0) + operacion['cantidad']
+            elif operacion['operacion'] == 'fijar':
+                finales[pk] = operacion['cantidad']
+            else:
+                finales[pk] = 0
+
+        nuevos = [pk for pk, cantidad in finales.items() if cantidad > 0 and pk not in existentes]
+        # Los que siguen en el carrito renuevan su reserva aunque no cambien de cantidad
+        modificados = [item for pk, item in existentes.items() if finales[pk] > 0]
+        quitados = [item.pk for pk, item in existentes.items() if finales[pk] <= 0]
+
+        errores = [
+            {'id_producto': pk, 'error': 'Producto no encontrado'}
+            for pk, cantidad in finales.items() if cantidad > 0 and pk not in productos
+        ]
+        reservados = {pk: item.reservado for pk, item in existentes.items()}
+        try:
+            ajustar_reservas({
+                pk: finales[pk] - reservados.get(pk, 0)
+                for pk in nuevos + [item.id_producto_id for item in modificados] if pk in productos
+            }, excluir=[item.pk for item in existentes.values()])
+        except StockInsuficiente as error:
+            errores += [
+                {'id_producto': pk, 'error': f'Stock insuficiente. Disponible: {libres + reservados.get(pk, 0)}'}
+                for pk, libres in error.disponibles.items()
+            ]
+        if errores:
+            transaction.set_rollback(True)
+            return errores
+
+        expira = expiracion()
+        if nuevos:
+            carrito = carrito or carrito_actual(request, crear=True)
+            CarritoItem.objects.bulk_create([
+                CarritoItem(
+                    id_carrito=carrito,
+                    id_producto=productos[pk],
+                    cantidad=finales[pk],
+                    precio_unitario=productos[pk].precio,
+                    reservado=finales[pk],
+                    reserva_expira=expira
+                )
+                for pk in nuevos
+            ])
+        if modificados:
+            ahora = timezone.now()
+            for item in modificados:
+                item.cantidad = item.reservado = finales[item.id_producto_id]
+                item.reserva_expira = expira
+                # bulk_update no pasa por auto_now
+                item.updated_at = ahora
+            CarritoItem.objects.bulk_update(
+                modificados, ['cantidad', 'reservado', 'reserva_expira', 'updated_at']
+            )
+        if quitados:
+            eliminar_items(CarritoItem.objects.filter(pk__in=quitados))
+    return []
+
+
+def _incrementar(items, cantidad):
+    return items.update(cantidad=F('cantidad') + cantidad, updated_at=timezone.now())
+
+
+def _filtro_carrito(request, crear=False):
+    if request.user.is_authenticated:
+        return {'id_usuario': request.user}
+    clave = clave_carrito(request, crear)
+    return None if clave is None else {'session_id': clave}
@@ -0,0 +1,28 @@
+"""
+Chequeos de configuración (`python manage.py check --deploy`).
+"""
+
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+# Backends que no comparten datos entre procesos
+CACHES_POR_PROCESO = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches, deploy=True)
+def cache_compartido(app_configs, **kwargs):
+    """El cache por defecto debe ser compartido por todos los workers."""
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if backend not in CACHES_POR_PROCESO:
+        return []
+    return [Warning(
+        f"CACHES['default'] usa {backend}, que es de cada proceso.",
+        hint=(
+            'Las versiones de las respuestas cacheadas, los límites de login y la '
+            'lista de JWT revocados necesitan un cache compartido (Redis, Memcached).'
+        ),
+        id='core.W001',
+    )]
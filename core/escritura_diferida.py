@@ -0,0 +1,186 @@
+"""
+Escritura diferida (write-behind) de datos de contabilidad del login.
+
+Guardar `fecha_ultimo_acceso` (y `last_login`) con un `user.save()` por
+login reescribía la fila completa de `usuarios` en el camino crítico; lo
+mismo pasaría con el último uso de cada token (`UsoToken.ultimo_uso`, ver
+`core.autenticacion`) en cada petición autenticada. Aquí esos valores se
+acumulan en memoria, por id y quedándose con el más reciente, y se escriben
+todos juntos con un único UPDATE:
+
+    UPDATE usuarios SET fecha_ultimo_acceso = CASE id_usuario WHEN 1 THEN ... END, ...
+    WHERE id_usuario IN (1, 7, ...)
+
+El buffer se vacía sin hilos propios: al terminar una petición si pasaron
+`INTERVALO` segundos desde el último vaciado (señal `request_finished`, ver
+`core.signals`), de inmediato si acumula `MAX_PENDIENTES` usuarios, y al
+salir el proceso. Si el UPDATE falla los valores vuelven al buffer.
+
+Al salir solo se escribe en la base de datos en la que se anotaron los
+valores: cuando las pruebas terminan, la conexión ya no apunta a la base de
+pruebas sino a la configurada (la real), y lo pendiente se descarta con un
+aviso. Si la base de datos no responde, también.
+"""
+
+import atexit
+import logging
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import Error as ErrorBaseDatos
+from django.db import connections, router
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+INTERVALO_POR_DEFECTO = 5.0
+MAX_PENDIENTES_POR_DEFECTO = 1000
+# Filas por UPDATE (cada una agrega un WHEN por campo)
+_TAMANO_LOTE = 500
+
+
+def parametros():
+    return getattr(settings, 'ESCRITURA_DIFERIDA', {})
+
+
+class BufferEscritura:
+    """Valores pendientes `pk -> {campo: valor}` de `modelo`, escritos en lote."""
+
+    def __init__(self, modelo, campos, intervalo=INTERVALO_POR_DEFECTO,
+                 max_pendientes=MAX_PENDIENTES_POR_DEFECTO):
+        self.modelo = modelo
+        self.campos = tuple(campos)
+        self.intervalo = intervalo
+        self.max_pendientes = max_pendientes
+        self._pendientes = {}
+        # Base de datos en la que se anotó lo pendiente (ver `vaciar_al_salir`)
+        self._base = None
+        self._ultimo_vaciado = time.monotonic()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._pendientes)
+
+    def registrar(self, pk, **valores):
+        """Anota `valores` para `pk`; ante varios, gana el mayor (p. ej. la fecha más reciente)."""
+        base = self._base_actual()
+        with self._lock:
+            self._base = base
+            self._combinar(pk, valores)
+            lleno = len(self._pendientes) >= self.max_pendientes
+        if lleno:
+            self.vaciar()
+
+    def vaciar_si_toca(self):
+        if self._pendientes and time.monotonic() - self._ultimo_vaciado >= self.intervalo:
+            self.vaciar()
+
+    def vaciar(self):
+        """Escribe lo pendiente; devuelve cuántas filas se actualizaron."""
+        with self._lock:
+            pendientes, self._pendientes = self._pendientes, {}
+            self._ultimo_vaciado = time.monotonic()
+        if not pendientes:
+            return 0
+        actualizadas = escritos = 0
+        pks = list(pendientes)
+        try:
+            while escritos < len(pks):
+                lote = pks[escritos:escritos + _TAMANO_LOTE]
+                actualizadas += self._actualizar(lote, pendientes)
+                escritos += len(lote)
+        except ErrorBaseDatos:
+            logger.warning('No se pudo vaciar la escritura diferida de %s', self.modelo.__name__, exc_info=True)
+            with self._lock:
+                for pk in pks[escritos:]:
+                    self._combinar(pk, pendientes[pk])
+        return actualizadas
+
+    def vaciar_al_salir(self):
+        """
+        Último vaciado, desde `atexit`. Se descarta lo pendiente si la conexión
+        ya apunta a otra base de datos (las pruebas destruyeron la suya) o si
+        la base de datos no responde.
+        """
+        with self._lock:
+            pendientes, self._pendientes = self._pendientes, {}
+            base = self._base
+        if not pendientes:
+            return
+        if base != self._base_actual():
+            logger.warning(
+                'Se descartan %d valores de la escritura diferida de %s al salir: '
+                'se anotaron en otra base de datos (%s)', len(pendientes), self.modelo.__name__, base
+            )
+            return
+        pks = list(pendientes)
+        try:
+            for inicio in range(0, len(pks), _TAMANO_LOTE):
+                self._actualizar(pks[inicio:inicio + _TAMANO_LOTE], pendientes)
+        except Exception as error:
+            logger.warning(
+                'Se descartan %d valores de la escritura diferida de %s al salir: %s',
+                len(pks), self.modelo.__name__, error
+            )
+
+    def _base_actual(self):
+        return connections[router.db_for_write(self.modelo)].settings_dict['NAME']
+
+    def _actualizar(self, pks, pendientes):
+        nombre_pk = self.modelo._meta.pk.name
+        cambios = {}
+        for campo in self.campos:
+            casos = [
+                When(**{nombre_pk: pk}, then=Value(pendientes[pk][campo]))
+                for pk in pks if campo in pendientes[pk]
+            ]
+            if casos:
+                cambios[campo] = Case(
+                    *casos, default=F(campo), output_field=self.modelo._meta.get_field(campo)
+                )
+        return self.modelo.objects.filter(**{f'{nombre_pk}__in': pks}).update(**cambios)
+
+    def _combinar(self, pk, valores):
+        actuales = self._pendientes.setdefault(pk, {})
+        for campo, valor in valores.items():
+            if campo not in actuales or valor > actuales[campo]:
+                actuales[campo] = valor
+
+
+@lru_cache(maxsize=None)
+def buffer_accesos():
+    """Buffer (único por proceso) de los accesos de `Usuario`."""
+    from .models import Usuario
+
+    buffer = BufferEscritura(
+        Usuario, ('fecha_ultimo_acceso', 'last_login'),
+        intervalo=parametros().get('INTERVALO', INTERVALO_POR_DEFECTO),
+        max_pendientes=parametros().get('MAX_PENDIENTES', MAX_PENDIENTES_POR_DEFECTO),
+    )
+    atexit.register(buffer.vaciar_al_salir)
+    return buffer
+
+
+@lru_cache(maxsize=None)
+def buffer_usos_token():
+    """Buffer (único por proceso) del último uso de los tokens."""
+    from .models import UsoToken
+
+    buffer = BufferEscritura(
+        UsoToken, ('ultimo_uso',),
+        intervalo=parametros().get('INTERVALO', INTERVALO_POR_DEFECTO),
+        max_pendientes=parametros().get('MAX_PENDIENTES', MAX_PENDIENTES_POR_DEFECTO),
+    )
+    atexit.register(buffer.vaciar_al_salir)
+    return buffer
+
+
+def registrar_acceso(user, momento=None):
+    """Marca el acceso de `user` en memoria y lo deja pendiente de escribir."""
+    momento = momento or timezone.now()
+    user.fecha_ultimo_acceso = momento
+    user.last_login = momento
+    buffer_accesos().registrar(user.pk, fecha_ultimo_acceso=momento, last_login=momento)
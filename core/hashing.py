@@ -0,0 +1,122 @@
+"""
+Hash de contraseñas en un pool de hilos acotado.
+
+Derivar una contraseña (PBKDF2, scrypt) es puro CPU: con cientos de miles de
+iteraciones cuesta cientos de milisegundos, y una ráfaga de logins ocupaba
+todos los hilos de los workers dejando sin atender al catálogo. Aquí:
+
+- Los hashes corren en un `ThreadPoolExecutor` de `HILOS` hilos (hashlib
+  suelta el GIL, así que se reparten entre núcleos), de modo que nunca hay
+  más de `HILOS` derivaciones a la vez por proceso.
+- Como mucho `COLA` peticiones esperan turno; si tras `ESPERA_COLA` segundos
+  no hay lugar, la petición se rechaza con 503 y `Retry-After` en vez de
+  quedarse bloqueando un hilo del worker.
+
+`Usuario.set_password` y `Usuario.check_password` pasan por aquí, así que
+login, registro y cambio de contraseña quedan cubiertos sin tocar las vistas.
+
+`ScryptAjustadoPasswordHasher` es el hasher por defecto (ver
+`PASSWORD_HASHERS`); sus parámetros salen de `HASH_PASSWORD['SCRYPT']` y se
+eligen con `python manage.py ajustar_hasher --objetivo-ms 100`. Los hashes
+PBKDF2 existentes se siguen verificando y se migran en el siguiente login.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.auth.hashers import ScryptPasswordHasher, check_password, make_password
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+HILOS_POR_DEFECTO = min(4, os.cpu_count() or 1)
+COLA_POR_DEFECTO = 16
+ESPERA_COLA_POR_DEFECTO = 2.0
+
+_hilo_del_pool = threading.local()
+
+
+def parametros():
+    return getattr(settings, 'HASH_PASSWORD', {})
+
+
+class HashSaturado(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Demasiados inicios de sesión simultáneos, intenta de nuevo en un momento.'
+    default_code = 'hash_saturado'
+
+    def __init__(self, wait):
+        super().__init__()
+        # El manejador de excepciones de DRF lo envía como Retry-After
+        self.wait = wait
+
+
+class PoolHash:
+    """Ejecuta funciones de hash con concurrencia y cola acotadas."""
+
+    def __init__(self, hilos=HILOS_POR_DEFECTO, cola=COLA_POR_DEFECTO, espera_cola=ESPERA_COLA_POR_DEFECTO):
+        self.espera_cola = espera_cola
+        self._cupos = threading.BoundedSemaphore(hilos + cola)
+        self._ejecutor = ThreadPoolExecutor(
+            max_workers=hilos, thread_name_prefix='hash', initializer=self._marcar_hilo
+        )
+
+    def ejecutar(self, funcion, *args):
+        if getattr(_hilo_del_pool, 'activo', False):
+            # Ya dentro del pool: encolar aquí podría bloquearlo contra sí mismo
+            return funcion(*args)
+        if not self._cupos.acquire(timeout=self.espera_cola):
+            raise HashSaturado(wait=max(int(self.espera_cola), 1))
+        try:
+            return self._ejecutor.submit(funcion, *args).result()
+        finally:
+            self._cupos.release()
+
+    @staticmethod
+    def _marcar_hilo():
+        _hilo_del_pool.activo = True
+
+
+@lru_cache(maxsize=None)
+def pool_hash():
+    """Instancia (única por proceso) configurada con `settings.HASH_PASSWORD`."""
+    return PoolHash(
+        hilos=parametros().get('HILOS', HILOS_POR_DEFECTO),
+        cola=parametros().get('COLA', COLA_POR_DEFECTO),
+        espera_cola=parametros().get('ESPERA_COLA', ESPERA_COLA_POR_DEFECTO),
+    )
+
+
+def hashear_password(raw_password):
+    """`make_password` en el pool."""
+    if raw_password is None:
+        return make_password(None)
+    return pool_hash().ejecutar(make_password, raw_password)
+
+
+def verificar_password(raw_password, encoded):
+    """
+    `(valida, actualizar)`: si `raw_password` corresponde a `encoded` y si el
+    hash debe regenerarse con el hasher o los parámetros actuales.
+    """
+    return pool_hash().ejecutar(_verificar, raw_password, encoded)
+
+
+def _verificar(raw_password, encoded):
+    actualizar = []
+    valida = check_password(raw_password, encoded, setter=lambda _: actualizar.append(True))
+    return valida, bool(actualizar)
+
+
+class ScryptAjustadoPasswordHasher(ScryptPasswordHasher):
+    """scrypt con los parámetros de `HASH_PASSWORD['SCRYPT']` (ver `ajustar_hasher`)."""
+
+    def __init__(self):
+        perfil = parametros().get('SCRYPT', {})
+        self.work_factor = perfil.get('WORK_FACTOR', self.work_factor)
+        self.block_size = perfil.get('BLOCK_SIZE', self.block_size)
+        self.parallelism = perfil.get('PARALLELISM', self.parallelism)
+        # scrypt usa 128 * n * r bytes; el límite por defecto de OpenSSL (32 MiB) no alcanza desde n = 2**15
+        self.maxmem = perfil.get('MAXMEM', 2 * 128 * self.work_factor * self.block_size)
@@ -0,0 +1,170 @@
+"""
+Límite de intentos de login y registro (token bucket por IP y por email).
+
+Cada intento de `/api/auth/login/` o `/api/auth/registro/` deriva una
+contraseña completa (ver `core.hashing`), así que probar listas de
+credenciales robadas salía caro en CPU y no costaba nada al atacante. Aquí
+cada intento consume una ficha de dos cubos, uno de la IP y otro del email
+(con hash, para no guardar correos en las claves de cache); cuando alguno
+está vacío la petición se rechaza con 429 y `Retry-After` desde
+`check_throttles` de DRF, antes de que el serializer llegue a `authenticate`.
+
+El cubo se lleva en su forma GCRA: en vez de (fichas, última recarga) se
+guarda un único instante, el "tiempo teórico de llegada" (TAT), que avanza
+`PERIODO / CAPACIDAD` segundos por intento. Se permite la petición si el TAT
+nuevo no se adelanta más de `PERIODO` segundos al reloj; es exactamente un
+cubo de `CAPACIDAD` fichas que se recarga por completo en `PERIODO` segundos.
+
+- El TAT vive en la cache de Django, que debe ser compartido por todos los
+  workers (`CACHES['default']` en Redis o Memcached; con LocMemCache cada
+  proceso tendría sus propios cubos y el límite se multiplicaría por el
+  número de workers). Lectura y escritura no son atómicas: con intentos
+  simultáneos de la misma clave en workers distintos pueden pasar unos
+  pocos de más, nunca del orden de la capacidad.
+- La IP es `REMOTE_ADDR`. `X-Forwarded-For` solo se usa si
+  `REST_FRAMEWORK['NUM_PROXIES']` dice cuántos proxies de confianza lo
+  completan; si no, cualquier cliente podría cambiarlo en cada intento
+  para estrenar un cubo.
+- Camino rápido en el proceso: al rechazar se anota hasta cuándo la clave
+  está vacía, y mientras tanto se rechaza sin consultar la cache.
+
+Los cubos se configuran en `settings.LIMITE_AUTENTICACION`.
+"""
+
+import hashlib
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.exceptions import Throttled
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+# Cubos por defecto: {acción: {clave: {CAPACIDAD, PERIODO}}}
+CUBOS_POR_DEFECTO = {
+    'LOGIN': {
+        'IP': {'CAPACIDAD': 30, 'PERIODO': 60},
+        'EMAIL': {'CAPACIDAD': 10, 'PERIODO': 10 * 60},
+    },
+    'REGISTRO': {
+        'IP': {'CAPACIDAD': 20, 'PERIODO': 60 * 60},
+        'EMAIL': {'CAPACIDAD': 5, 'PERIODO': 60 * 60},
+    },
+}
+# Claves bloqueadas recordadas en el camino rápido de cada cubo
+MAX_BLOQUEOS_LOCALES = 10000
+
+
+def parametros():
+    return getattr(settings, 'LIMITE_AUTENTICACION', {})
+
+
+class DemasiadosIntentos(Throttled):
+    default_detail = 'Demasiados intentos, espera antes de volver a intentarlo.'
+    extra_detail_singular = 'Podrás intentarlo de nuevo en {wait} segundo.'
+    extra_detail_plural = 'Podrás intentarlo de nuevo en {wait} segundos.'
+
+
+class CuboTokens:
+    """Cubo de `capacidad` fichas por clave que se recarga por completo en `periodo` segundos."""
+
+    def __init__(self, nombre, capacidad, periodo, reloj=time.time):
+        self.nombre = nombre
+        self.capacidad = capacidad
+        self.periodo = periodo
+        self.intervalo = periodo / capacidad
+        self.reloj = reloj
+        self._bloqueos = {}
+        self._lock = threading.Lock()
+
+    def clave(self, clave):
+        return f'limite:{self.nombre}:{clave}'
+
+    def consumir(self, clave):
+        """Gasta una ficha de `clave`; devuelve 0 si había, o los segundos hasta la próxima."""
+        ahora = self.reloj()
+        hasta = self._bloqueos.get(clave)
+        if hasta is not None:
+            if ahora < hasta:
+                return hasta - ahora
+            self._bloqueos.pop(clave, None)
+
+        clave_cache = self.clave(clave)
+        tat = max(cache.get(clave_cache, ahora), ahora)
+        nuevo = tat + self.intervalo
+        if nuevo - ahora > self.periodo:
+            espera = nuevo - ahora - self.periodo
+            self._bloquear(clave, ahora + espera)
+            return espera
+        # Pasado `nuevo` el cubo vuelve a estar lleno y la clave ya no hace falta
+        cache.set(clave_cache, nuevo, timeout=int(nuevo - ahora) + 1)
+        return 0
+
+    def reiniciar(self, clave):
+        self._bloqueos.pop(clave, None)
+        cache.delete(self.clave(clave))
+
+    def _bloquear(self, clave, hasta):
+        with self._lock:
+            if len(self._bloqueos) >= MAX_BLOQUEOS_LOCALES:
+                ahora = self.reloj()
+                self._bloqueos = {c: h for c, h in self._bloqueos.items() if h > ahora}
+                if len(self._bloqueos) >= MAX_BLOQUEOS_LOCALES:
+                    self._bloqueos.clear()
+            self._bloqueos[clave] = hasta
+
+
+@lru_cache(maxsize=None)
+def cubo(accion, por):
+    """Cubo (único por proceso) de `accion` ('LOGIN', 'REGISTRO') por 'IP' o 'EMAIL'."""
+    configuracion = {**CUBOS_POR_DEFECTO.get(accion, {}), **parametros().get(accion, {})}[por]
+    return CuboTokens(
+        f'{accion.lower()}:{por.lower()}', configuracion['CAPACIDAD'], configuracion['PERIODO']
+    )
+
+
+def clave_email(email):
+    return hashlib.sha256(email.strip().lower().encode()).hexdigest()
+
+
+class LimiteAutenticacion(BaseThrottle):
+    """Throttle de DRF que consume de los cubos de `accion` por IP y por email."""
+
+    accion = None
+
+    def allow_request(self, request, view):
+        self.espera = 0
+        if not parametros().get('ACTIVO', True):
+            return True
+        for por, clave in self.claves(request):
+            espera = cubo(self.accion, por).consumir(clave)
+            if espera:
+                # Si la IP ya no tiene fichas no se gasta la del email
+                self.espera = espera
+                return False
+        return True
+
+    def claves(self, request):
+        yield 'IP', self.get_ident(request)
+        email = request.data.get('email') if hasattr(request.data, 'get') else None
+        if isinstance(email, str) and email.strip():
+            yield 'EMAIL', clave_email(email)
+
+    def get_ident(self, request):
+        # Sin proxies declarados X-Forwarded-For lo pone el cliente: no se le cree
+        if api_settings.NUM_PROXIES is None:
+            return request.META.get('REMOTE_ADDR')
+        return super().get_ident(request)
+
+    def wait(self):
+        return self.espera
+
+
+class LimiteLogin(LimiteAutenticacion):
+    accion = 'LOGIN'
+
+
+class LimiteRegistro(LimiteAutenticacion):
+    accion = 'REGISTRO'
@@ -0,0 +1,103 @@
+import statistics
+import time
+
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.core.management.base import BaseCommand
+
+from core.hashing import ScryptAjustadoPasswordHasher, parametros
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide el costo de scrypt (y de argon2 si argon2-cffi está instalado) en este '
+        'servidor y propone el perfil más fuerte que cabe en la latencia objetivo'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--objetivo-ms', type=float, default=100.0,
+                            help='Latencia máxima de un hash, en milisegundos (por defecto 100)')
+        parser.add_argument('--repeticiones', type=int, default=3,
+                            help='Mediciones por configuración; se usa la mediana')
+        parser.add_argument('--max-work-factor', type=int, default=2 ** 17,
+                            help='Mayor N de scrypt a probar (potencia de 2)')
+
+    def handle(self, *args, **options):
+        objetivo = options['objetivo_ms']
+        self.repeticiones = options['repeticiones']
+        self.stdout.write(self.style.WARNING(f'=== AJUSTE DEL HASHER (objetivo: {objetivo:.0f} ms) ===\n'))
+
+        actual = ScryptAjustadoPasswordHasher()
+        self.stdout.write(
+            f'Perfil actual: scrypt N=2**{actual.work_factor.bit_length() - 1} '
+            f'r={actual.block_size} p={actual.parallelism} -> {self.medir(actual):.1f} ms'
+        )
+        self.stdout.write(f'PBKDF2 (referencia): {self.medir(PBKDF2PasswordHasher()):.1f} ms\n')
+
+        elegido = None
+        work_factor = 2 ** 12
+        while work_factor <= options['max_work_factor']:
+            hasher = self.scrypt(work_factor, actual.block_size)
+            ms = self.medir(hasher)
+            cabe = ms <= objetivo
+            self.stdout.write(
+                f'  scrypt N=2**{work_factor.bit_length() - 1} r={actual.block_size} p=1: '
+                f'{ms:7.1f} ms  {128 * work_factor * actual.block_size // 2 ** 20} MiB  '
+                f'{"✓" if cabe else "✗"}'
+            )
+            if not cabe:
+                break
+            elegido = hasher
+            work_factor *= 2
+
+        self.argon2(objetivo)
+
+        if elegido is None:
+            self.stdout.write(self.style.ERROR(
+                '\nNinguna configuración de scrypt cabe en el objetivo; se mantiene el perfil actual'
+            ))
+            return
+        hilos = parametros().get('HILOS', 4)
+        memoria = 128 * elegido.work_factor * elegido.block_size * hilos // 2 ** 20
+        self.stdout.write(self.style.SUCCESS(
+            '\nPerfil recomendado para settings.HASH_PASSWORD:\n'
+            "    'SCRYPT': {\n"
+            f"        'WORK_FACTOR': 2 ** {elegido.work_factor.bit_length() - 1},\n"
+            f"        'BLOCK_SIZE': {elegido.block_size},\n"
+            "        'PARALLELISM': 1,\n"
+            '    },\n'
+            f'Memoria pico con {hilos} hilos de hash: ~{memoria} MiB por proceso'
+        ))
+
+    def medir(self, hasher):
+        tiempos = []
+        for _ in range(self.repeticiones):
+            salt = hasher.salt()
+            inicio = time.perf_counter()
+            hasher.encode('contraseña de prueba', salt)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        return statistics.median(tiempos)
+
+    @staticmethod
+    def scrypt(work_factor, block_size):
+        hasher = ScryptAjustadoPasswordHasher()
+        hasher.work_factor = work_factor
+        hasher.block_size = block_size
+        hasher.parallelism = 1
+        hasher.maxmem = 2 * 128 * work_factor * block_size
+        return hasher
+
+    def argon2(self, objetivo):
+        try:
+            from django.contrib.auth.hashers import Argon2PasswordHasher
+            hasher = Argon2PasswordHasher()
+            hasher._load_library()
+        except ValueError:
+            self.stdout.write('\n  argon2: argon2-cffi no está instalado, se omite')
+            return
+        for memoria in (19 * 1024, 46 * 1024, 64 * 1024):
+            hasher.memory_cost = memoria
+            ms = self.medir(hasher)
+            self.stdout.write(
+                f'  argon2id m={memoria // 1024} MiB t={hasher.time_cost} p={hasher.parallelism}: '
+                f'{ms:7.1f} ms  {"✓" if ms <= objetivo else "✗"}'
+            )
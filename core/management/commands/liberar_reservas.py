@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.reservas import LOTE_POR_DEFECTO, liberar_vencidas, parametros
+
+
+class Command(BaseCommand):
+    help = (
+        'Devuelve al stock disponible las reservas de carrito vencidas, en lotes '
+        'de una transacción cada uno (programarlo cada pocos minutos)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=parametros().get('LOTE', LOTE_POR_DEFECTO),
+                            help='Items liberados por transacción')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        liberados = liberar_vencidas(lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{liberados} reservas vencidas liberadas en {time.perf_counter() - inicio:.2f} s'
+        ))
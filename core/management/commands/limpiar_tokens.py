@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.autenticacion import LOTE_LIMPIEZA_POR_DEFECTO, limpiar_tokens_vencidos, parametros_expiracion
+
+
+class Command(BaseCommand):
+    help = (
+        'Borra los tokens de autenticación vencidos (sin uso en EXPIRACION_TOKENS["TTL"] '
+        'segundos), en lotes de una transacción cada uno (programarlo una vez al día)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int,
+                            default=parametros_expiracion().get('LOTE', LOTE_LIMPIEZA_POR_DEFECTO),
+                            help='Tokens borrados por transacción')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        borrados = limpiar_tokens_vencidos(lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{borrados} tokens vencidos borrados en {time.perf_counter() - inicio:.2f} s'
+        ))
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.purga import EDAD_POR_DEFECTO, LOTE_POR_DEFECTO, PAUSA_POR_DEFECTO, parametros, purgar
+
+
+class Command(BaseCommand):
+    help = (
+        'Borra los carritos anónimos abandonados (con sus items, liberando sus reservas) '
+        'y las sesiones vencidas, en lotes de una transacción cada uno'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--edad', type=int, default=parametros().get('EDAD', EDAD_POR_DEFECTO),
+                            help='Segundos sin cambios tras los que un carrito anónimo se considera abandonado')
+        parser.add_argument('--lote', type=int, default=parametros().get('LOTE', LOTE_POR_DEFECTO),
+                            help='Filas borradas por transacción')
+        parser.add_argument('--pausa', type=float, default=parametros().get('PAUSA', PAUSA_POR_DEFECTO),
+                            help='Segundos de espera entre lotes')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        borrados = purgar(edad=options['edad'], lote=options['lote'], pausa=options['pausa'])
+        segundos = time.perf_counter() - inicio
+        filas = sum(borrados.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"{borrados['carritos']} carritos, {borrados['items']} items y {borrados['sesiones']} "
+            f"sesiones borrados en {segundos:.2f} s ({filas / segundos if segundos else 0:.0f} filas/s)"
+        ))
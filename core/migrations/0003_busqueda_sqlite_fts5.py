@@ -0,0 +1,83 @@
+"""
+Índice de texto completo FTS5 para `SQLiteFTS5Backend`.
+
+Crea la tabla virtual `productos_fts` con contenido externo sobre `productos`
+y los triggers que la mantienen al día. En otros motores no hace nada.
+
+Nota: si una migración futura reconstruye la tabla `productos` en SQLite
+(cambios de columna), hay que volver a crear los triggers.
+"""
+
+from django.db import migrations
+
+CREAR = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS productos_fts USING fts5(
+        nombre, descripcion, descripcion_corta, sku,
+        content='productos', content_rowid='id_producto',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS productos_fts_ai AFTER INSERT ON productos BEGIN
+        INSERT INTO productos_fts(rowid, nombre, descripcion, descripcion_corta, sku)
+        VALUES (new.id_producto, new.nombre, new.descripcion, new.descripcion_corta, new.sku);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS productos_fts_ad AFTER DELETE ON productos BEGIN
+        INSERT INTO productos_fts(productos_fts, rowid, nombre, descripcion, descripcion_corta, sku)
+        VALUES ('delete', old.id_producto, old.nombre, old.descripcion, old.descripcion_corta, old.sku);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS productos_fts_au
+    AFTER UPDATE OF nombre, descripcion, descripcion_corta, sku ON productos BEGIN
+        INSERT INTO productos_fts(productos_fts, rowid, nombre, descripcion, descripcion_corta, sku)
+        VALUES ('delete', old.id_producto, old.nombre, old.descripcion, old.descripcion_corta, old.sku);
+        INSERT INTO productos_fts(rowid, nombre, descripcion, descripcion_corta, sku)
+        VALUES (new.id_producto, new.nombre, new.descripcion, new.descripcion_corta, new.sku);
+    END
+    """,
+    # Indexar los productos existentes
+    "INSERT INTO productos_fts(productos_fts) VALUES ('rebuild')",
+]
+
+ELIMINAR = [
+    'DROP TRIGGER IF EXISTS productos_fts_au',
+    'DROP TRIGGER IF EXISTS productos_fts_ad',
+    'DROP TRIGGER IF EXISTS productos_fts_ai',
+    'DROP TABLE IF EXISTS productos_fts',
+]
+
+
+def fts5_disponible(connection):
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        return any('FTS5' in opcion for (opcion,) in cursor.fetchall())
+
+
+def crear_fts5(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite' or not fts5_disponible(connection):
+        return
+    for sentencia in CREAR:
+        schema_editor.execute(sentencia)
+
+
+def eliminar_fts5(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sentencia in ELIMINAR:
+        schema_editor.execute(sentencia)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_favorito_resena'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_fts5, eliminar_fts5),
+    ]
@@ -0,0 +1,34 @@
+"""
+Índice FULLTEXT para `MySQLFulltextBackend`.
+
+InnoDB mantiene el índice automáticamente en cada INSERT/UPDATE/DELETE.
+En otros motores no hace nada.
+"""
+
+from django.db import migrations
+
+
+def crear_fulltext(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    schema_editor.execute(
+        'ALTER TABLE productos ADD FULLTEXT INDEX productos_texto_ft '
+        '(nombre, descripcion, descripcion_corta, sku)'
+    )
+
+
+def eliminar_fulltext(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    schema_editor.execute('ALTER TABLE productos DROP INDEX productos_texto_ft')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_busqueda_sqlite_fts5'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_fulltext, eliminar_fulltext),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-17 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_busqueda_mysql_fulltext'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['activo', 'precio', 'id_producto'], name='productos_precio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['activo', 'nombre', 'id_producto'], name='productos_nombre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['activo', 'total_ventas', 'id_producto'], name='productos_ventas_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['activo', 'calificacion_promedio', 'id_producto'], name='productos_calificacion_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['activo', 'created_at', 'id_producto'], name='productos_creado_idx'),
+        ),
+    ]
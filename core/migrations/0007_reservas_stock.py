@@ -0,0 +1,39 @@
+# Generated by Django 5.2.7 on 2026-10-17 19:25
+
+import importlib
+
+from django.db import migrations, models
+
+# Agregar una columna NOT NULL reconstruye `productos` en SQLite y se pierden los
+# triggers de FTS5 (ver 0003_busqueda_sqlite_fts5): se vuelven a crear
+fts5 = importlib.import_module('.0003_busqueda_sqlite_fts5', __package__)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_carrito_indice_sesion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='stock_reservado',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(fts5.crear_fts5, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='carritoitem',
+            name='reservado',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='carritoitem',
+            name='reserva_expira',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='carritoitem',
+            index=models.Index(fields=['reserva_expira'], name='carrito_items_reserva_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-17 21:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_reservas_stock'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='carrito',
+            index=models.Index(fields=['id_usuario', 'updated_at'], name='carritos_abandono_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:10
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def registrar_usos(apps, schema_editor):
+    # Los tokens ya emitidos empiezan su plazo al desplegar, no desde su creación
+    Token = apps.get_model('authtoken', 'Token')
+    UsoToken = apps.get_model('core', 'UsoToken')
+    ahora = django.utils.timezone.now()
+    claves = Token.objects.values_list('key', flat=True).iterator(chunk_size=1000)
+    lote = []
+    for clave in claves:
+        lote.append(UsoToken(token_id=clave, ultimo_uso=ahora))
+        if len(lote) == 1000:
+            UsoToken.objects.bulk_create(lote)
+            lote = []
+    UsoToken.objects.bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authtoken', '0004_alter_tokenproxy_options'),
+        ('core', '0008_carrito_indice_abandono'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UsoToken',
+            fields=[
+                ('token', models.OneToOneField(db_column='key', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='uso', serialize=False, to='authtoken.token')),
+                ('ultimo_uso', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'usos_token',
+                'indexes': [models.Index(fields=['ultimo_uso'], name='usos_token_ultimo_uso_idx')],
+            },
+        ),
+        migrations.RunPython(registrar_usos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_uso_token'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['updated_at'], name='productos_modificado_idx'),
+        ),
+    ]
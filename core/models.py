@@ -1,5 +1,8 @@
 from django.db import models
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
+from rest_framework.authtoken.models import Token
+
+from .hashing import hashear_password, verificar_password
 
 class UsuarioManager(BaseUserManager):
     def create_user(self, email, password=None, **extra_fields):
@@ -46,6 +49,20 @@ class Usuario(AbstractBaseUser, PermissionsMixin):
     def __str__(self):
         return f"{self.nombre} {self.apellido}"
 
+    # El hash y la verificación corren en el pool acotado de core.hashing
+    def set_password(self, raw_password):
+        self.password = hashear_password(raw_password)
+        self._password = raw_password
+
+    def check_password(self, raw_password):
+        valida, actualizar = verificar_password(raw_password, self.password)
+        if actualizar:
+            # Hasher o parámetros anteriores: se migra al perfil actual
+            self.set_password(raw_password)
+            self._password = None
+            self.save(update_fields=['password'])
+        return valida
+
 class Categoria(models.Model):
     id_categoria = models.AutoField(primary_key=True)
     nombre = models.CharField(max_length=100)
@@ -92,6 +109,8 @@ class Producto(models.Model):
     precio_original = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     descuento_porcentaje = models.DecimalField(max_digits=5, decimal_places=2, default=0.00)
     stock = models.IntegerField(default=0)
+    # Unidades apartadas por carritos con reserva vigente (ver core.reservas)
+    stock_reservado = models.IntegerField(default=0)
     stock_minimo = models.IntegerField(default=10)
     peso = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)
     dimensiones = models.CharField(max_length=100, null=True, blank=True)
@@ -110,10 +129,38 @@ class Producto(models.Model):
     
     class Meta:
         db_table = 'productos'
+        # Un índice por cada orden de los listados, con id_producto como desempate (paginación por cursor)
+        indexes = [
+            models.Index(fields=['activo', 'precio', 'id_producto'], name='productos_precio_idx'),
+            models.Index(fields=['activo', 'nombre', 'id_producto'], name='productos_nombre_idx'),
+            models.Index(fields=['activo', 'total_ventas', 'id_producto'], name='productos_ventas_idx'),
+            models.Index(fields=['activo', 'calificacion_promedio', 'id_producto'], name='productos_calificacion_idx'),
+            models.Index(fields=['activo', 'created_at', 'id_producto'], name='productos_creado_idx'),
+            # Firma de los índices en memoria (MAX(updated_at)) y sus deltas (ver core.busqueda.catalogo)
+            models.Index(fields=['updated_at'], name='productos_modificado_idx'),
+        ]
     
     def __str__(self):
         return self.nombre
 
+    def save(self, *args, **kwargs):
+        # stock_reservado solo cambia con los UPDATE atómicos de core.reservas: un
+        # guardado completo de una instancia leída antes pisaría las reservas nuevas
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                campo.name for campo in self._meta.concrete_fields
+                if not campo.primary_key and campo.name != 'stock_reservado'
+            ]
+            # Las señales (índices en memoria) ven lo reservado de ahora
+            reservado = Producto.objects.filter(pk=self.pk).values_list('stock_reservado', flat=True).first()
+            if reservado is not None:
+                self.stock_reservado = reservado
+        super().save(*args, **kwargs)
+
+    @property
+    def stock_disponible(self):
+        return self.stock - self.stock_reservado
+
 class ImagenProducto(models.Model):
     id_imagen = models.AutoField(primary_key=True)
     id_producto = models.ForeignKey(Producto, on_delete=models.CASCADE, db_column='id_producto')
@@ -139,6 +186,12 @@ class Carrito(models.Model):
     
     class Meta:
         db_table = 'carritos'
+        # Los carritos anónimos se buscan por el id guardado en la sesión (ver core.carrito)
+        # y los abandonados, anónimos y sin cambios recientes (ver core.purga)
+        indexes = [
+            models.Index(fields=['session_id'], name='carritos_sesion_idx'),
+            models.Index(fields=['id_usuario', 'updated_at'], name='carritos_abandono_idx'),
+        ]
     
     def __str__(self):
         if self.id_usuario:
@@ -146,12 +199,23 @@ class Carrito(models.Model):
         else:
             return f"Carrito sesión {self.session_id}"
     
+    # Con los items ya precargados (ver core.carrito.leer_carrito) los totales se
+    # calculan sobre esas filas en vez de con una consulta de agregado cada uno
+    def _items_precargados(self):
+        return getattr(self, '_prefetched_objects_cache', {}).get('items')
+
     @property
     def total_items(self):
+        items = self._items_precargados()
+        if items is not None:
+            return sum(item.cantidad for item in items)
         return self.items.aggregate(total=models.Sum('cantidad'))['total'] or 0
     
     @property
     def subtotal(self):
+        items = self._items_precargados()
+        if items is not None:
+            return sum((item.subtotal for item in items), 0)
         return self.items.aggregate(
             total=models.Sum(models.F('cantidad') * models.F('precio_unitario'))
         )['total'] or 0
@@ -162,6 +226,9 @@ class CarritoItem(models.Model):
     id_producto = models.ForeignKey(Producto, on_delete=models.CASCADE, db_column='id_producto')
     cantidad = models.IntegerField(default=1)
     precio_unitario = models.DecimalField(max_digits=10, decimal_places=2)
+    # Reserva de stock del item: unidades apartadas y hasta cuándo (ver core.reservas)
+    reservado = models.IntegerField(default=0)
+    reserva_expira = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -170,6 +237,9 @@ class CarritoItem(models.Model):
         constraints = [
             models.UniqueConstraint(fields=['id_carrito', 'id_producto'], name='unique_carrito_producto')
         ]
+        indexes = [
+            models.Index(fields=['reserva_expira'], name='carrito_items_reserva_idx'),
+        ]
     
     def __str__(self):
         return f"{self.cantidad} x {self.id_producto.nombre}"
@@ -218,3 +288,25 @@ class Resena(models.Model):
     
     def __str__(self):
         return f"Reseña {self.calificacion}★ - {self.id_usuario.email}"
+
+
+class UsoToken(models.Model):
+    """
+    Último uso de un token de `authtoken`, para su vencimiento deslizante (ver
+    `core.autenticacion`): vence `EXPIRACION_TOKENS['TTL']` segundos después de
+    `ultimo_uso`. `Token.created` queda como fecha de emisión.
+    """
+    token = models.OneToOneField(
+        Token, on_delete=models.CASCADE, primary_key=True, related_name='uso', db_column='key'
+    )
+    ultimo_uso = models.DateTimeField()
+
+    class Meta:
+        db_table = 'usos_token'
+        # La limpieza de tokens vencidos recorre los más viejos primero
+        indexes = [
+            models.Index(fields=['ultimo_uso'], name='usos_token_ultimo_uso_idx'),
+        ]
+
+    def __str__(self):
+        return f"Uso del token de {self.token.user_id}: {self.ultimo_uso}"
@@ -0,0 +1,162 @@
+"""
+Paginación por cursor (keyset) para los listados de productos.
+
+En lugar de OFFSET, cada página pide "las filas que vienen después de la
+última vista" según el mismo orden del listado:
+
+    WHERE (precio > :p) OR (precio = :p AND id_producto > :id)
+    ORDER BY precio, id_producto LIMIT :n
+
+Con los índices compuestos de `Producto` la página N cuesta lo mismo que la
+primera y el tamaño de la respuesta queda acotado por `limite`.
+
+El orden se toma del queryset que arma cada vista (`orden=precio_asc`,
+`mas_vendidos`, etc.), siempre con la clave primaria como desempate. El cursor
+es opaco para el cliente: los valores de la última fila codificados junto con
+el orden al que pertenecen. La siguiente página se anuncia en el encabezado
+`Link` (rel="next") y, en las respuestas que son objetos, en `siguiente`.
+"""
+
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from .busqueda import paginar_catalogo
+from .models import Producto
+
+
+class PaginacionKeyset(BasePagination):
+    """Página de `limite` filas posteriores al `cursor`; sin cursor, la primera página."""
+
+    parametro_cursor = 'cursor'
+    parametro_limite = 'limite'
+    tamano_pagina = 24
+    tamano_maximo = 100
+    siguiente = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.siguiente = None
+        limite = self.obtener_limite(request)
+        campos = self.campos_orden(queryset)
+        queryset = queryset.order_by(*campos)
+
+        cursor = request.query_params.get(self.parametro_cursor)
+        if cursor:
+            valores = self.decodificar(cursor, queryset.model, campos)
+            queryset = queryset.filter(self.despues_de(campos, valores))
+
+        # Una fila de más para saber si hay página siguiente sin contar
+        pagina = list(queryset[:limite + 1])
+        if len(pagina) > limite:
+            pagina = pagina[:limite]
+            self.siguiente = self.codificar(campos, pagina[-1])
+        return pagina
+
+    def paginate_catalogo(self, request, orden):
+        """
+        Como `paginate_queryset`, pero filtra y ordena en el catálogo columnar
+        en memoria y solo hidrata las filas de la página. Devuelve None si el
+        orden no se puede resolver en memoria.
+        """
+        self.request = request
+        self.siguiente = None
+        limite = self.obtener_limite(request)
+        campos = self.con_desempate(list(orden), Producto._meta.pk.name)
+        cursor = request.query_params.get(self.parametro_cursor)
+        valores = self.decodificar(cursor, Producto, campos) if cursor else None
+
+        ids = paginar_catalogo(request.query_params, campos, valores, limite + 1)
+        if ids is None:
+            return None
+        productos = Producto.objects.filter(activo=True).in_bulk(ids)
+        pagina = [productos[i] for i in ids if i in productos]
+        if len(pagina) > limite:
+            pagina = pagina[:limite]
+            self.siguiente = self.codificar(campos, pagina[-1])
+        return pagina
+
+    def get_paginated_response(self, data):
+        return Response(data, headers=self.encabezados())
+
+    def get_next_link(self):
+        if self.siguiente is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.parametro_cursor, self.siguiente
+        )
+
+    def encabezados(self):
+        siguiente = self.get_next_link()
+        return {'Link': f'<{siguiente}>; rel="next"'} if siguiente else {}
+
+    def obtener_limite(self, request):
+        limite = self.limite_pedido(request)
+        return self.tamano_pagina if limite is None else limite
+
+    def limite_pedido(self, request):
+        """El `limite` de la petición acotado a [1, `tamano_maximo`], o None si falta o no es un número."""
+        try:
+            limite = int(request.query_params[self.parametro_limite])
+        except (KeyError, ValueError):
+            return None
+        return min(max(limite, 1), self.tamano_maximo)
+
+    @classmethod
+    def campos_orden(cls, queryset):
+        """El orden del queryset como nombres de campo, con la clave primaria como desempate."""
+        campos = []
+        for campo in queryset.query.order_by:
+            if not isinstance(campo, str) or campo.lstrip('-') in ('?', 'pk'):
+                raise ValueError(f'Orden no soportado por la paginación por cursor: {campo!r}')
+            campos.append(campo)
+        return cls.con_desempate(campos, queryset.model._meta.pk.name)
+
+    @staticmethod
+    def con_desempate(campos, clave):
+        if not campos or campos[-1].lstrip('-') != clave:
+            # Mismo sentido que el último campo para recorrer el índice compuesto en una sola dirección
+            descendente = bool(campos) and campos[-1].startswith('-')
+            campos.append(f'-{clave}' if descendente else clave)
+        return campos
+
+    @staticmethod
+    def despues_de(campos, valores):
+        """Condición "fila > cursor" en orden lexicográfico sobre `campos`."""
+        condicion = Q()
+        iguales = {}
+        for campo, valor in zip(campos, valores):
+            nombre = campo.lstrip('-')
+            operador = 'lt' if campo.startswith('-') else 'gt'
+            condicion |= Q(**iguales, **{f'{nombre}__{operador}': valor})
+            iguales[nombre] = valor
+        return condicion
+
+    @staticmethod
+    def codificar(campos, fila):
+        valores = []
+        for campo in campos:
+            valor = getattr(fila, campo.lstrip('-'))
+            valores.append(valor if isinstance(valor, (bool, int, str)) or valor is None else str(valor))
+        datos = json.dumps({'o': campos, 'v': valores}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(datos.encode()).decode().rstrip('=')
+
+    @staticmethod
+    def decodificar(cursor, modelo, campos):
+        try:
+            relleno = '=' * (-len(cursor) % 4)
+            datos = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+            if datos['o'] != campos or len(datos['v']) != len(campos):
+                raise ValueError
+            return [
+                modelo._meta.get_field(campo.lstrip('-')).to_python(valor)
+                for campo, valor in zip(campos, datos['v'])
+            ]
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound('Cursor inválido')
@@ -0,0 +1,150 @@
+"""
+Purga de carritos anónimos abandonados y sesiones vencidas.
+
+Cada visitante que agrega algo al carrito deja una fila en `carritos` (y sus
+`carrito_items`), y con el backend de sesiones en base de datos otra en
+`django_session`; nada las borraba, y las tablas crecían sin límite. Aquí se
+borran en lotes acotados, cada uno en su propia transacción corta:
+
+- Un carrito anónimo está abandonado si ni él ni ninguno de sus items cambió
+  en `EDAD` segundos. Los lotes se recorren en el orden del índice
+  `(id_usuario, updated_at)` (con `id_carrito` de desempate, que el índice
+  ya lleva al final), continuando desde el último `(updated_at,
+  id_carrito)` del lote anterior: cada lote lee un tramo del índice, sin
+  OFFSET ni ordenar de nuevo todos los abandonados. Los items de cada lote
+  se borran primero con `eliminar_items`, que libera sus reservas de stock
+  en una sola actualización en vez de una por item.
+- Las sesiones vencidas se buscan por `expire_date`, que tiene índice.
+- Entre lote y lote se duerme `PAUSA` segundos para no acaparar la base de
+  datos ni retener bloqueos.
+
+Se ejecuta con `python manage.py purgar_carritos`, o dentro del proceso: con
+`INTERVALO` configurado, al terminar una petición (señal `request_finished`,
+ver `core.signals`) se purgan hasta `LOTES_POR_TURNO` lotes si pasaron
+`INTERVALO` segundos; un turno en la cache asegura que solo un worker lo haga
+por intervalo.
+"""
+
+import logging
+import time
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import Error as ErrorBaseDatos
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from .models import Carrito, CarritoItem
+from .reservas import eliminar_items
+
+logger = logging.getLogger(__name__)
+
+EDAD_POR_DEFECTO = 30 * 24 * 60 * 60
+LOTE_POR_DEFECTO = 1000
+PAUSA_POR_DEFECTO = 0.1
+LOTES_POR_TURNO_POR_DEFECTO = 1
+CLAVE_TURNO = 'purga:turno'
+
+_ultima_revision = time.monotonic()
+
+
+def parametros():
+    return getattr(settings, 'PURGA_CARRITOS', {})
+
+
+def carritos_abandonados(limite):
+    """Carritos anónimos sin cambios, ni en ellos ni en sus items, desde `limite`."""
+    recientes = CarritoItem.objects.filter(id_carrito=OuterRef('pk'), updated_at__gte=limite)
+    return Carrito.objects.filter(
+        id_usuario__isnull=True, updated_at__lt=limite
+    ).exclude(Exists(recientes))
+
+
+def purgar(edad=None, lote=None, pausa=None, max_lotes=None):
+    """
+    Borra los carritos anónimos abandonados y las sesiones vencidas de a
+    `lote` filas por transacción, durmiendo `pausa` segundos entre lotes y
+    parando tras `max_lotes` lotes de cada tipo. Devuelve cuántos carritos,
+    items y sesiones se borraron.
+    """
+    edad = parametros().get('EDAD', EDAD_POR_DEFECTO) if edad is None else edad
+    lote = lote or parametros().get('LOTE', LOTE_POR_DEFECTO)
+    pausa = parametros().get('PAUSA', PAUSA_POR_DEFECTO) if pausa is None else pausa
+
+    borrados = {'carritos': 0, 'items': 0, 'sesiones': 0}
+    limite = timezone.now() - timedelta(seconds=edad)
+    for lotes, (carritos, items) in enumerate(_lotes_carritos(limite, lote), start=1):
+        borrados['carritos'] += carritos
+        borrados['items'] += items
+        if lotes == max_lotes:
+            break
+        time.sleep(pausa)
+    for lotes, sesiones in enumerate(_lotes_sesiones(lote), start=1):
+        borrados['sesiones'] += sesiones
+        if lotes == max_lotes:
+            break
+        time.sleep(pausa)
+    return borrados
+
+
+def purgar_si_toca():
+    """Turno de purga en el proceso, si `INTERVALO` está configurado y ya pasó."""
+    global _ultima_revision
+
+    intervalo = parametros().get('INTERVALO')
+    if not intervalo or time.monotonic() - _ultima_revision < intervalo:
+        return None
+    _ultima_revision = time.monotonic()
+    # Solo el primer worker que llega en cada intervalo
+    if not cache.add(CLAVE_TURNO, True, timeout=int(intervalo)):
+        return None
+    try:
+        return purgar(
+            pausa=0, max_lotes=parametros().get('LOTES_POR_TURNO', LOTES_POR_TURNO_POR_DEFECTO)
+        )
+    except ErrorBaseDatos:
+        logger.warning('No se pudo purgar los carritos abandonados', exc_info=True)
+        return None
+
+
+def _lotes_carritos(limite, lote):
+    ultimo = None
+    while True:
+        with transaction.atomic():
+            abandonados = carritos_abandonados(limite)
+            if ultimo is not None:
+                abandonados = abandonados.filter(
+                    Q(updated_at__gt=ultimo[0]) | Q(updated_at=ultimo[0], pk__gt=ultimo[1])
+                )
+            filas = list(
+                abandonados.order_by('updated_at', 'pk').values_list('updated_at', 'pk')[:lote]
+            )
+            if not filas:
+                return
+            pks = [pk for _, pk in filas]
+            _, por_modelo = eliminar_items(CarritoItem.objects.filter(id_carrito__in=pks))
+            carritos = Carrito.objects.filter(pk__in=pks).delete()[1].get(Carrito._meta.label, 0)
+        yield carritos, por_modelo.get(CarritoItem._meta.label, 0)
+        if len(filas) < lote:
+            return
+        ultimo = filas[-1]
+
+
+def _lotes_sesiones(lote):
+    if not apps.is_installed('django.contrib.sessions'):
+        return
+    from django.contrib.sessions.models import Session
+
+    while True:
+        claves = list(
+            Session.objects.filter(expire_date__lt=timezone.now())
+            .order_by('expire_date').values_list('pk', flat=True)[:lote]
+        )
+        if not claves:
+            return
+        yield Session.objects.filter(pk__in=claves).delete()[0]
+        if len(claves) < lote:
+            return
@@ -0,0 +1,178 @@
+"""
+Reservas de stock de los carritos.
+
+Verificar `producto.stock < cantidad` y después guardar el item dejaba que dos
+compradores simultáneos se llevaran la última unidad. Ahora agregar al carrito
+aparta unidades por un tiempo limitado:
+
+- Cada item lleva su reserva (`CarritoItem.reservado` unidades hasta
+  `reserva_expira`) y `Producto.stock_reservado` suma las de todos los items;
+  lo disponible es `stock - stock_reservado`.
+- Apartar es un UPDATE condicional, atómico en la base de datos, que no
+  necesita leer antes ni bloquear nada más que la fila del producto:
+
+      UPDATE productos SET stock_reservado = stock_reservado + n
+      WHERE id_producto = ... AND stock >= stock_reservado + n
+
+  Si no actualiza la fila, no había unidades. Varios productos se apartan
+  en un solo UPDATE con CASE, todo o nada.
+- Al vencer, `liberar_vencidas` devuelve las unidades en lotes (ver el
+  comando `liberar_reservas`); si una reserva no alcanza, antes de rechazarla
+  se liberan las vencidas de ese producto. Quitar items libera su reserva
+  (`eliminar_items`, y la señal `post_delete` para cualquier otro borrado).
+- Cada ajuste renueva `Producto.updated_at`, para que los índices en memoria
+  (la disponibilidad de las facetas, ver `core.busqueda.columnas`) lo vean
+  al sincronizar por firma. `Producto.save()` sin `update_fields` no escribe
+  `stock_reservado`: una instancia leída antes pisaría las reservas nuevas.
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import CarritoItem, Producto
+
+TTL_POR_DEFECTO = 15 * 60
+LOTE_POR_DEFECTO = 500
+
+
+def parametros():
+    return getattr(settings, 'RESERVAS', {})
+
+
+class StockInsuficiente(Exception):
+    """No hay unidades para apartar; `disponibles` son las libres de cada producto."""
+
+    def __init__(self, disponibles):
+        super().__init__(disponibles)
+        self.disponibles = disponibles
+
+
+def expiracion():
+    return timezone.now() + timedelta(seconds=parametros().get('TTL', TTL_POR_DEFECTO))
+
+
+def ajustar_reservas(deltas, excluir=()):
+    """
+    Suma `deltas` (`{id_producto: unidades}`) a lo reservado de cada producto.
+    Los aumentos son todos o ninguno: si alguno no tiene unidades libres (ni
+    liberando las reservas vencidas) lanza `StockInsuficiente` sin cambiar nada.
+
+    `excluir` son los items cuya reserva se está ajustando: los deltas se
+    calcularon sobre su `reservado`, así que el barrido no debe liberarlo
+    aunque haya vencido (quedaría apartado de menos).
+    """
+    aumentos = {pk: delta for pk, delta in deltas.items() if delta > 0}
+    if aumentos and not _apartar(aumentos):
+        # Quizás lo ocupan reservas vencidas que el barrido todavía no liberó
+        liberar_vencidas(productos=list(aumentos), excluir=excluir)
+        if not _apartar(aumentos):
+            libres = dict(
+                Producto.objects.filter(pk__in=aumentos).annotate(
+                    libres=F('stock') - F('stock_reservado')
+                ).values_list('pk', 'libres')
+            )
+            raise StockInsuficiente({
+                pk: max(libres.get(pk, 0), 0) for pk, delta in aumentos.items()
+                if libres.get(pk, 0) < delta
+            })
+    liberaciones = {pk: delta for pk, delta in deltas.items() if delta < 0}
+    if liberaciones:
+        # Nunca por debajo de cero: liberar de más dejaría apartar stock que no existe
+        Producto.objects.filter(pk__in=liberaciones).update(
+            stock_reservado=Greatest(F('stock_reservado') + _por_producto(liberaciones), Value(0)),
+            updated_at=timezone.now()
+        )
+
+
+def reservar_item(item, cantidad):
+    """
+    Deja reservadas `cantidad` unidades para `item` (aparta o libera la
+    diferencia) y renueva su vencimiento. Cambia `item` sin guardarlo; debe
+    llamarse dentro de la transacción que lo guarda. Con `cantidad` negativa
+    lanza `ValueError`: no se libera más de lo que el item tiene apartado.
+    """
+    if cantidad < 0:
+        raise ValueError(f'Cantidad a reservar negativa: {cantidad}')
+    try:
+        ajustar_reservas({item.id_producto_id: cantidad - item.reservado}, excluir=[item.pk])
+    except StockInsuficiente as error:
+        # Para el comprador, lo disponible incluye lo que ya tiene apartado
+        raise StockInsuficiente({
+            pk: libres + item.reservado for pk, libres in error.disponibles.items()
+        })
+    item.reservado = cantidad
+    item.reserva_expira = expiracion()
+
+
+def eliminar_items(items):
+    """Borra `items` (un queryset) liberando sus reservas con una sola actualización."""
+    with transaction.atomic():
+        liberaciones = defaultdict(int)
+        for id_producto, reservado in items.select_for_update().filter(
+            reservado__gt=0
+        ).values_list('id_producto', 'reservado'):
+            liberaciones[id_producto] -= reservado
+        if liberaciones:
+            ajustar_reservas(liberaciones)
+            items.update(reservado=0)
+        return items.delete()
+
+
+def liberar_vencidas(lote=None, productos=None, excluir=()):
+    """
+    Libera las reservas vencidas de a `lote` items por transacción (cortas,
+    para no retener bloqueos), salvo las de los items en `excluir`; devuelve
+    cuántos items se liberaron.
+    """
+    lote = lote or parametros().get('LOTE', LOTE_POR_DEFECTO)
+    liberados = 0
+    while True:
+        with transaction.atomic():
+            vencidas = CarritoItem.objects.select_for_update().filter(
+                reservado__gt=0, reserva_expira__lte=timezone.now()
+            )
+            if productos is not None:
+                vencidas = vencidas.filter(id_producto__in=productos)
+            if excluir:
+                vencidas = vencidas.exclude(pk__in=excluir)
+            filas = list(vencidas.order_by('reserva_expira').values_list(
+                'id_item', 'id_producto', 'reservado'
+            )[:lote])
+            if not filas:
+                return liberados
+            liberaciones = defaultdict(int)
+            for _, id_producto, reservado in filas:
+                liberaciones[id_producto] -= reservado
+            ajustar_reservas(liberaciones)
+            CarritoItem.objects.filter(pk__in=[fila[0] for fila in filas]).update(
+                reservado=0, reserva_expira=None
+            )
+        liberados += len(filas)
+        if len(filas) < lote:
+            return liberados
+
+
+def _apartar(aumentos):
+    valores = _por_producto(aumentos)
+    with transaction.atomic():
+        apartados = Producto.objects.filter(
+            pk__in=aumentos, stock__gte=F('stock_reservado') + valores
+        ).update(stock_reservado=F('stock_reservado') + valores, updated_at=timezone.now())
+        if apartados < len(aumentos):
+            # Deshace los que sí alcanzaron
+            transaction.set_rollback(True)
+            return False
+    return True
+
+
+def _por_producto(deltas):
+    return Case(
+        *[When(pk=pk, then=Value(delta)) for pk, delta in deltas.items()],
+        default=Value(0), output_field=IntegerField()
+    )
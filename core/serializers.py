@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from .models import Producto, Categoria, Marca, ImagenProducto, Usuario, Carrito, CarritoItem, Favorito, Resena
 from django.contrib.auth import authenticate
+from .carrito import ORDEN_IMAGEN_PRINCIPAL
 
 class CategoriaSerializer(serializers.ModelSerializer):
     class Meta:
@@ -57,10 +58,8 @@ class UsuarioRegistroSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         validated_data.pop('password_confirm')
         password = validated_data.pop('password')
-        user = Usuario.objects.create_user(**validated_data)
-        user.set_password(password)
-        user.save()
-        return user
+        # create_user ya hashea la contraseña: un solo hash y un solo INSERT
+        return Usuario.objects.create_user(password=password, **validated_data)
 
 class UsuarioLoginSerializer(serializers.Serializer):
     email = serializers.EmailField()
@@ -224,8 +223,26 @@ class ProductoSerializer(serializers.ModelSerializer):
     
 #CARRITO DE COMPRAS
 
+class ProductoTarjetaSerializer(serializers.ModelSerializer):
+    """Lo que muestra la tarjeta de un producto: sin descripciones, categoría, marca ni galería."""
+    imagen_principal = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Producto
+        fields = [
+            'id_producto', 'nombre', 'sku', 'precio', 'precio_original',
+            'descuento_porcentaje', 'stock', 'activo', 'en_oferta', 'imagen_principal'
+        ]
+
+    def get_imagen_principal(self, obj):
+        # Las lecturas en lote la traen anotada (ver core.carrito.CAMPOS_TARJETA)
+        if hasattr(obj, 'url_imagen_principal'):
+            return obj.url_imagen_principal
+        imagen = obj.imagenproducto_set.order_by(*ORDEN_IMAGEN_PRINCIPAL).first()
+        return imagen.url_imagen if imagen else None
+
 class CarritoItemSerializer(serializers.ModelSerializer):
-    producto = ProductoSerializer(source='id_producto', read_only=True)
+    producto = ProductoTarjetaSerializer(source='id_producto', read_only=True)
     subtotal = serializers.SerializerMethodField()
     
     class Meta:
@@ -250,6 +267,20 @@ class CarritoSerializer(serializers.ModelSerializer):
             'items', 'total_items', 'subtotal', 'created_at'
         ]
 
+class OperacionCarritoSerializer(serializers.Serializer):
+    operacion = serializers.ChoiceField(choices=['agregar', 'fijar', 'quitar'])
+    id_producto = serializers.IntegerField()
+    # agregar suma `cantidad`, fijar la reemplaza (0 quita el item) y quitar la ignora
+    cantidad = serializers.IntegerField(min_value=0, default=1)
+
+    def validate(self, data):
+        if data['operacion'] == 'agregar' and data['cantidad'] < 1:
+            raise serializers.ValidationError("La cantidad a agregar debe ser al menos 1")
+        return data
+
+class LoteCarritoSerializer(serializers.Serializer):
+    operaciones = OperacionCarritoSerializer(many=True, allow_empty=False, max_length=100)
+
 # Agrega al final de serializers.py
 
 # FAVORITOS Y RESEÑAS
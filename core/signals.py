@@ -0,0 +1,205 @@
+"""
+Señales del app `core`.
+
+Mantienen sincronizadas las estructuras en memoria (índices de búsqueda y
+autocompletado, catálogo columnar) con las escrituras sobre los modelos,
+invalidan las respuestas y los tokens cacheados que dependen de ellos, abren
+el registro de uso de cada token nuevo y devuelven el stock reservado por
+los items de carrito que se borran. Al terminar cada petición vacían la
+escritura diferida y, si toca, purgan los carritos abandonados. Se
+registran en `CoreConfig.ready`.
+"""
+
+from django.contrib.auth.hashers import get_hashers, get_hashers_by_algorithm
+from django.contrib.auth.models import update_last_login
+from django.contrib.auth.signals import user_logged_in
+from django.core.signals import request_finished, request_started, setting_changed
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .autenticacion import cache_tokens, invalidar_token, invalidar_usuario
+from .busqueda import catalogo_columnar, indice_autocompletado, indice_productos, obtener_backend
+from .busqueda.catalogo import abrir_ronda, cerrar_ronda
+from .busqueda.texto import limpiar_caches
+from .cache import cache_respuestas, incrementar_version
+from .escritura_diferida import buffer_accesos, buffer_usos_token, registrar_acceso
+from .hashing import pool_hash
+from .limites import cubo
+from .models import CarritoItem, Categoria, ImagenProducto, Marca, Producto, Usuario, UsoToken
+from .purga import purgar_si_toca
+from .reservas import ajustar_reservas
+
+
+def _indexar_producto(producto):
+    indice_productos.indexar(producto)
+    indice_autocompletado.indexar(producto)
+    catalogo_columnar.indexar(producto)
+
+
+def _desindexar_producto(id_producto):
+    indice_productos.eliminar(id_producto)
+    indice_autocompletado.eliminar(id_producto)
+    catalogo_columnar.eliminar(id_producto)
+
+
+@receiver(post_save, sender=Producto)
+def indexar_producto(sender, instance, **kwargs):
+    transaction.on_commit(lambda: _indexar_producto(instance))
+
+
+@receiver(post_delete, sender=Producto)
+def desindexar_producto(sender, instance, **kwargs):
+    id_producto = instance.pk
+    transaction.on_commit(lambda: _desindexar_producto(id_producto))
+
+
+def _indexar_marca(marca):
+    indice_productos.indexar_marca(marca)
+    indice_autocompletado.indexar_marca(marca)
+
+
+def _desindexar_marca(id_marca):
+    indice_productos.eliminar_marca(id_marca)
+    indice_autocompletado.eliminar_marca(id_marca)
+
+
+@receiver(post_save, sender=Marca)
+def indexar_marca(sender, instance, **kwargs):
+    transaction.on_commit(lambda: _indexar_marca(instance))
+
+
+@receiver(post_delete, sender=Marca)
+def desindexar_marca(sender, instance, **kwargs):
+    id_marca = instance.pk
+    transaction.on_commit(lambda: _desindexar_marca(id_marca))
+
+
+@receiver(post_save, sender=Categoria)
+def indexar_categoria(sender, instance, **kwargs):
+    transaction.on_commit(lambda: indice_autocompletado.indexar_categoria(instance))
+
+
+@receiver(post_delete, sender=Categoria)
+def desindexar_categoria(sender, instance, **kwargs):
+    id_categoria = instance.pk
+    transaction.on_commit(lambda: indice_autocompletado.eliminar_categoria(id_categoria))
+
+
+@receiver([post_save, post_delete], sender=Producto)
+@receiver([post_save, post_delete], sender=ImagenProducto)
+@receiver([post_save, post_delete], sender=Categoria)
+@receiver([post_save, post_delete], sender=Marca)
+def invalidar_respuestas(sender, **kwargs):
+    # Ya, para que la propia transacción no lea respuestas viejas, y otra vez
+    # al confirmar: una lectura concurrente pudo cachear los datos anteriores
+    # con la versión intermedia
+    incrementar_version(sender)
+    transaction.on_commit(lambda: incrementar_version(sender))
+
+
+def _invalidar_tokens(keys, id_usuario=None):
+    # Ya y al confirmar: una autenticación concurrente pudo recachear el estado anterior
+    def invalidar():
+        for key in keys:
+            invalidar_token(key)
+        if id_usuario is not None:
+            invalidar_usuario(id_usuario)
+
+    invalidar()
+    transaction.on_commit(invalidar)
+
+
+@receiver([post_save, post_delete], sender=Token)
+def invalidar_token_guardado(sender, instance, **kwargs):
+    _invalidar_tokens([instance.key])
+
+
+@receiver(post_save, sender=Token)
+def registrar_uso_token(sender, instance, created, **kwargs):
+    # El plazo de vencimiento de un token nuevo corre desde su emisión
+    if created:
+        UsoToken.objects.create(token=instance, ultimo_uso=instance.created)
+
+
+@receiver([post_save, post_delete], sender=Usuario)
+def invalidar_usuario_guardado(sender, instance, **kwargs):
+    # Contraseña nueva, desactivación o datos de perfil: el usuario cacheado ya no
+    # vale. Los tokens cacheados no llevan datos del usuario, no hace falta tocarlos
+    _invalidar_tokens([], instance.pk)
+
+
+@receiver(post_delete, sender=CarritoItem)
+def liberar_reserva_item(sender, instance, **kwargs):
+    # Cualquier borrado (también en cascada desde el carrito) devuelve lo apartado;
+    # core.reservas.eliminar_items libera en lote y deja `reservado` en 0 antes
+    if instance.reservado:
+        ajustar_reservas({instance.id_producto_id: -instance.reservado})
+
+
+# El último acceso se escribe en lote (ver core.escritura_diferida), no con un UPDATE por login
+user_logged_in.disconnect(update_last_login, dispatch_uid='update_last_login')
+
+
+@receiver(user_logged_in)
+def registrar_acceso_login(sender, request, user, **kwargs):
+    registrar_acceso(user)
+
+
+@receiver(request_started)
+def abrir_ronda_catalogo(sender, **kwargs):
+    abrir_ronda()
+
+
+@receiver(request_finished)
+def cerrar_ronda_catalogo(sender, **kwargs):
+    cerrar_ronda()
+
+
+@receiver(request_finished)
+def vaciar_escritura_diferida(sender, **kwargs):
+    buffer_accesos().vaciar_si_toca()
+    buffer_usos_token().vaciar_si_toca()
+
+
+@receiver(request_finished)
+def purgar_carritos_abandonados(sender, **kwargs):
+    purgar_si_toca()
+
+
+@receiver(setting_changed)
+def recargar_backend_busqueda(sender, setting, **kwargs):
+    if setting == 'BUSQUEDA':
+        obtener_backend.cache_clear()
+        limpiar_caches()
+
+
+@receiver(setting_changed)
+def recargar_cache_respuestas(sender, setting, **kwargs):
+    if setting == 'CACHE_RESPUESTAS':
+        cache_respuestas.cache_clear()
+    elif setting == 'CACHE_TOKENS':
+        cache_tokens.cache_clear()
+
+
+@receiver(setting_changed)
+def recargar_hash_password(sender, setting, **kwargs):
+    if setting == 'HASH_PASSWORD':
+        pool_hash.cache_clear()
+        get_hashers.cache_clear()
+        get_hashers_by_algorithm.cache_clear()
+
+
+@receiver(setting_changed)
+def recargar_escritura_diferida(sender, setting, **kwargs):
+    if setting == 'ESCRITURA_DIFERIDA':
+        for buffer in (buffer_accesos, buffer_usos_token):
+            buffer().vaciar()
+            buffer.cache_clear()
+
+
+@receiver(setting_changed)
+def recargar_limite_autenticacion(sender, setting, **kwargs):
+    if setting == 'LIMITE_AUTENTICACION':
+        cubo.cache_clear()
@@ -6,7 +6,7 @@ RF03 - Recuperar contraseña
 RF04 - Verificar correo y teléfono
 """
 
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase, APIClient
@@ -506,3 +506,655 @@ class CambioPasswordTestCase(APITestCase):
         )
         
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TokenCacheadoTestCase(APITestCase):
+    """
+    RF02 - Iniciar sesión
+    Casos de prueba de la autenticación por token con cache
+    """
+
+    def setUp(self):
+        """Configuración inicial"""
+        self.client = APIClient()
+        self.perfil_url = '/api/auth/perfil/'
+        self.test_user = Usuario.objects.create_user(
+            email='cache@test.com',
+            nombre='Cache',
+            apellido='Test',
+            password='OldPassword123!'
+        )
+        self.token = Token.objects.create(user=self.test_user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def consultas_de_autenticacion(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(self.perfil_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [c['sql'] for c in consultas.captured_queries if 'authtoken_token' in c['sql']]
+
+    def test_sin_consultas_en_regimen_estable(self):
+        """
+        CP117: Tras la primera petición el token se resuelve sin consultar la base de datos
+        """
+        self.assertEqual(len(self.consultas_de_autenticacion()), 1)
+        self.assertEqual(self.consultas_de_autenticacion(), [])
+
+    def test_logout_invalida(self):
+        """
+        CP118: Después del logout el token cacheado deja de aceptarse
+        """
+        self.client.get(self.perfil_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/auth/logout/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(self.perfil_url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_cambio_password_invalida(self):
+        """
+        CP119: Tras cambiar la contraseña no se usa el usuario cacheado con la anterior
+        """
+        self.client.get(self.perfil_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/auth/cambiar_password/', {
+                'password_actual': 'OldPassword123!',
+                'nuevo_password': 'NewPassword123!',
+                'confirmar_password': 'NewPassword123!'
+            }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.post('/api/auth/cambiar_password/', {
+            'password_actual': 'NewPassword123!',
+            'nuevo_password': 'OtherPassword123!',
+            'confirmar_password': 'OtherPassword123!'
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_desactivacion_invalida(self):
+        """
+        CP120: Un usuario desactivado deja de autenticarse aunque su token estuviera en cache
+        """
+        self.client.get(self.perfil_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.test_user.is_active = False
+            self.test_user.save()
+        self.assertEqual(self.client.get(self.perfil_url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_cache_con_valores_planos(self):
+        """
+        CP173: El cache guarda solo valores planos (sin la contraseña) y cada petición recibe su propio usuario
+        """
+        import pickle
+        from django.db.models import Model
+        from core.autenticacion import TokenCacheadoAuthentication, cache_tokens, clave_token
+
+        autenticacion = TokenCacheadoAuthentication()
+        usuario_a, token_a = autenticacion.authenticate_credentials(self.token.key)
+        usuario_b, _ = autenticacion.authenticate_credentials(self.token.key)
+        self.assertIsNot(usuario_a, usuario_b)
+        self.assertEqual((usuario_a.pk, token_a.key), (self.test_user.pk, self.token.key))
+
+        usuario_a.nombre = 'Cambiado'
+        self.assertEqual(autenticacion.authenticate_credentials(self.token.key)[0].nombre, 'Cache')
+        for clave in (clave_token(self.token.key), f'usuario:{self.test_user.pk}'):
+            guardado = cache_tokens().get(clave)
+            self.assertFalse(any(isinstance(valor, Model) for valor in guardado.values()))
+            self.assertNotIn(self.test_user.password.encode(), pickle.dumps(guardado))
+
+        # La contraseña se lee al usarla, con su valor actual
+        self.assertTrue(usuario_b.check_password('OldPassword123!'))
+
+
+@override_settings(AUTENTICACION={'MODO': 'jwt'})
+class AutenticacionJWTTestCase(APITestCase):
+    """
+    RF02 - Iniciar sesión
+    Casos de prueba del modo JWT (access corto, refresh rotativo y revocación)
+    """
+
+    def setUp(self):
+        """Configuración inicial"""
+        self.client = APIClient()
+        self.perfil_url = '/api/auth/perfil/'
+        self.test_user = Usuario.objects.create_user(
+            email='jwt@test.com',
+            nombre='Jwt',
+            apellido='Test',
+            password='Password123!'
+        )
+        response = self.client.post('/api/auth/login/', {
+            'email': 'jwt@test.com',
+            'password': 'Password123!'
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.credenciales = response.data
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.credenciales['access'])
+
+    def test_login_emite_par_jwt(self):
+        """
+        CP121: El login emite access y refresh, y autenticar no consulta la base de datos
+        """
+        self.assertIn('access', self.credenciales)
+        self.assertIn('refresh', self.credenciales)
+        self.assertNotIn('token', self.credenciales)
+        self.assertFalse(Token.objects.filter(user=self.test_user).exists())
+
+        self.assertEqual(self.client.get(self.perfil_url).status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.perfil_url)
+        self.assertEqual(response.data['email'], 'jwt@test.com')
+
+    def test_refresh_rota(self):
+        """
+        CP122: Refrescar devuelve un par nuevo y el refresh usado deja de servir
+        """
+        response = self.client.post(
+            '/api/auth/refrescar/', {'refresh': self.credenciales['refresh']}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response.data['refresh'], self.credenciales['refresh'])
+
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + response.data['access'])
+        self.assertEqual(self.client.get(self.perfil_url).status_code, status.HTTP_200_OK)
+
+        reusado = self.client.post(
+            '/api/auth/refrescar/', {'refresh': self.credenciales['refresh']}, format='json'
+        )
+        self.assertEqual(reusado.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_refresh_con_access_vencido(self):
+        """
+        CP172: Refrescar funciona aunque el cliente siga enviando el access vencido
+        """
+        from datetime import timedelta
+        from django.utils import timezone
+        from rest_framework_simplejwt.tokens import AccessToken
+
+        vencido = AccessToken.for_user(self.test_user)
+        vencido.set_exp(from_time=timezone.now() - timedelta(hours=1))
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {vencido}')
+        self.assertEqual(self.client.get(self.perfil_url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        response = self.client.post(
+            '/api/auth/refrescar/', {'refresh': self.credenciales['refresh']}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('access', response.data)
+
+    def test_logout_revoca(self):
+        """
+        CP123: Después del logout ni el access ni el refresh se aceptan
+        """
+        response = self.client.post(
+            '/api/auth/logout/', {'refresh': self.credenciales['refresh']}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(self.perfil_url).status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.post(
+            '/api/auth/refrescar/', {'refresh': self.credenciales['refresh']}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_cambio_password_revoca(self):
+        """
+        CP124: Cambiar la contraseña invalida los JWT emitidos antes
+        """
+        self.client.get(self.perfil_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.test_user.set_password('NewPassword123!')
+            self.test_user.save()
+        self.assertEqual(self.client.get(self.perfil_url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class HashPasswordTestCase(APITestCase):
+    """
+    RF01/RF02 - Registro e inicio de sesión
+    Casos de prueba del hash de contraseñas en el pool acotado
+    """
+
+    def setUp(self):
+        """Configuración inicial"""
+        self.client = APIClient()
+
+    def test_registro_hashea_una_vez(self):
+        """
+        CP125: Registrar un usuario deriva la contraseña una sola vez y con scrypt
+        """
+        from unittest import mock
+        from core import hashing
+
+        with mock.patch.object(hashing, 'make_password', wraps=hashing.make_password) as make_password:
+            response = self.client.post('/api/auth/registro/', {
+                'nombre': 'Ana',
+                'apellido': 'Gómez',
+                'email': 'ana@test.com',
+                'password': 'Password123!',
+                'password_confirm': 'Password123!'
+            }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(make_password.call_count, 1)
+        usuario = Usuario.objects.get(email='ana@test.com')
+        self.assertTrue(usuario.password.startswith('scrypt$'))
+        self.assertTrue(usuario.check_password('Password123!'))
+
+    def test_login_migra_hash_pbkdf2(self):
+        """
+        CP126: Un hash PBKDF2 existente sigue sirviendo y se migra a scrypt al iniciar sesión
+        """
+        from django.contrib.auth.hashers import make_password
+
+        usuario = Usuario.objects.create_user(email='legado@test.com', nombre='Legado', apellido='Test')
+        Usuario.objects.filter(pk=usuario.pk).update(
+            password=make_password('Password123!', hasher='pbkdf2_sha256')
+        )
+        response = self.client.post('/api/auth/login/', {
+            'email': 'legado@test.com',
+            'password': 'Password123!'
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        usuario.refresh_from_db()
+        self.assertTrue(usuario.password.startswith('scrypt$'))
+
+    @override_settings(HASH_PASSWORD={'HILOS': 1, 'COLA': 0, 'ESPERA_COLA': 0.1})
+    def test_pool_saturado_responde_503(self):
+        """
+        CP127: Con el pool lleno el login se rechaza de inmediato con 503 y Retry-After
+        """
+        import threading
+        from core.hashing import pool_hash
+
+        Usuario.objects.create_user(
+            email='storm@test.com', nombre='Storm', apellido='Test', password='Password123!'
+        )
+        ocupado = threading.Event()
+        liberar = threading.Event()
+
+        def hash_lento():
+            ocupado.set()
+            liberar.wait(5)
+
+        hilo = threading.Thread(target=pool_hash().ejecutar, args=(hash_lento,))
+        hilo.start()
+        try:
+            ocupado.wait(5)
+            response = self.client.post('/api/auth/login/', {
+                'email': 'storm@test.com',
+                'password': 'Password123!'
+            }, format='json')
+        finally:
+            liberar.set()
+            hilo.join()
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertIn('Retry-After', response)
+
+        # Con el pool libre el mismo login pasa
+        response = self.client.post('/api/auth/login/', {
+            'email': 'storm@test.com',
+            'password': 'Password123!'
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_ajustar_hasher(self):
+        """
+        CP128: El comando de ajuste mide scrypt y propone un perfil para la latencia objetivo
+        """
+        from io import StringIO
+        from django.core.management import call_command
+
+        salida = StringIO()
+        call_command(
+            'ajustar_hasher', objetivo_ms=10000, repeticiones=1, max_work_factor=2 ** 13, stdout=salida
+        )
+        self.assertIn("'WORK_FACTOR': 2 ** 13", salida.getvalue())
+
+
+class EscrituraDiferidaTestCase(APITestCase):
+    """
+    RF02 - Iniciar sesión
+    Casos de prueba del último acceso escrito en lote
+    """
+
+    def setUp(self):
+        """Configuración inicial"""
+        from core.escritura_diferida import buffer_accesos
+
+        self.client = APIClient()
+        self.buffer = buffer_accesos()
+        self.buffer.vaciar()
+        self.usuarios = [
+            Usuario.objects.create_user(
+                email=f'acceso{i}@test.com', nombre='Acceso', apellido=str(i), password='Password123!'
+            )
+            for i in range(3)
+        ]
+
+    def test_login_sin_escrituras_de_contabilidad(self):
+        """
+        CP129: El login no reescribe la fila del usuario ni crea sesiones; el acceso llega al vaciar
+        """
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        Token.objects.create(user=self.usuarios[0])
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.post('/api/auth/login/', {
+                'email': 'acceso0@test.com',
+                'password': 'Password123!'
+            }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNotNone(response.data['user']['fecha_ultimo_acceso'])
+        escrituras = [
+            c['sql'] for c in consultas.captured_queries
+            if c['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))
+        ]
+        self.assertEqual(escrituras, [])
+
+        self.assertEqual(self.buffer.vaciar(), 1)
+        usuario = Usuario.objects.get(pk=self.usuarios[0].pk)
+        self.assertIsNotNone(usuario.fecha_ultimo_acceso)
+        self.assertEqual(usuario.last_login, usuario.fecha_ultimo_acceso)
+
+    def test_un_update_para_varios_usuarios(self):
+        """
+        CP130: Los accesos pendientes de varios usuarios se escriben con un solo UPDATE
+        """
+        from datetime import timedelta
+        from django.utils import timezone
+        from core.escritura_diferida import registrar_acceso
+
+        ahora = timezone.now()
+        for i, usuario in enumerate(self.usuarios):
+            registrar_acceso(usuario, ahora - timedelta(minutes=i))
+        # Un acceso más viejo no pisa al más reciente
+        registrar_acceso(self.usuarios[0], ahora - timedelta(hours=1))
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.buffer.vaciar(), 3)
+        fechas = dict(Usuario.objects.filter(
+            pk__in=[u.pk for u in self.usuarios]
+        ).values_list('pk', 'fecha_ultimo_acceso'))
+        for i, usuario in enumerate(self.usuarios):
+            self.assertEqual(fechas[usuario.pk], ahora - timedelta(minutes=i))
+
+    def test_vaciado_por_tamano(self):
+        """
+        CP131: Al llegar a MAX_PENDIENTES el buffer se vacía sin esperar el intervalo
+        """
+        from django.utils import timezone
+        from core.escritura_diferida import BufferEscritura
+
+        buffer = BufferEscritura(Usuario, ('fecha_ultimo_acceso',), intervalo=3600, max_pendientes=2)
+        buffer.registrar(self.usuarios[0].pk, fecha_ultimo_acceso=timezone.now())
+        self.assertEqual(len(buffer), 1)
+        buffer.registrar(self.usuarios[1].pk, fecha_ultimo_acceso=timezone.now())
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(
+            Usuario.objects.filter(fecha_ultimo_acceso__isnull=False).count(), 2
+        )
+
+    def test_vaciado_al_salir_sin_base_de_datos(self):
+        """
+        CP169: Al salir, lo pendiente se descarta con un aviso sin traza si la conexión ya apunta a otra
+        base de datos (las pruebas destruyeron la suya) o si la base de datos no responde
+        """
+        from unittest import mock
+        from django.db import OperationalError, connection
+        from django.utils import timezone
+        from core.escritura_diferida import BufferEscritura
+
+        buffer = BufferEscritura(Usuario, ('fecha_ultimo_acceso',), intervalo=3600)
+        buffer.registrar(self.usuarios[0].pk, fecha_ultimo_acceso=timezone.now())
+        with mock.patch.dict(connection.settings_dict, {'NAME': 'alkosto_db'}), \
+                mock.patch.object(buffer, '_actualizar') as actualizar:
+            with self.assertLogs('core.escritura_diferida', 'WARNING'):
+                buffer.vaciar_al_salir()
+        actualizar.assert_not_called()
+        self.assertEqual(len(buffer), 0)
+
+        buffer.registrar(self.usuarios[0].pk, fecha_ultimo_acceso=timezone.now())
+        with mock.patch.object(buffer, '_actualizar', side_effect=OperationalError('no such table: usuarios')):
+            with self.assertLogs('core.escritura_diferida', 'WARNING') as avisos:
+                buffer.vaciar_al_salir()
+        self.assertEqual(len(buffer), 0)
+        self.assertIsNone(avisos.records[0].exc_info)
+
+        buffer.registrar(self.usuarios[1].pk, fecha_ultimo_acceso=timezone.now())
+        buffer.vaciar_al_salir()
+        self.assertEqual(len(buffer), 0)
+        self.assertTrue(
+            Usuario.objects.filter(pk=self.usuarios[1].pk, fecha_ultimo_acceso__isnull=False).exists()
+        )
+
+
+@override_settings(LIMITE_AUTENTICACION={
+    'LOGIN': {
+        'IP': {'CAPACIDAD': 5, 'PERIODO': 60},
+        'EMAIL': {'CAPACIDAD': 3, 'PERIODO': 60},
+    },
+    'REGISTRO': {
+        'IP': {'CAPACIDAD': 2, 'PERIODO': 3600},
+        'EMAIL': {'CAPACIDAD': 5, 'PERIODO': 3600},
+    },
+})
+class LimiteAutenticacionTestCase(APITestCase):
+    """
+    RF02 - Iniciar sesión
+    Casos de prueba del límite de intentos por IP y por email
+    """
+
+    def setUp(self):
+        """Configuración inicial"""
+        from django.core.cache import cache
+        from core.limites import cubo
+
+        # Sin fichas gastadas ni bloqueos locales de pruebas anteriores
+        cache.clear()
+        cubo.cache_clear()
+        self.client = APIClient(REMOTE_ADDR='10.0.0.1')
+        self.login_url = '/api/auth/login/'
+        self.test_user = Usuario.objects.create_user(
+            email='limite@test.com',
+            nombre='Limite',
+            apellido='Test',
+            password='Password123!'
+        )
+
+    def intentar_login(self, email='limite@test.com', password='Incorrecta123!', client=None):
+        return (client or self.client).post(self.login_url, {
+            'email': email,
+            'password': password
+        }, format='json')
+
+    def test_email_bloqueado_antes_de_derivar_password(self):
+        """
+        CP132: Agotados los intentos de un email se responde 429 con Retry-After sin verificar la contraseña
+        """
+        from unittest import mock
+
+        for _ in range(3):
+            self.assertEqual(self.intentar_login().status_code, status.HTTP_400_BAD_REQUEST)
+
+        with mock.patch('core.serializers.authenticate') as authenticate:
+            response = self.intentar_login(email=' LIMITE@test.com', password='Password123!')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+        authenticate.assert_not_called()
+
+        # Otro email desde la misma IP sigue pudiendo entrar
+        Usuario.objects.create_user(
+            email='otro@test.com', nombre='Otro', apellido='Test', password='Password123!'
+        )
+        response = self.intentar_login(email='otro@test.com', password='Password123!')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_ip_bloqueada_para_cualquier_email(self):
+        """
+        CP133: Una IP que prueba muchos emails se bloquea; las demás IP no se ven afectadas
+        """
+        for i in range(5):
+            self.assertEqual(
+                self.intentar_login(email=f'lista{i}@test.com').status_code,
+                status.HTTP_400_BAD_REQUEST
+            )
+        response = self.intentar_login(email='lista5@test.com')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', response)
+
+        response = self.intentar_login(password='Password123!', client=APIClient(REMOTE_ADDR='10.0.0.2'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_registro_limitado_por_ip(self):
+        """
+        CP134: El registro también se limita por IP
+        """
+        for i in range(3):
+            response = self.client.post('/api/auth/registro/', {
+                'email': f'nuevo{i}@test.com',
+                'nombre': 'Nuevo',
+                'apellido': 'Usuario',
+                'password': 'TestPassword123!',
+                'password_confirm': 'TestPassword123!'
+            }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertFalse(Usuario.objects.filter(email='nuevo2@test.com').exists())
+
+    def test_x_forwarded_for_no_estrena_cubo(self):
+        """
+        CP168: Cambiar X-Forwarded-For en cada intento no evita el límite por IP salvo con NUM_PROXIES
+        """
+        from django.conf import settings
+
+        for i in range(5):
+            self.client.credentials(HTTP_X_FORWARDED_FOR=f'203.0.113.{i}')
+            self.assertEqual(
+                self.intentar_login(email=f'lista{i}@test.com').status_code,
+                status.HTTP_400_BAD_REQUEST
+            )
+        self.client.credentials(HTTP_X_FORWARDED_FOR='203.0.113.99')
+        response = self.intentar_login(email='lista5@test.com')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+        # Detrás de un proxy declarado, la IP es la que él agrega
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'NUM_PROXIES': 1}):
+            response = self.intentar_login(email='lista6@test.com')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_cubo_se_recarga_y_rechaza_sin_consultar_cache(self):
+        """
+        CP135: El cubo recupera una ficha cada PERIODO / CAPACIDAD segundos y, bloqueado, no consulta la cache
+        """
+        from unittest import mock
+        from django.core.cache import cache
+        from core.limites import CuboTokens
+
+        ahora = [1000.0]
+        cubo = CuboTokens('prueba', capacidad=2, periodo=10, reloj=lambda: ahora[0])
+        self.assertEqual(cubo.consumir('x'), 0)
+        self.assertEqual(cubo.consumir('x'), 0)
+        self.assertAlmostEqual(cubo.consumir('x'), 5.0)
+
+        ahora[0] += 2
+        with mock.patch.object(cache, 'get') as get:
+            self.assertAlmostEqual(cubo.consumir('x'), 3.0)
+        get.assert_not_called()
+
+        ahora[0] += 3
+        self.assertEqual(cubo.consumir('x'), 0)
+        self.assertGreater(cubo.consumir('x'), 0)
+
+
+class VencimientoTokenTestCase(APITestCase):
+    """
+    RF02 - Iniciar sesión
+    Casos de prueba del vencimiento deslizante de los tokens
+    """
+
+    def setUp(self):
+        """Configuración inicial"""
+        from core.autenticacion import cache_tokens
+        from core.escritura_diferida import buffer_usos_token
+
+        cache_tokens().limpiar()
+        self.buffer = buffer_usos_token()
+        self.buffer.vaciar()
+        self.client = APIClient()
+        self.perfil_url = '/api/auth/perfil/'
+        self.test_user = Usuario.objects.create_user(
+            email='vence@test.com', nombre='Vence', apellido='Test', password='Password123!'
+        )
+        self.token = Token.objects.create(user=self.test_user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def usar_hace(self, token, **tiempo):
+        from datetime import timedelta
+        from django.utils import timezone
+        from core.autenticacion import cache_tokens, clave_token
+        from core.models import UsoToken
+
+        UsoToken.objects.filter(token=token).update(ultimo_uso=timezone.now() - timedelta(**tiempo))
+        cache_tokens().delete(clave_token(token.key))
+
+    def test_token_sin_uso_vence_y_login_emite_otro(self):
+        """
+        CP159: Un token sin uso durante el TTL se rechaza y el login entrega uno nuevo
+        """
+        self.usar_hace(self.token, days=15)
+        self.assertEqual(self.client.get(self.perfil_url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        with override_settings(LIMITE_AUTENTICACION={'ACTIVO': False}):
+            response = self.client.post('/api/auth/login/', {
+                'email': 'vence@test.com', 'password': 'Password123!'
+            }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response.data['token'], self.token.key)
+        self.assertFalse(Token.objects.filter(key=self.token.key).exists())
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + response.data['token'])
+        self.assertEqual(self.client.get(self.perfil_url).status_code, status.HTTP_200_OK)
+
+    def test_uso_extiende_el_plazo_con_escrituras_agrupadas(self):
+        """
+        CP160: Usar el token extiende su plazo; el último uso se anota una vez y se escribe en lote
+        """
+        from datetime import timedelta
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from django.utils import timezone
+        from core.models import UsoToken
+
+        self.usar_hace(self.token, days=13, hours=23)
+        with CaptureQueriesContext(connection) as consultas:
+            for _ in range(5):
+                self.assertEqual(self.client.get(self.perfil_url).status_code, status.HTTP_200_OK)
+        self.assertFalse(any('usos_token' in c['sql'] and c['sql'].startswith('UPDATE')
+                             for c in consultas.captured_queries))
+        self.assertEqual(len(self.buffer), 1)
+
+        self.assertEqual(self.buffer.vaciar(), 1)
+        uso = UsoToken.objects.get(token=self.token)
+        self.assertGreater(uso.ultimo_uso, timezone.now() - timedelta(minutes=1))
+
+    def test_limpiar_tokens_borra_vencidos_en_lotes(self):
+        """
+        CP161: limpiar_tokens borra en lotes solo los tokens vencidos
+        """
+        from io import StringIO
+        from django.core.management import call_command
+
+        vencidos = []
+        for i in range(5):
+            usuario = Usuario.objects.create_user(
+                email=f'viejo{i}@test.com', nombre='Viejo', apellido=str(i), password='Password123!'
+            )
+            vencidos.append(Token.objects.create(user=usuario))
+            self.usar_hace(vencidos[-1], days=20)
+
+        salida = StringIO()
+        call_command('limpiar_tokens', lote=2, stdout=salida)
+        self.assertIn('5 tokens vencidos borrados', salida.getvalue())
+        self.assertEqual(list(Token.objects.values_list('key', flat=True)), [self.token.key])
+        self.assertEqual(self.client.get(self.perfil_url).status_code, status.HTTP_200_OK)
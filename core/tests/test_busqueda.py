@@ -0,0 +1,636 @@
+"""
+Pruebas Unitarias - Subsistema de Búsqueda
+RF06 - Buscar Producto (índice invertido en memoria y backends intercambiables)
+"""
+
+from django.db import connection
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase, APIClient
+from core.models import Producto, Categoria, Marca
+from core.busqueda import indice_productos
+from core.busqueda.autocompletar import TrieAutocompletado
+from core.busqueda.texto import analizar, raiz, variantes
+from decimal import Decimal
+from django.utils.text import slugify
+import random
+import time
+
+
+class IndiceInvertidoTestCase(APITestCase):
+    """
+    RF06 - Buscar Producto
+    Casos de prueba del índice invertido que respalda /api/buscar/ y /api/productos/?search=
+    """
+
+    def setUp(self):
+        """Configuración inicial"""
+        self.client = APIClient()
+        self.buscar_url = '/api/buscar/'
+
+        self.categoria = Categoria.objects.create(nombre='Tecnología', slug=slugify('Tecnología'))
+        self.marca = Marca.objects.create(nombre='Sony')
+
+        self.camara = Producto.objects.create(
+            nombre='Cámara Digital Sony',
+            descripcion='Cámara compacta con zoom óptico',
+            sku='CAM-SONY-001',
+            precio=Decimal('900000.00'),
+            stock=4,
+            id_categoria=self.categoria,
+            id_marca=self.marca
+        )
+        self.portatil = Producto.objects.create(
+            nombre='Portátil Lenovo 14"',
+            descripcion_corta='Computador portátil liviano',
+            sku='PORT-LEN-014',
+            precio=Decimal('2100000.00'),
+            stock=3,
+            id_categoria=self.categoria,
+            id_marca=self.marca
+        )
+
+    def test_busqueda_sin_acentos(self):
+        """
+        CP68: Buscar ignorando tildes
+        Entrada: q="camara"
+        Salida Esperada: Encuentra "Cámara Digital Sony"
+        """
+        response = self.client.get(self.buscar_url, {'q': 'camara'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        nombres = [p['nombre'] for p in response.data['resultados']]
+        self.assertEqual(nombres, ['Cámara Digital Sony'])
+
+    def test_busqueda_por_prefijo_y_sku(self):
+        """
+        CP69: Buscar por prefijo de palabra y por fragmento de SKU
+        Entrada: q="port" y q="len-014"
+        Salida Esperada: Encuentra el portátil en ambos casos
+        """
+        for consulta in ['port', 'len-014']:
+            response = self.client.get(self.buscar_url, {'q': consulta})
+            ids = [p['id_producto'] for p in response.data['resultados']]
+            self.assertEqual(ids, [self.portatil.id_producto])
+
+    def test_indice_refleja_cambios_y_eliminaciones(self):
+        """
+        CP70: El índice se actualiza al guardar y eliminar productos
+        Entrada: Renombrar la cámara y eliminar el portátil
+        Salida Esperada: Solo el texto vigente es buscable
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            self.camara.nombre = 'Videocámara Sony Handycam'
+            self.camara.save()
+            self.portatil.delete()
+
+        self.assertEqual(indice_productos.buscar('handycam'), {self.camara.id_producto})
+        self.assertEqual(indice_productos.buscar('digital'), set())
+        self.assertEqual(indice_productos.buscar('lenovo'), set())
+
+    def test_indice_detecta_bulk_create(self):
+        """
+        CP71: Productos creados sin señales (bulk_create) también se indexan
+        Entrada: bulk_create de un producto nuevo
+        Salida Esperada: La búsqueda lo encuentra
+        """
+        Producto.objects.bulk_create([
+            Producto(
+                nombre='Nevera Haceb 300 litros',
+                sku='NEV-HAC-300',
+                precio=Decimal('1300000.00'),
+                stock=2,
+                id_categoria=self.categoria
+            )
+        ])
+
+        response = self.client.get('/api/productos/', {'search': 'haceb'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([p['sku'] for p in response.data], ['NEV-HAC-300'])
+
+    def test_productos_inactivos_no_se_indexan(self):
+        """
+        CP72: Un producto desactivado deja de aparecer en la búsqueda
+        Entrada: activo=False en la cámara
+        Salida Esperada: q="sony" no la retorna
+        """
+        self.camara.activo = False
+        self.camara.save()
+
+        self.assertNotIn(self.camara.id_producto, indice_productos.buscar('sony'))
+
+
+def tabla_fts5_existe():
+    return 'productos_fts' in connection.introspection.table_names()
+
+
+class FirmaCatalogoTestCase(APITestCase):
+    """
+    RF06 - Buscar Producto
+    Casos de prueba del costo de sincronizar los índices en memoria por petición
+    """
+
+    def setUp(self):
+        """Configuración inicial"""
+        self.client = APIClient()
+        categoria = Categoria.objects.create(nombre='Televisores', slug='televisores')
+        marca = Marca.objects.create(nombre='Samsung')
+        for i in range(3):
+            Producto.objects.create(
+                nombre=f'Televisor Samsung {40 + i}"', sku=f'TV-FIR-{i}', precio=Decimal('1500000.00'),
+                stock=5, id_categoria=categoria, id_marca=marca
+            )
+
+    def consultas(self, consulta):
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as capturadas:
+            response = self.client.get('/api/buscar/', {'q': consulta})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [c['sql'] for c in capturadas.captured_queries]
+
+    def test_una_firma_por_peticion(self):
+        """
+        CP166: Una búsqueda (también con corrección) consulta la firma del catálogo una sola vez
+        Entrada: q="televisor" y q="televisro"
+        """
+        self.consultas('televisor')
+        for consulta in ('televisor', 'televisro'):
+            firmas = [sql for sql in self.consultas(consulta) if 'MAX(' in sql and '"productos"' in sql]
+            self.assertEqual(len(firmas), 1, firmas)
+
+
+class BackendsBusquedaTestCase(APITestCase):
+    """
+    RF06 - Buscar Producto
+    El mismo contrato de búsqueda debe cumplirse con cada backend configurable
+    """
+
+    def setUp(self):
+        """Configuración inicial"""
+        self.client = APIClient()
+        categoria = Categoria.objects.create(nombre='Hogar', slug=slugify('Hogar'))
+        self.nevera = Producto.objects.create(
+            nombre='Nevera LG 420 litros',
+            descripcion='Refrigerador de dos puertas con dispensador',
+            sku='NEV-LG-420',
+            precio=Decimal('1800000.00'),
+            stock=5,
+            id_categoria=categoria
+        )
+        self.lavadora = Producto.objects.create(
+            nombre='Lavadora Samsung 20kg',
+            descripcion='Lavadora automática de carga frontal',
+            sku='LAV-SAM-020',
+            precio=Decimal('1500000.00'),
+            stock=8,
+            id_categoria=categoria
+        )
+
+    def buscar_ids(self, consulta):
+        response = self.client.get('/api/buscar/', {'q': consulta})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return {p['id_producto'] for p in response.data['resultados']}
+
+    def verificar_contrato(self):
+        self.assertEqual(self.buscar_ids('Samsung'), {self.lavadora.id_producto})
+        self.assertEqual(self.buscar_ids('refrigerador'), {self.nevera.id_producto})
+        self.assertEqual(self.buscar_ids('iPhone'), set())
+
+    @override_settings(BUSQUEDA={'BACKEND': 'core.busqueda.backends.OrmBackend'})
+    def test_backend_orm(self):
+        """
+        CP73: Búsqueda con el backend ORM (icontains)
+        Salida Esperada: Mismos resultados que el índice en memoria
+        """
+        self.verificar_contrato()
+
+    @override_settings(BUSQUEDA={'BACKEND': 'core.busqueda.backends.OrmBackend'})
+    def test_sin_indice_en_memoria_con_otro_backend(self):
+        """
+        CP174: Con un backend que no es el índice en memoria no se sugieren correcciones ni se sincroniza ese índice
+        Entrada: q="samsnug" con OrmBackend
+        """
+        from unittest import mock
+
+        with mock.patch.object(indice_productos, 'sincronizar') as sincronizar, \
+                mock.patch.object(indice_productos, 'sugerir') as sugerir:
+            response = self.client.get('/api/buscar/', {'q': 'samsnug'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.data['sugerencia'])
+        sincronizar.assert_not_called()
+        sugerir.assert_not_called()
+
+    @override_settings(BUSQUEDA={'BACKEND': 'core.busqueda.backends.IndiceMemoriaBackend'})
+    def test_backend_indice_memoria(self):
+        """
+        CP74: Búsqueda con el backend de índice en memoria
+        """
+        self.verificar_contrato()
+
+    @override_settings(BUSQUEDA={'BACKEND': 'core.busqueda.backends.SQLiteFTS5Backend'})
+    def test_backend_sqlite_fts5(self):
+        """
+        CP75: Búsqueda con el backend SQLite FTS5
+        Salida Esperada: Los triggers mantienen la tabla FTS al crear, editar y borrar
+        """
+        if not tabla_fts5_existe():
+            self.skipTest('Requiere SQLite con FTS5')
+        self.verificar_contrato()
+        self.assertEqual(self.buscar_ids('automatica'), {self.lavadora.id_producto})
+        # El análisis (raíces y sinónimos) también se aplica a la consulta FTS5
+        self.assertEqual(self.buscar_ids('lavadoras'), {self.lavadora.id_producto})
+        self.assertEqual(self.buscar_ids('refrigeradores'), {self.nevera.id_producto})
+
+        self.lavadora.nombre = 'Lavasecadora Samsung 20kg'
+        self.lavadora.save()
+        self.nevera.delete()
+
+        self.assertEqual(self.buscar_ids('lavasec'), {self.lavadora.id_producto})
+        self.assertEqual(self.buscar_ids('refrigerador'), set())
+
+
+class RelevanciaBusquedaTestCase(APITestCase):
+    """
+    RF06 - Ordenamiento por relevancia (BM25 por campos + señales de negocio)
+    """
+
+    def setUp(self):
+        """Configuración inicial"""
+        self.client = APIClient()
+        self.buscar_url = '/api/buscar/'
+        categoria = Categoria.objects.create(nombre='Audio', slug=slugify('Audio'))
+
+        # "parlante" en el nombre debe pesar más que en la descripción
+        self.en_descripcion = Producto.objects.create(
+            nombre='Barra de sonido Sony',
+            descripcion='Incluye parlante inalámbrico trasero',
+            sku='BAR-SONY-001',
+            precio=Decimal('700000.00'),
+            stock=3,
+            id_categoria=categoria,
+            total_ventas=50,
+            destacado=True
+        )
+        self.en_nombre = Producto.objects.create(
+            nombre='Parlante JBL Charge',
+            descripcion='Sonido potente',
+            sku='PAR-JBL-001',
+            precio=Decimal('600000.00'),
+            stock=3,
+            id_categoria=categoria
+        )
+        self.en_sku = Producto.objects.create(
+            nombre='Audífonos JBL',
+            descripcion='Audífonos de diadema',
+            sku='PARLANTE-ACC-01',
+            precio=Decimal('200000.00'),
+            stock=3,
+            id_categoria=categoria
+        )
+
+    def ids_relevancia(self, **params):
+        response = self.client.get(self.buscar_url, {'q': 'parlante', **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [p['id_producto'] for p in response.data['resultados']], response.data['total']
+
+    def test_relevancia_pondera_campos(self):
+        """
+        CP76: El nombre pesa más que la descripción y esta más que el SKU
+        Entrada: q="parlante", orden por defecto (relevancia)
+        Salida Esperada: nombre > descripción > SKU pese a ventas/destacado del segundo
+        """
+        ids, total = self.ids_relevancia()
+
+        self.assertEqual(ids, [
+            self.en_nombre.id_producto,
+            self.en_descripcion.id_producto,
+            self.en_sku.id_producto,
+        ])
+        self.assertEqual(total, 3)
+
+    def test_relevancia_top_k(self):
+        """
+        CP77: Solo se devuelven los k mejores, pero el total cuenta todas las coincidencias
+        Entrada: q="parlante", limite=1
+        """
+        ids, total = self.ids_relevancia(limite=1)
+
+        self.assertEqual(ids, [self.en_nombre.id_producto])
+        self.assertEqual(total, 3)
+
+    def test_limite_invalido_o_excesivo(self):
+        """
+        CP164: Un limite que no es número usa el top-k por defecto y uno enorme se acota a 100
+        Entrada: q="parlante", limite="abc" y limite=100000
+        """
+        from unittest import mock
+        from core import views
+
+        with mock.patch.object(views, 'rankear_por_relevancia', wraps=views.rankear_por_relevancia) as rankear:
+            ids, total = self.ids_relevancia(limite='abc')
+            self.assertEqual((len(ids), total), (3, 3))
+            self.assertIsNone(rankear.call_args.args[2])
+
+            ids, _ = self.ids_relevancia(limite=100000)
+            self.assertEqual(len(ids), 3)
+            self.assertEqual(rankear.call_args.args[2], 100)
+
+    @override_settings(BUSQUEDA={
+        'BACKEND': 'core.busqueda.backends.IndiceMemoriaBackend',
+        'RELEVANCIA': {'IMPULSO_VENTAS': 5.0},
+    })
+    def test_impulsos_de_negocio_configurables(self):
+        """
+        CP78: Un impulso de ventas alto puede superar la diferencia textual
+        Entrada: IMPULSO_VENTAS=5.0
+        Salida Esperada: El producto con ventas queda primero
+        """
+        ids, _ = self.ids_relevancia()
+
+        self.assertEqual(ids[0], self.en_descripcion.id_producto)
+
+
+class TolerarErroresBusquedaTestCase(APITestCase):
+    """
+    RF06 - Búsqueda tolerante a errores de digitación ("¿quisiste decir?")
+    """
+
+    def setUp(self):
+        """Configuración inicial"""
+        self.client = APIClient()
+        self.buscar_url = '/api/buscar/'
+        categoria = Categoria.objects.create(nombre='Televisores', slug=slugify('Televisores'))
+        self.samsung = Marca.objects.create(nombre='Samsung')
+        self.hisense = Marca.objects.create(nombre='Hisense')
+        self.televisor = Producto.objects.create(
+            nombre='Televisor Samsung 55 pulgadas',
+            sku='TV-SAM-55',
+            precio=Decimal('2500000.00'),
+            stock=4,
+            id_categoria=categoria,
+            id_marca=self.samsung
+        )
+
+    def test_busqueda_con_error_de_digitacion(self):
+        """
+        CP79: Buscar con errores de digitación
+        Entrada: q="samsumg televisro"
+        Salida Esperada: Encuentra el televisor y sugiere "samsung televisor"
+        """
+        response = self.client.get(self.buscar_url, {'q': 'samsumg televisro'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['sugerencia'], 'samsung televisor')
+        ids = [p['id_producto'] for p in response.data['resultados']]
+        self.assertEqual(ids, [self.televisor.id_producto])
+
+    def test_sin_sugerencia_si_los_terminos_existen(self):
+        """
+        CP80: Una búsqueda correcta no genera sugerencia
+        Entrada: q="televisor"
+        """
+        response = self.client.get(self.buscar_url, {'q': 'televisor'})
+
+        self.assertIsNone(response.data['sugerencia'])
+        self.assertEqual(len(response.data['resultados']), 1)
+
+    def test_sugerencia_con_nombre_de_marca(self):
+        """
+        CP81: Los nombres de marca también alimentan las sugerencias
+        Entrada: q="hisens3" (marca sin productos)
+        Salida Esperada: sugerencia "hisense", sin resultados
+        """
+        response = self.client.get(self.buscar_url, {'q': 'hisens3'})
+
+        self.assertEqual(response.data['sugerencia'], 'hisense')
+        self.assertEqual(response.data['resultados'], [])
+
+    def test_termino_sin_parecido_no_se_corrige(self):
+        """
+        CP82: Un término sin parecido con el catálogo se deja igual
+        Entrada: q="iphone"
+        """
+        response = self.client.get(self.buscar_url, {'q': 'iphone'})
+
+        self.assertIsNone(response.data['sugerencia'])
+        self.assertEqual(response.data['total'], 0)
+
+
+@override_settings(BUSQUEDA={'AUTOCOMPLETAR': {'SINCRONIZAR_CADA': 0}})
+class AutocompletarTestCase(APITestCase):
+    """
+    RF06 - Buscar Producto
+    Casos de prueba de /api/buscar/autocompletar/
+    """
+
+    def setUp(self):
+        """Configuración inicial"""
+        self.client = APIClient()
+        self.url = '/api/buscar/autocompletar/'
+
+        self.televisores = Categoria.objects.create(nombre='Televisores', slug='televisores')
+        self.telefonos = Categoria.objects.create(nombre='Teléfonos', slug='telefonos')
+        self.samsung = Marca.objects.create(nombre='Samsung')
+        self.sony = Marca.objects.create(nombre='Sony')
+
+        def crear(nombre, sku, categoria, marca, ventas):
+            return Producto.objects.create(
+                nombre=nombre, sku=sku, precio=Decimal('1000000.00'), stock=5,
+                id_categoria=categoria, id_marca=marca, total_ventas=ventas
+            )
+
+        self.tv_samsung = crear('Smart TV Samsung 55"', 'TV-SAM-55', self.televisores, self.samsung, 120)
+        self.tv_sony = crear('Televisor Sony Bravia 50"', 'TV-SONY-50', self.televisores, self.sony, 300)
+        self.celular = crear('Teléfono Samsung Galaxy A54', 'CEL-SAM-A54', self.telefonos, self.samsung, 80)
+
+    def test_sugerencias_por_prefijo_ordenadas_por_ventas(self):
+        """
+        CP83: Autocompletar por prefijo de cualquier palabra
+        Entrada: q="te"
+        Salida Esperada: Productos, categorías y marcas que empiezan por "te", de más a menos vendidos
+        """
+        response = self.client.get(self.url, {'q': 'te'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [p['id_producto'] for p in response.data['productos']],
+            [self.tv_sony.id_producto, self.celular.id_producto]
+        )
+        # Televisores suma 420 ventas, Teléfonos 80
+        self.assertEqual([c['slug'] for c in response.data['categorias']], ['televisores', 'telefonos'])
+        self.assertEqual(response.data['marcas'], [])
+
+        response = self.client.get(self.url, {'q': 'sam', 'limite': 1})
+        self.assertEqual(response.data['productos'], [
+            {'id_producto': self.tv_samsung.id_producto, 'nombre': 'Smart TV Samsung 55"'}
+        ])
+        self.assertEqual(response.data['marcas'], [{'id_marca': self.samsung.id_marca, 'nombre': 'Samsung'}])
+
+    def test_limite_invalido_o_excesivo(self):
+        """
+        CP165: Un limite que no es número usa el de settings y uno enorme se acota al máximo del índice
+        Entrada: q="te" con limite="abc", limite=100000 y limite=-3
+        """
+        for limite, esperados in (('abc', 2), (100000, 2), (-3, 1)):
+            response = self.client.get(self.url, {'q': 'te', 'limite': limite})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(response.data['productos']), esperados)
+
+    def test_varias_palabras(self):
+        """
+        CP84: Cada palabra de la consulta filtra como prefijo
+        Entrada: q="samsung tel"
+        Salida Esperada: Solo el teléfono Samsung
+        """
+        response = self.client.get(self.url, {'q': 'samsung tel'})
+
+        self.assertEqual([p['id_producto'] for p in response.data['productos']], [self.celular.id_producto])
+        self.assertEqual(response.data['categorias'], [])
+
+    def test_refresco_incremental(self):
+        """
+        CP85: El índice refleja ventas, altas y bajas sin reconstruirse
+        Entrada: Subir las ventas del Samsung, crear un producto y eliminar otro
+        Salida Esperada: Nuevo orden y contenido en las sugerencias
+        """
+        self.client.get(self.url, {'q': 's'})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tv_samsung.total_ventas = 500
+            self.tv_samsung.save()
+            self.tv_sony.delete()
+            nuevo = Producto.objects.create(
+                nombre='Soundbar Sony HT-S100', sku='SB-SONY-100', precio=Decimal('500000.00'),
+                id_categoria=self.televisores, id_marca=self.sony, total_ventas=10
+            )
+
+        response = self.client.get(self.url, {'q': 's'})
+
+        self.assertEqual(
+            [p['id_producto'] for p in response.data['productos']],
+            [self.tv_samsung.id_producto, self.celular.id_producto, nuevo.id_producto]
+        )
+        self.assertEqual([m['nombre'] for m in response.data['marcas']], ['Samsung', 'Sony'])
+
+    def test_no_consulta_la_base_de_datos(self):
+        """
+        CP86: Entre sincronizaciones las sugerencias salen solo de memoria
+        Entrada: Dos consultas seguidas
+        Salida Esperada: La segunda no hace consultas SQL
+        """
+        with override_settings(BUSQUEDA={'AUTOCOMPLETAR': {'SINCRONIZAR_CADA': 60}}):
+            self.client.get(self.url, {'q': 'tel'})
+            with self.assertNumQueries(0):
+                response = self.client.get(self.url, {'q': 'tele'})
+
+        self.assertEqual(len(response.data['productos']), 2)
+
+    def test_latencia_p99_con_catalogo_grande(self):
+        """
+        CP87: p99 < 5 ms con 50.000 productos
+        Entrada: Prefijos aleatorios de 1 a 4 letras, con bajas intercaladas
+        """
+        generador = random.Random(7)
+        palabras = [
+            ''.join(generador.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(generador.randint(3, 9)))
+            for _ in range(5000)
+        ]
+        trie = TrieAutocompletado()
+        for clave in range(50000):
+            nombre = ' '.join(generador.sample(palabras, 4))
+            trie.poner(clave, nombre, generador.randint(0, 10000), nombre, diferido=True)
+        trie.recalcular()
+
+        tiempos = []
+        for consulta in range(1000):
+            if consulta % 10 == 0:
+                trie.quitar(generador.randrange(50000))
+            prefijo = generador.choice(palabras)[:generador.randint(1, 4)]
+            inicio = time.perf_counter()
+            trie.completar([prefijo], 10)
+            tiempos.append(time.perf_counter() - inicio)
+        tiempos.sort()
+
+        self.assertLess(tiempos[int(len(tiempos) * 0.99)], 0.005)
+
+
+class AnalisisTextoTestCase(APITestCase):
+    """
+    RF06 - Buscar Producto
+    Análisis en español (tildes, raíces y sinónimos) en el índice y en la consulta
+    """
+
+    def setUp(self):
+        """Configuración inicial"""
+        self.client = APIClient()
+        self.buscar_url = '/api/buscar/'
+        categoria = Categoria.objects.create(nombre='Tecnología', slug=slugify('Tecnología'))
+
+        self.celular = Producto.objects.create(
+            nombre='Celular Motorola G84', sku='CEL-MOT-G84',
+            precio=Decimal('1100000.00'), stock=6, id_categoria=categoria
+        )
+        self.portatil = Producto.objects.create(
+            nombre='Portátil HP 15"', descripcion='Portátiles para estudiantes',
+            sku='PORT-HP-15', precio=Decimal('2300000.00'), stock=4, id_categoria=categoria
+        )
+        self.camaras = Producto.objects.create(
+            nombre='Kit de Cámaras de Seguridad', sku='CAM-SEG-004',
+            precio=Decimal('650000.00'), stock=9, id_categoria=categoria
+        )
+
+    def buscar_ids(self, consulta):
+        response = self.client.get(self.buscar_url, {'q': consulta})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [p['id_producto'] for p in response.data['resultados']]
+
+    def test_raices(self):
+        """
+        CP88: El stemmer une singular/plural y género, y respeta códigos
+        """
+        self.assertEqual(analizar('Cámaras CÁMARA cámara'), ['camar'] * 3)
+        self.assertEqual(raiz('televisores'), raiz('televisor'))
+        self.assertEqual(raiz('blancos'), raiz('blanca'))
+        self.assertEqual(analizar('TV A54 led'), ['tv', 'a54', 'led'])
+
+    def test_singular_encuentra_plural(self):
+        """
+        CP89: Buscar en singular o plural encuentra ambas formas
+        Entrada: q="camara" y q="portatiles"
+        """
+        self.assertEqual(self.buscar_ids('camara'), [self.camaras.id_producto])
+        self.assertEqual(self.buscar_ids('portatiles'), [self.portatil.id_producto])
+
+    def test_sinonimos(self):
+        """
+        CP90: Los sinónimos se encuentran entre sí
+        Entrada: q="smartphone" y q="laptop"
+        Salida Esperada: El celular y el portátil, sin sugerencia de corrección
+        """
+        self.assertEqual(self.buscar_ids('smartphone'), [self.celular.id_producto])
+        response = self.client.get(self.buscar_url, {'q': 'laptop'})
+        self.assertIsNone(response.data['sugerencia'])
+        self.assertEqual([p['id_producto'] for p in response.data['resultados']], [self.portatil.id_producto])
+
+    def test_sinonimos_configurables(self):
+        """
+        CP91: La tabla de sinónimos se toma de settings.BUSQUEDA['SINONIMOS']
+        """
+        with override_settings(BUSQUEDA={'SINONIMOS': [['camara', 'webcam']]}):
+            self.assertEqual(variantes(raiz('webcams')), ('webcam', 'camar'))
+            self.assertEqual(self.buscar_ids('webcam'), [self.camaras.id_producto])
+            self.assertEqual(self.buscar_ids('smartphone'), [])
+        self.assertEqual(self.buscar_ids('smartphone'), [self.celular.id_producto])
+
+    def test_analisis_por_termino_cacheado(self):
+        """
+        CP92: Repetir una consulta no vuelve a analizar sus términos
+        """
+        self.buscar_ids('camaras seguridad')
+        antes = raiz.cache_info()
+        self.buscar_ids('camaras seguridad')
+        despues = raiz.cache_info()
+
+        self.assertEqual(despues.misses, antes.misses)
+        self.assertGreater(despues.hits, antes.hits)
@@ -0,0 +1,225 @@
+"""
+Pruebas Unitarias - Cache de respuestas
+RF06/RF07 - Catálogo (cache de dos niveles con cálculo único por clave y
+stale-while-revalidate)
+"""
+
+from django.core.cache import cache
+from django.db import OperationalError
+from django.test import TestCase
+from rest_framework import status
+from rest_framework.test import APITestCase, APIClient
+from unittest import mock
+from core.cache import CacheDosNiveles, CacheLRU, cache_respuestas
+from core.cache.revalidacion import obtener_revalidando
+from core.models import Producto, Categoria
+from core.views import ProductoViewSet
+from decimal import Decimal
+import threading
+import time
+
+
+class CacheDosNivelesTestCase(TestCase):
+    """
+    Casos de prueba del LRU local y del agrupamiento de fallos concurrentes
+    """
+
+    def setUp(self):
+        """Configuración inicial"""
+        cache.clear()
+        self.cache = CacheDosNiveles(max_bytes=4096, espera_calculo=1.0)
+
+    def test_lru_acotado_en_bytes(self):
+        """
+        CP109: El LRU expulsa lo menos usado al superar su capacidad en bytes
+        """
+        lru = CacheLRU(max_bytes=300)
+        lru.set('a', 'A', 100)
+        lru.set('b', 'B', 100)
+        lru.set('c', 'C', 100)
+        lru.get('a')
+        lru.set('d', 'D', 100)
+
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual([lru.get(c) for c in 'acd'], ['A', 'C', 'D'])
+        self.assertEqual((lru.bytes, lru.expulsiones), (300, 1))
+
+        # Un valor más grande que todo el cache no se guarda
+        lru.set('e', 'E', 301)
+        self.assertIsNone(lru.get('e'))
+        self.assertEqual(len(lru), 3)
+
+    def test_niveles_y_contadores(self):
+        """
+        CP110: Un fallo calcula y publica en ambos niveles; el otro proceso lo lee del compartido
+        """
+        self.assertEqual(self.cache.obtener_o_calcular('clave', lambda: [1, 2, 3]), [1, 2, 3])
+        self.assertEqual(self.cache.obtener_o_calcular('clave', lambda: None), [1, 2, 3])
+        self.assertEqual(cache.get('clave'), [1, 2, 3])
+
+        # Otro worker: LRU vacío, mismo cache de Django
+        otro = CacheDosNiveles(max_bytes=4096)
+        self.assertEqual(otro.obtener_o_calcular('clave', lambda: None), [1, 2, 3])
+
+        # Lo que devuelve None no se guarda
+        self.assertIsNone(self.cache.obtener_o_calcular('vacia', lambda: None))
+        self.assertIsNone(cache.get('vacia'))
+
+        estadisticas = self.cache.estadisticas()
+        self.assertEqual(estadisticas['aciertos_local'], 1)
+        self.assertEqual(estadisticas['fallos'], 2)
+        self.assertEqual(otro.estadisticas()['aciertos_compartido'], 1)
+        self.assertGreater(estadisticas['bytes'], 0)
+
+    def test_fallos_concurrentes_calculan_una_vez(self):
+        """
+        CP111: 20 hilos que fallan a la vez en la misma clave producen un solo cálculo
+        """
+        calculos = []
+        barrera = threading.Barrier(20)
+        resultados = []
+
+        def calcular():
+            calculos.append(1)
+            time.sleep(0.1)
+            return {'valor': 42}
+
+        def leer():
+            barrera.wait()
+            resultados.append(self.cache.obtener_o_calcular('caliente', calcular))
+
+        hilos = [threading.Thread(target=leer) for _ in range(20)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(len(calculos), 1)
+        self.assertEqual(resultados, [{'valor': 42}] * 20)
+
+    def test_espera_al_calculo_de_otro_proceso(self):
+        """
+        CP112: Con el candado tomado por otro worker se espera su resultado en vez de recalcular
+        """
+        cache.add('lenta:calculando', 1)
+
+        def publicar():
+            time.sleep(0.2)
+            cache.set('lenta', 'calculado por otro')
+
+        threading.Thread(target=publicar).start()
+        self.assertEqual(
+            self.cache.obtener_o_calcular('lenta', lambda: 'calculado aquí'), 'calculado por otro'
+        )
+        self.assertEqual(self.cache.estadisticas()['fallos'], 0)
+
+    def test_error_se_propaga_a_los_que_esperan(self):
+        """
+        CP113: Si el cálculo falla, falla para todos y la clave queda libre
+        """
+        with self.assertRaises(ZeroDivisionError):
+            self.cache.obtener_o_calcular('rota', lambda: 1 / 0)
+        self.assertIsNone(cache.get('rota:calculando'))
+        self.assertEqual(self.cache.obtener_o_calcular('rota', lambda: 'ok'), 'ok')
+
+
+class RevalidacionTestCase(APITestCase):
+    """
+    Casos de prueba de stale-while-revalidate en los listados del catálogo
+    """
+
+    def setUp(self):
+        """Configuración inicial"""
+        cache.clear()
+        cache_respuestas().limpiar()
+        self.cache = CacheDosNiveles(max_bytes=4096)
+        self.client = APIClient()
+        self.categoria = Categoria.objects.create(nombre='Audio', slug='audio')
+        self.producto = Producto.objects.create(
+            nombre='Parlante Bluetooth',
+            sku='SWR-001',
+            precio=Decimal('250000.00'),
+            stock=3,
+            id_categoria=self.categoria
+        )
+
+    def leer(self, calcular, version=1, ttl_suave=60):
+        return obtener_revalidando(self.cache, 'listado', calcular, version, ttl_suave, ttl_duro=3600)
+
+    def test_copia_vieja_mientras_se_refresca(self):
+        """
+        CP114: Pasado el TTL suave se sirve la copia vieja y un hilo de fondo la renueva
+        """
+        self.assertEqual(self.leer(lambda: 'v1', ttl_suave=0), 'v1')
+
+        liberar = threading.Event()
+
+        def lento():
+            liberar.wait(1)
+            return 'v2'
+
+        inicio = time.monotonic()
+        self.assertEqual(self.leer(lento, ttl_suave=0), 'v1')
+        self.assertLess(time.monotonic() - inicio, 0.5)
+
+        liberar.set()
+        limite = time.monotonic() + 2
+        while self.leer(lambda: 'v3') != 'v2' and time.monotonic() < limite:
+            time.sleep(0.01)
+        self.assertEqual(self.leer(lambda: 'v3'), 'v2')
+
+    def test_cambio_de_version_recalcula(self):
+        """
+        CP115: Tras una escritura (versión nueva) se recalcula en el momento
+        """
+        self.assertEqual(self.leer(lambda: 'v1'), 'v1')
+        self.assertEqual(self.leer(lambda: 'v2'), 'v1')
+        self.assertEqual(self.leer(lambda: 'v2', version=2), 'v2')
+
+        # Si la base de datos falla se sirve la última copia; sin copia, el error sigue su curso
+        def caida():
+            raise OperationalError('sin conexión')
+
+        with self.assertLogs('core.cache.revalidacion', 'WARNING'):
+            self.assertEqual(self.leer(caida, version=3), 'v2')
+        with self.assertRaises(OperationalError):
+            obtener_revalidando(self.cache, 'otra', caida, 1, 60, 3600)
+
+    def test_listado_con_base_de_datos_caida(self):
+        """
+        CP116: /api/productos/ sigue respondiendo con la última copia si la base de datos falla
+        """
+        primera = self.client.get('/api/productos/')
+        self.assertEqual(primera.status_code, status.HTTP_200_OK)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.producto.stock = 2
+            self.producto.save()
+        with mock.patch.object(ProductoViewSet, 'listar', side_effect=OperationalError('sin conexión')), \
+                self.assertLogs('core.cache.revalidacion', 'WARNING'):
+            response = self.client.get('/api/productos/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, primera.data)
+
+        # Con la base de datos de vuelta se ve el cambio
+        self.assertEqual(self.client.get('/api/productos/').data[0]['stock'], 2)
+
+
+class CacheCompartidoTestCase(TestCase):
+    """
+    Casos de prueba del chequeo de despliegue del cache por defecto
+    """
+
+    def test_cache_por_proceso_avisa(self):
+        """
+        CP167: `check --deploy` avisa si CACHES['default'] es de cada proceso y no si es compartido
+        """
+        from django.test import override_settings
+        from core.checks import cache_compartido
+
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            self.assertEqual([aviso.id for aviso in cache_compartido(None)], ['core.W001'])
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://localhost:6379/1'
+        }}):
+            self.assertEqual(cache_compartido(None), [])
@@ -122,6 +122,9 @@ class PerformanceTestMixin:
         return stats
 
 
+# Miden el costo del registro y del login en sí; con el límite de intentos activo
+# las ráfagas de un mismo email e IP se responderían con 429
+@override_settings(LIMITE_AUTENTICACION={'ACTIVO': False})
 class AuthenticationPerformanceTests(TestCase, PerformanceTestMixin):
     """Pruebas de rendimiento para autenticación"""
     
@@ -526,3 +526,411 @@ class OrdenamientoProductosTestCase(APITestCase):
         if response.status_code == status.HTTP_200_OK:
             precios = [Decimal(str(p['precio'])) for p in response.data]
             self.assertEqual(precios, sorted(precios, reverse=True))
+
+
+class PaginacionCursorTestCase(APITestCase):
+    """
+    RF06 - Paginación por cursor (keyset) de los listados de productos
+    """
+
+    def setUp(self):
+        """Configuración inicial"""
+        self.client = APIClient()
+        self.productos_url = '/api/productos/'
+
+        self.categoria = Categoria.objects.create(nombre='General', slug=slugify('General'))
+        # Precios repetidos para forzar el desempate por id_producto
+        Producto.objects.bulk_create([
+            Producto(
+                nombre=f'Producto {i:02d}',
+                sku=f'PAG-{i:03d}',
+                precio=Decimal(1000 * (i % 4)),
+                stock=5,
+                total_ventas=i % 3,
+                destacado=i % 2 == 0,
+                id_categoria=self.categoria
+            )
+            for i in range(25)
+        ])
+
+    def recorrer(self, url, params, clave=None):
+        """Sigue el enlace `next` hasta el final y devuelve las páginas recorridas."""
+        paginas = []
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            datos = response.data[clave] if clave else response.data
+            paginas.append([p['id_producto'] for p in datos])
+            url = response.get('Link', '')[1:].split('>')[0] or None
+            if clave:
+                self.assertEqual(response.data['siguiente'], url)
+            params = None
+        return paginas
+
+    def test_recorrido_completo_por_cada_orden(self):
+        """
+        CP93: Recorrer todas las páginas con cada orden
+        Entrada: limite=7 y orden=precio_asc, precio_desc, nombre_desc, mas_vendidos, nuevos
+        Salida Esperada: Páginas acotadas, sin repetidos ni faltantes y en el orden pedido
+        """
+        ordenes = {
+            'precio_asc': ('precio', 'id_producto'),
+            'precio_desc': ('-precio', '-id_producto'),
+            'nombre_desc': ('-nombre', '-id_producto'),
+            'mas_vendidos': ('-total_ventas', '-id_producto'),
+            'nuevos': ('-created_at', '-id_producto'),
+        }
+        for orden, campos in ordenes.items():
+            with self.subTest(orden=orden):
+                paginas = self.recorrer(self.productos_url, {'orden': orden, 'limite': 7})
+
+                self.assertEqual([len(p) for p in paginas], [7, 7, 7, 4])
+                esperado = list(Producto.objects.order_by(*campos).values_list('id_producto', flat=True))
+                self.assertEqual(sum(paginas, []), esperado)
+
+    def test_pagina_n_no_depende_de_offset(self):
+        """
+        CP94: Una página intermedia filtra por el cursor en vez de saltar filas
+        Entrada: orden=nombre_asc (se resuelve en la base de datos)
+        Salida Esperada: La consulta de la página 2 no usa OFFSET
+        """
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        primera = self.client.get(self.productos_url, {'orden': 'nombre_asc', 'limite': 10})
+        siguiente = primera['Link'][1:].split('>')[0]
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get(siguiente)
+
+        sql = ' '.join(c['sql'] for c in consultas.captured_queries).upper()
+        self.assertNotIn('OFFSET', sql)
+        self.assertIn('LIMIT 11', sql)
+
+    def test_listados_con_cursor(self):
+        """
+        CP95: Destacados, categoría y búsqueda también se paginan por cursor
+        """
+        destacados = self.recorrer('/api/destacados/', {'limite': 5})
+        self.assertEqual(sum(len(p) for p in destacados), 13)
+
+        categoria = self.recorrer(f'/api/categoria/{self.categoria.slug}/', {'limite': 10}, clave='productos')
+        self.assertEqual([len(p) for p in categoria], [10, 10, 5])
+
+        busqueda = self.recorrer('/api/buscar/', {'orden': 'precio_desc', 'limite': 10}, clave='resultados')
+        self.assertEqual(len(set(sum(busqueda, []))), 25)
+
+    def test_tamano_de_pagina_acotado(self):
+        """
+        CP96: Sin `limite` se usa la página por defecto y `limite` no puede superar el máximo
+        """
+        response = self.client.get(self.productos_url)
+        self.assertEqual(len(response.data), 24)
+
+        response = self.client.get(self.productos_url, {'limite': 10000})
+        self.assertEqual(len(response.data), 25)
+        self.assertNotIn('Link', response)
+
+    def test_cursor_invalido(self):
+        """
+        CP97: Un cursor alterado o de otro orden se rechaza
+        Salida Esperada: 404 Not Found
+        """
+        primera = self.client.get(self.productos_url, {'orden': 'precio_asc', 'limite': 5})
+        cursor = primera['Link'].split('cursor=')[1].split('>')[0]
+
+        response = self.client.get(self.productos_url, {'orden': 'nombre_asc', 'cursor': cursor})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(self.productos_url, {'cursor': 'no-es-un-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class FacetasProductosTestCase(APITestCase):
+    """
+    RF07 - Filtrar categorías
+    Conteos por faceta calculados sobre el contexto de búsqueda/filtros actual
+    """
+
+    def setUp(self):
+        """Configuración inicial"""
+        self.client = APIClient()
+        self.filtros_url = '/api/productos/filtros_disponibles/'
+
+        self.tecnologia = Categoria.objects.create(nombre='Tecnología', slug=slugify('Tecnología'))
+        self.hogar = Categoria.objects.create(nombre='Hogar', slug=slugify('Hogar'))
+        self.samsung = Marca.objects.create(nombre='Samsung')
+        self.lg = Marca.objects.create(nombre='LG')
+
+        def crear(nombre, sku, precio, categoria, marca, stock=5, oferta=False):
+            return Producto.objects.create(
+                nombre=nombre, sku=sku, precio=Decimal(precio), stock=stock,
+                id_categoria=categoria, id_marca=marca, en_oferta=oferta
+            )
+
+        crear('Televisor Samsung 50', 'FAC-001', '2500000.00', self.tecnologia, self.samsung, oferta=True)
+        crear('Televisor LG 43', 'FAC-002', '1500000.00', self.tecnologia, self.lg, stock=0)
+        crear('Celular Samsung A15', 'FAC-003', '700000.00', self.tecnologia, self.samsung)
+        crear('Nevera LG 300L', 'FAC-004', '1800000.00', self.hogar, self.lg, oferta=True)
+        crear('Microondas Samsung', 'FAC-005', '450000.00', self.hogar, self.samsung)
+
+    @staticmethod
+    def conteos(lista, clave):
+        return {f[clave]: f['cantidad'] for f in lista}
+
+    def test_facetas_del_catalogo(self):
+        """
+        CP98: filtros_disponibles devuelve conteos por faceta
+        Salida Esperada: Conteos por categoría, marca, oferta, disponibilidad y rango de precio
+        """
+        response = self.client.get(self.filtros_url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        facetas = response.data['facetas']
+        self.assertEqual(response.data['total_productos'], 5)
+        self.assertEqual(response.data['productos_oferta'], 2)
+        self.assertEqual(response.data['rangos_precio'], {'min_precio': 450000.0, 'max_precio': 2500000.0})
+        self.assertEqual(
+            self.conteos(facetas['categorias'], 'id_categoria'),
+            {self.tecnologia.id_categoria: 3, self.hogar.id_categoria: 2}
+        )
+        self.assertEqual(self.conteos(facetas['marcas'], 'id_marca'), {self.samsung.id_marca: 3, self.lg.id_marca: 2})
+        self.assertEqual(facetas['oferta'], {'si': 2, 'no': 3})
+        self.assertEqual(facetas['disponible'], {'si': 4, 'no': 1})
+        self.assertEqual(
+            [(r['desde'], r['hasta'], r['cantidad']) for r in facetas['rangos_precio']],
+            [(200000.0, 500000.0, 1), (500000.0, 1000000.0, 1), (1000000.0, 2000000.0, 2), (2000000.0, 5000000.0, 1)]
+        )
+
+    def test_facetas_disyuntivas(self):
+        """
+        CP99: Cada faceta se cuenta con todos los filtros menos el suyo
+        Entrada: categoria=Tecnología y disponible=true
+        Salida Esperada: Las categorías siguen mostrando Hogar; las marcas solo cuentan Tecnología disponible
+        """
+        response = self.client.get(self.filtros_url, {
+            'categoria': self.tecnologia.id_categoria, 'disponible': 'true'
+        })
+
+        facetas = response.data['facetas']
+        self.assertEqual(facetas['total'], 2)
+        self.assertEqual(
+            self.conteos(facetas['categorias'], 'id_categoria'),
+            {self.tecnologia.id_categoria: 2, self.hogar.id_categoria: 2}
+        )
+        self.assertEqual(self.conteos(facetas['marcas'], 'id_marca'), {self.samsung.id_marca: 2})
+        self.assertEqual(facetas['disponible'], {'si': 2, 'no': 1})
+
+    def test_facetas_en_busqueda(self):
+        """
+        CP100: Los resultados de /api/buscar/ traen las facetas de la búsqueda
+        Entrada: q="samsung", precio_max=1000000
+        """
+        response = self.client.get('/api/buscar/', {'q': 'samsung', 'precio_max': '1000000'})
+
+        facetas = response.data['facetas']
+        self.assertEqual(facetas['total'], response.data['total'])
+        self.assertEqual(facetas['total'], 2)
+        self.assertEqual(sum(r['cantidad'] for r in facetas['rangos_precio']), 3)
+        self.assertEqual(self.conteos(facetas['marcas'], 'id_marca'), {self.samsung.id_marca: 2})
+
+    def test_facetas_sin_group_by(self):
+        """
+        CP101: Las facetas salen de memoria y reflejan los cambios del catálogo
+        Salida Esperada: Solo consultas de categorías, marcas y firma del catálogo; conteos al día
+        """
+        self.client.get(self.filtros_url)
+        with self.assertNumQueries(3):
+            self.client.get(self.filtros_url, {'oferta': 'true'})
+
+        Producto.objects.bulk_create([Producto(
+            nombre='Lavadora LG', sku='FAC-006', precio=Decimal('1900000.00'), stock=2,
+            id_categoria=self.hogar, id_marca=self.lg, en_oferta=True
+        )])
+        response = self.client.get(self.filtros_url, {'oferta': 'true'})
+        self.assertEqual(response.data['total_productos'], 3)
+
+
+class CatalogoColumnarTestCase(APITestCase):
+    """
+    RF06/RF07 - Filtros y órdenes del listado resueltos en el catálogo columnar
+    """
+
+    def setUp(self):
+        """Configuración inicial"""
+        self.client = APIClient()
+        self.productos_url = '/api/productos/'
+
+        self.tecnologia = Categoria.objects.create(nombre='Tecnología', slug=slugify('Tecnología'))
+        self.hogar = Categoria.objects.create(nombre='Hogar', slug=slugify('Hogar'))
+        self.marca = Marca.objects.create(nombre='Genérica')
+        Producto.objects.bulk_create([
+            Producto(
+                nombre=f'Artículo {i:02d}',
+                sku=f'COL-{i:03d}',
+                precio=Decimal(10000 * (i % 7) + 500),
+                stock=i % 4,
+                destacado=i % 3 == 0,
+                en_oferta=i % 5 == 0,
+                total_ventas=(i * 7) % 11,
+                calificacion_promedio=Decimal(i % 6) / 2 + Decimal('1.5'),
+                id_categoria=self.tecnologia if i % 2 else self.hogar,
+                id_marca=self.marca if i % 3 else None
+            )
+            for i in range(40)
+        ])
+
+    def listar(self, params):
+        ids = []
+        url = self.productos_url
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids += [p['id_producto'] for p in response.data]
+            url = response.get('Link', '')[1:].split('>')[0] or None
+            params = None
+        return ids
+
+    def test_mismos_resultados_que_la_base_de_datos(self):
+        """
+        CP102: Cada combinación de filtros y orden coincide con el queryset equivalente
+        """
+        combinaciones = [
+            ({'orden': 'precio_desc'}, {}, ('-precio', '-id_producto')),
+            ({'orden': 'mas_vendidos', 'categoria': self.tecnologia.id_categoria},
+             {'id_categoria': self.tecnologia}, ('-total_ventas', '-id_producto')),
+            ({'orden': 'mejor_calificados', 'disponible': 'true', 'precio_max': '40500'},
+             {'stock__gt': 0, 'precio__lte': 40500}, ('-calificacion_promedio', '-id_producto')),
+            ({'orden': 'precio_asc', 'marca': self.marca.id_marca, 'oferta': 'true'},
+             {'id_marca': self.marca, 'en_oferta': True}, ('precio', 'id_producto')),
+            ({'orden': 'nuevos', 'destacados': 'true', 'precio_min': '20000'},
+             {'destacado': True, 'precio__gte': 20000}, ('-created_at', '-id_producto')),
+            ({}, {}, ('id_producto',)),
+        ]
+        for params, filtros, orden in combinaciones:
+            with self.subTest(params=params):
+                esperado = list(
+                    Producto.objects.filter(activo=True, **filtros).order_by(*orden)
+                    .values_list('id_producto', flat=True)
+                )
+                self.assertEqual(self.listar({**params, 'limite': 6}), esperado)
+
+    def test_solo_se_hidrata_la_pagina(self):
+        """
+        CP103: El listado no filtra ni ordena en SQL; solo trae las filas de la página
+        """
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        self.client.get(self.productos_url)
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(self.productos_url, {'orden': 'precio_desc', 'limite': 5})
+
+        productos = [c['sql'] for c in consultas.captured_queries if 'FROM "productos"' in c['sql']]
+        # Firma del catálogo + filas de la página
+        self.assertEqual(len(productos), 2)
+        self.assertNotIn('ORDER BY', productos[1])
+        self.assertEqual(len(response.data), 5)
+
+    def test_cambios_del_catalogo(self):
+        """
+        CP104: La instantánea se actualiza al editar y desactivar productos
+        """
+        barato = Producto.objects.order_by('precio', 'id_producto').first()
+        with self.captureOnCommitCallbacks(execute=True):
+            barato.precio = Decimal('999999.00')
+            barato.save()
+        self.assertEqual(self.listar({'orden': 'precio_desc', 'limite': 1})[0], barato.id_producto)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            barato.activo = False
+            barato.save()
+        self.assertNotIn(barato.id_producto, self.listar({'orden': 'precio_desc'}))
+
+
+class CacheRespuestasTestCase(APITestCase):
+    """
+    RF06/RF07 - Respuestas cacheadas de los endpoints de catálogo
+    """
+
+    def setUp(self):
+        """Configuración inicial"""
+        from django.core.cache import cache
+        from core.cache import cache_respuestas
+
+        cache.clear()
+        cache_respuestas().limpiar()
+        self.client = APIClient()
+        self.destacados_url = '/api/destacados/'
+        self.categoria = Categoria.objects.create(nombre='Tecnología', slug=slugify('Tecnología'))
+        self.marca = Marca.objects.create(nombre='Samsung')
+        self.producto = Producto.objects.create(
+            nombre='Televisor Samsung 55',
+            sku='CACHE-001',
+            precio=Decimal('1500000.00'),
+            stock=5,
+            destacado=True,
+            total_ventas=3,
+            id_categoria=self.categoria,
+            id_marca=self.marca
+        )
+
+    def test_segunda_lectura_sin_consultas(self):
+        """
+        CP105: Una respuesta repetida se sirve del cache sin tocar la base de datos
+        """
+        primera = self.client.get(self.destacados_url)
+        with self.assertNumQueries(0):
+            segunda = self.client.get(self.destacados_url)
+        self.assertEqual(segunda.status_code, status.HTTP_200_OK)
+        self.assertEqual(segunda.data, primera.data)
+
+    def test_parametros_normalizados(self):
+        """
+        CP106: El orden de los parámetros y los valores vacíos no cambian la clave
+        """
+        self.client.get('/api/mas-vendidos/?limite=5&orden=')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/mas-vendidos/', {'limite': '5'})
+        self.assertEqual([p['id_producto'] for p in response.data], [self.producto.id_producto])
+
+    def test_escrituras_invalidan(self):
+        """
+        CP107: Guardar productos, imágenes, categorías o marcas invalida las respuestas
+        """
+        from core.models import ImagenProducto
+
+        self.client.get(self.destacados_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.producto.nombre = 'Televisor Samsung 65'
+            self.producto.save()
+        self.assertEqual(self.client.get(self.destacados_url).data[0]['nombre'], 'Televisor Samsung 65')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ImagenProducto.objects.create(id_producto=self.producto, url_imagen='https://img/tv.jpg')
+        self.assertEqual(len(self.client.get(self.destacados_url).data[0]['imagenes']), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.marca.nombre = 'Samsung Electronics'
+            self.marca.save()
+        self.assertEqual(
+            self.client.get(self.destacados_url).data[0]['marca_nombre'], 'Samsung Electronics'
+        )
+
+    def test_categorias_y_marcas(self):
+        """
+        CP108: Los listados de categorías y marcas se cachean y ven las altas
+        """
+        self.client.get('/api/categorias/')
+        with self.assertNumQueries(0):
+            self.client.get('/api/categorias/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Categoria.objects.create(nombre='Hogar', slug='hogar')
+        nombres = [c['nombre'] for c in self.client.get('/api/categorias/').data]
+        self.assertIn('Hogar', nombres)
+
+        # Las marcas tienen su propia versión: cambiar categorías no las invalida
+        self.client.get('/api/marcas/')
+        with self.captureOnCommitCallbacks(execute=True):
+            Categoria.objects.create(nombre='Audio', slug='audio')
+        with self.assertNumQueries(0):
+            self.client.get('/api/marcas/')
@@ -26,6 +26,7 @@ urlpatterns = [
     path('destacados/', views.productos_destacados, name='productos_destacados'),
     path('ofertas/', views.productos_oferta, name='productos_oferta'),
     path('buscar/', views.buscar_productos, name='buscar_productos'),
+    path('buscar/autocompletar/', views.autocompletar_busqueda, name='autocompletar_busqueda'),
     path('categoria/<str:categoria_slug>/', views.productos_por_categoria, name='productos_por_categoria'),
     path('mas-vendidos/', views.productos_mas_vendidos, name='productos_mas_vendidos'),
     
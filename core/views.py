@@ -1,15 +1,16 @@
 from rest_framework import viewsets, permissions, status, serializers
 from rest_framework.decorators import api_view, permission_classes, action
 from rest_framework.response import Response
-from rest_framework.authtoken.models import Token
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
 from django.contrib.auth import login, logout, update_session_auth_hash
-from django.db import models
-from django.db.models import Q
+from django.db import models, transaction
+from django.db.models import F
 from .models import (
     Producto,
+    ImagenProducto,
     Categoria,
     Marca,
-    Usuario,
     Carrito,
     CarritoItem,
     Favorito,
@@ -19,10 +20,9 @@ from .serializers import (
     ProductoSerializer,
     CategoriaSerializer,
     MarcaSerializer,
-    UsuarioSerializer,
-    LoginSerializer,
     CarritoSerializer,
     CarritoItemSerializer,
+    LoteCarritoSerializer,
     UsuarioRegistroSerializer,
     UsuarioLoginSerializer,
     UsuarioPerfilSerializer,
@@ -33,23 +33,38 @@ from .serializers import (
     CrearResenaSerializer,
     ProductoConResenasSerializer
 )
-from django.utils import timezone
+from .autenticacion import cerrar_credenciales, emitir_credenciales
+from .carrito import (
+    aplicar_lote, carrito_actual, clave_carrito, fusionar_carritos, leer_carrito, olvidar_carrito,
+    sumar_al_carrito,
+)
+from .cache import RespuestaCacheadaMixin, cachear_respuesta, respuesta_revalidada
+from .escritura_diferida import registrar_acceso
+from .limites import DemasiadosIntentos, LimiteLogin, LimiteRegistro
+from .paginacion import PaginacionKeyset
+from .reservas import StockInsuficiente, eliminar_items, reservar_item
+from .busqueda import autocompletar, contar_facetas, filtrar_por_texto, rankear_por_relevancia, sugerir_correccion
 
 # Nota: la implementación completa de `ProductoViewSet` aparece más abajo
 # con filtros y opciones avanzadas; la definición simplificada inicial se
 # eliminó para evitar duplicidad.
 
-class CategoriaViewSet(viewsets.ModelViewSet):
+# Modelos de los que dependen los listados de productos cacheados
+MODELOS_CATALOGO = (Producto, ImagenProducto, Categoria, Marca)
+
+class CategoriaViewSet(RespuestaCacheadaMixin, viewsets.ModelViewSet):
     queryset = Categoria.objects.filter(activa=True) 
     #queryset = Categoria.objects.all()
     serializer_class = CategoriaSerializer
     permission_classes = [permissions.AllowAny]
+    modelos_cache = (Categoria,)
 
-class MarcaViewSet(viewsets.ModelViewSet):
+class MarcaViewSet(RespuestaCacheadaMixin, viewsets.ModelViewSet):
     queryset = Marca.objects.filter(activa=True)
     #queryset = Marca.objects.all()
     serializer_class = MarcaSerializer
     permission_classes = [permissions.AllowAny]
+    modelos_cache = (Marca,)
 
 # API para login
 class AutenticacionViewSet(viewsets.ViewSet):
@@ -92,7 +107,18 @@ class AutenticacionViewSet(viewsets.ViewSet):
                     "url": f"{base_url}/api/auth/logout/",
                     "method": "POST",
                     "description": "Cerrar sesión del usuario",
-                    "authentication_required": True
+                    "authentication_required": True,
+                    "body_optional": {
+                        "refresh": "string (modo JWT)"
+                    }
+                },
+                "refrescar": {
+                    "url": f"{base_url}/api/auth/refrescar/",
+                    "method": "POST",
+                    "description": "Renovar el access token JWT (el refresh token rota en cada uso)",
+                    "body_required": {
+                        "refresh": "string"
+                    }
                 },
                 "perfil": {
                     "url": f"{base_url}/api/auth/perfil/",
@@ -135,52 +161,48 @@ class AutenticacionViewSet(viewsets.ViewSet):
         return Response(endpoints)
     permission_classes = [permissions.AllowAny]
 
-    @action(detail=False, methods=['post'], permission_classes=[permissions.AllowAny])
+    def throttled(self, request, wait):
+        raise DemasiadosIntentos(wait)
+
+    @action(detail=False, methods=['post'], permission_classes=[permissions.AllowAny],
+            authentication_classes=[], throttle_classes=[LimiteRegistro])
     def registro(self, request):
         """Registro de nuevos usuarios - POST /api/auth/registro/"""
         serializer = UsuarioRegistroSerializer(data=request.data)
         if serializer.is_valid():
             user = serializer.save()
             
-            # Crear token de autenticación
-            token, created = Token.objects.get_or_create(user=user)
+            # Crear token de autenticación (clave de authtoken o par JWT según el modo)
+            credenciales = emitir_credenciales(user)
 
-            # Iniciar sesión automáticamente
-            login(request, user)
-            
-            # Migrar carrito de sesión a usuario si existe
-            migrar_carrito_sesion_a_usuario(request, user)
+            # Migrar carrito de sesión e iniciar sesión automáticamente
+            iniciar_sesion(request, user)
             
             return Response({
-                'token': token.key,
+                **credenciales,
                 'user': UsuarioPerfilSerializer(user).data,
                 'message': 'Usuario registrado exitosamente'
             }, status=status.HTTP_201_CREATED)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-    @action(detail=False, methods=['post'], permission_classes=[permissions.AllowAny])
+    # Sin autenticación: un token vencido que el cliente siga enviando no debe impedir entrar
+    @action(detail=False, methods=['post'], permission_classes=[permissions.AllowAny],
+            authentication_classes=[], throttle_classes=[LimiteLogin])
     def login(self, request):
         """Inicio de sesión de usuarios - POST /api/auth/login/"""
         serializer = UsuarioLoginSerializer(data=request.data)
         if serializer.is_valid():
             user = serializer.validated_data['user']
             
-            # Actualizar último acceso
-            user.fecha_ultimo_acceso = timezone.now()
-            user.save()
-            
-            # Crear o obtener token
-            token, created = Token.objects.get_or_create(user=user)
-            
-            # Iniciar sesión
-            login(request, user)
+            # Crear o obtener token (clave de authtoken o par JWT según el modo)
+            credenciales = emitir_credenciales(user)
             
-            # Migrar carrito de sesión a usuario si existe
-            migrar_carrito_sesion_a_usuario(request, user)
+            # Migrar carrito de sesión, iniciar sesión y registrar el último acceso (diferido)
+            iniciar_sesion(request, user)
             
             return Response({
-                'token': token.key,
+                **credenciales,
                 'user': UsuarioPerfilSerializer(user).data,
                 'message': 'Login exitoso'
             })
@@ -190,14 +212,31 @@ class AutenticacionViewSet(viewsets.ViewSet):
     @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def logout(self, request):
         """Cerrar sesión del usuario - POST /api/auth/logout/"""
-        # Eliminar token
-        Token.objects.filter(user=request.user).delete()
+        # Eliminar token (y revocar el access/refresh JWT si se usan)
+        cerrar_credenciales(request.user, request.auth, request.data.get('refresh'))
         
         # Cerrar sesión
         logout(request)
         
         return Response({'message': 'Logout exitoso'})
 
+    # Sin autenticación: el access vencido que el cliente siga enviando no debe impedir renovarlo
+    @action(detail=False, methods=['post'], permission_classes=[permissions.AllowAny],
+            authentication_classes=[])
+    def refrescar(self, request):
+        """Nuevo par JWT a partir del refresh token (que queda invalidado) - POST /api/auth/refrescar/"""
+        serializer = TokenRefreshSerializer(data=request.data)
+        try:
+            serializer.is_valid(raise_exception=True)
+        except TokenError as error:
+            # Sin autenticadores DRF convertiría el 401 en 403: se responde aquí
+            invalido = InvalidToken(error.args[0])
+            return Response(
+                invalido.detail, status=invalido.status_code,
+                headers={'WWW-Authenticate': 'Bearer realm="api"'}
+            )
+        return Response(serializer.validated_data)
+
     @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
     def perfil(self, request):
         """Obtener perfil del usuario actual - GET /api/auth/perfil/"""
@@ -250,47 +289,98 @@ class AutenticacionViewSet(viewsets.ViewSet):
             'message': 'Token válido'
         })
 
+def iniciar_sesion(request, user):
+    """
+    Lo que el login necesita escribir y nada más. El último acceso va al buffer
+    de escritura diferida. La sesión de Django solo se abre si el cliente tiene
+    un carrito anónimo: el API se autentica por token y crear una sesión vacía
+    por login era una escritura inútil.
+    """
+    if clave_carrito(request):
+        # Antes de login(), que rota la clave de sesión con la que se encuentra el carrito
+        migrar_carrito_sesion_a_usuario(request, user)
+        # user_logged_in -> registrar_acceso (ver core.signals)
+        login(request, user)
+    else:
+        registrar_acceso(user)
+
+
 def migrar_carrito_sesion_a_usuario(request, user):
     """Migrar items del carrito asociado a la sesión anónima al carrito del usuario autenticado."""
-    session_id = request.session.session_key
+    session_id = clave_carrito(request)
     if not session_id:
         return
-    carrito_sesion = Carrito.objects.filter(session_id=session_id).first()
-    carrito_usuario, _ = Carrito.objects.get_or_create(id_usuario=user)
-    if carrito_sesion and carrito_sesion != carrito_usuario:
-        for item_sesion in carrito_sesion.items.all():
-            existente = carrito_usuario.items.filter(id_producto=item_sesion.id_producto).first()
-            if existente:
-                existente.cantidad += item_sesion.cantidad
-                existente.save()
-            else:
-                carrito_usuario.items.create(
-                    id_producto=item_sesion.id_producto,
-                    cantidad=item_sesion.cantidad,
-                    precio_unitario=item_sesion.precio_unitario
-                )
-        carrito_sesion.delete()
+    with transaction.atomic():
+        carrito_sesion = Carrito.objects.select_for_update().filter(session_id=session_id).first()
+        if carrito_sesion:
+            carrito_usuario, _ = Carrito.objects.get_or_create(id_usuario=user)
+            if carrito_sesion != carrito_usuario:
+                # Fusión en un número fijo de consultas (ver core.carrito)
+                fusionar_carritos(carrito_sesion, carrito_usuario)
+    olvidar_carrito(request)
+
+# 🔄 Órdenes de los listados de productos (la paginación por cursor desempata por id_producto)
+ORDENES_PRODUCTO = {
+    'precio_asc': ('precio',),
+    'precio_desc': ('-precio',),
+    'nombre': ('nombre',),
+    'nombre_asc': ('nombre',),
+    'nombre_desc': ('-nombre',),
+    'mas_vendidos': ('-total_ventas',),
+    'mejor_calificados': ('-calificacion_promedio',),
+    'nuevos': ('-created_at',),
+}
+
+
+def ordenar_productos(queryset, request):
+    """Aplica el parámetro `orden`; sin orden (o desconocido) se lista por id_producto."""
+    campos = ORDENES_PRODUCTO.get(request.query_params.get('orden'), ())
+    return queryset.order_by(*campos)
 
 # API para productos destacados
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
+@cachear_respuesta(*MODELOS_CATALOGO)
 def productos_destacados(request):
     productos = Producto.objects.filter(destacado=True, activo=True)
-    serializer = ProductoSerializer(productos, many=True)
-    return Response(serializer.data)
+    paginador = PaginacionKeyset()
+    pagina = paginador.paginate_queryset(ordenar_productos(productos, request), request)
+    serializer = ProductoSerializer(pagina, many=True)
+    return paginador.get_paginated_response(serializer.data)
 
 # API para productos en oferta
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
+@cachear_respuesta(*MODELOS_CATALOGO)
 def productos_oferta(request):
     productos = Producto.objects.filter(en_oferta=True, activo=True)
-    serializer = ProductoSerializer(productos, many=True)
-    return Response(serializer.data)
+    paginador = PaginacionKeyset()
+    pagina = paginador.paginate_queryset(ordenar_productos(productos, request), request)
+    serializer = ProductoSerializer(pagina, many=True)
+    return paginador.get_paginated_response(serializer.data)
 
 class ProductoViewSet(viewsets.ModelViewSet):
     queryset = Producto.objects.filter(activo=True) 
     serializer_class = ProductoSerializer
     permission_classes = [permissions.AllowAny]
+    pagination_class = PaginacionKeyset
+
+    def list(self, request, *args, **kwargs):
+        # Con la base de datos degradada se sigue sirviendo la última copia conocida
+        return respuesta_revalidada(
+            'ProductoViewSet.list', MODELOS_CATALOGO, request,
+            lambda: self.listar(request, *args, **kwargs)
+        )
+
+    def listar(self, request, *args, **kwargs):
+        # Filtros y orden numéricos se resuelven en el catálogo columnar; solo se hidrata la página
+        paginador = self.paginator
+        orden = ORDENES_PRODUCTO.get(request.query_params.get('orden'), ())
+        pagina = paginador.paginate_catalogo(request, orden)
+        if pagina is None:
+            return super().list(request, *args, **kwargs)
+        serializer = self.get_serializer(pagina, many=True)
+        return paginador.get_paginated_response(serializer.data)
 
     def get_queryset(self):
         queryset = Producto.objects.filter(activo=True)
@@ -298,12 +388,7 @@ class ProductoViewSet(viewsets.ModelViewSet):
         # 🔍 BÚSQUEDA POR TEXTO (nombre, descripción, SKU)
         search = self.request.query_params.get('search', None)
         if search:
-            queryset = queryset.filter(
-                Q(nombre__icontains=search) |
-                Q(descripcion__icontains=search) |
-                Q(descripcion_corta__icontains=search) |
-                Q(sku__icontains=search)
-            )
+            queryset = filtrar_por_texto(queryset, search)
         
         # 🏷️ FILTRO POR CATEGORÍA
         categoria = self.request.query_params.get('categoria', None)
@@ -336,49 +421,32 @@ class ProductoViewSet(viewsets.ModelViewSet):
         # 📦 FILTRO POR DISPONIBILIDAD
         disponible = self.request.query_params.get('disponible', None)
         if disponible and disponible.lower() == 'true':
-            queryset = queryset.filter(stock__gt=0)
+            # Descontando lo apartado por los carritos (ver core.reservas)
+            queryset = queryset.filter(stock__gt=F('stock_reservado'))
         
         # 🔄 ORDENAMIENTO
-        orden = self.request.query_params.get('orden', None)
-        if orden:
-            if orden == 'precio_asc':
-                queryset = queryset.order_by('precio')
-            elif orden == 'precio_desc':
-                queryset = queryset.order_by('-precio')
-            elif orden == 'nombre_asc':
-                queryset = queryset.order_by('nombre')
-            elif orden == 'nombre_desc':
-                queryset = queryset.order_by('-nombre')
-            elif orden == 'mas_vendidos':
-                queryset = queryset.order_by('-total_ventas')
-            elif orden == 'mejor_calificados':
-                queryset = queryset.order_by('-calificacion_promedio')
-            elif orden == 'nuevos':
-                queryset = queryset.order_by('-created_at')
-        
-        return queryset
+        return ordenar_productos(queryset, self.request)
 
     # 📊 ACCIÓN EXTRA: Obtener estadísticas de filtros disponibles
     @action(detail=False, methods=['get'])
     def filtros_disponibles(self, request):
-        from django.db.models import Min, Max
-        
         categorias = Categoria.objects.filter(activa=True)
         marcas = Marca.objects.filter(activa=True)
         
-        # Calcular rangos de precios
-        precios = Producto.objects.filter(activo=True).aggregate(
-            min_precio=Min('precio'),
-            max_precio=Max('precio')
-        )
+        # Conteos del contexto actual (search + filtros del listado) desde el catálogo columnar
+        facetas = contar_facetas(request.query_params, request.query_params.get('search'))
         
         return Response({
             'categorias': CategoriaSerializer(categorias, many=True).data,
             'marcas': MarcaSerializer(marcas, many=True).data,
-            'rangos_precio': precios,
-            'total_productos': Producto.objects.filter(activo=True).count(),
-            'productos_destacados': Producto.objects.filter(destacado=True, activo=True).count(),
-            'productos_oferta': Producto.objects.filter(en_oferta=True, activo=True).count(),
+            'rangos_precio': {
+                'min_precio': facetas['precio_min'],
+                'max_precio': facetas['precio_max']
+            },
+            'total_productos': facetas['total'],
+            'productos_destacados': facetas['destacados']['si'],
+            'productos_oferta': facetas['oferta']['si'],
+            'facetas': facetas,
         })
     
     # 🔍 BÚSQUEDA AVANZADA
@@ -394,17 +462,15 @@ def buscar_productos(request):
     precio_min = request.query_params.get('precio_min', None)
     precio_max = request.query_params.get('precio_max', None)
     orden = request.query_params.get('orden', 'relevancia')
+    paginador = PaginacionKeyset()
     
     productos = Producto.objects.filter(activo=True)
     
-    # Búsqueda por texto
+    # Búsqueda por texto; si algún término no existe se busca con la corrección sugerida
+    sugerencia = None
     if search:
-        productos = productos.filter(
-            Q(nombre__icontains=search) |
-            Q(descripcion__icontains=search) |
-            Q(descripcion_corta__icontains=search) |
-            Q(sku__icontains=search)
-        )
+        sugerencia = sugerir_correccion(search)
+        productos = filtrar_por_texto(productos, sugerencia or search)
     
     # Aplicar filtros
     if categoria_id:
@@ -420,6 +486,7 @@ def buscar_productos(request):
         productos = productos.filter(precio__lte=precio_max)
     
     # Ordenamiento
+    relevantes = None
     if orden == 'precio_asc':
         productos = productos.order_by('precio')
     elif orden == 'precio_desc':
@@ -429,13 +496,28 @@ def buscar_productos(request):
     elif orden == 'nuevos':
         productos = productos.order_by('-created_at')
     else:  # relevancia por defecto
-        productos = productos.order_by('-destacado', '-total_ventas', '-calificacion_promedio')
+        if search:
+            # BM25 por campos + impulsos de negocio; solo se devuelve el top-k
+            # Mismo tope que las páginas por cursor; sin `limite` válido, el top-k configurado
+            relevantes = rankear_por_relevancia(
+                productos, sugerencia or search, paginador.limite_pedido(request)
+            )
+        if relevantes is None:
+            productos = productos.order_by('-destacado', '-total_ventas', '-calificacion_promedio')
     
-    serializer = ProductoSerializer(productos, many=True)
+    # La relevancia ya es un top-k; los demás órdenes se paginan por cursor
+    if relevantes is not None:
+        resultados, total = relevantes
+    else:
+        resultados, total = paginador.paginate_queryset(productos, request), productos.count()
+    serializer = ProductoSerializer(resultados, many=True)
     
     return Response({
         'resultados': serializer.data,
-        'total': productos.count(),
+        'total': total,
+        'siguiente': paginador.get_next_link(),
+        'sugerencia': sugerencia,
+        'facetas': contar_facetas(request.query_params, sugerencia or search),
         'parametros': {
             'busqueda': search,
             'categoria': categoria_id,
@@ -444,11 +526,27 @@ def buscar_productos(request):
             'precio_max': precio_max,
             'orden': orden
         }
-    })
+    }, headers=paginador.encabezados())
+
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+def autocompletar_busqueda(request):
+    """
+    Sugerencias mientras se escribe: productos, categorías y marcas por prefijo
+    """
+    search = request.query_params.get('q', '')
+    try:
+        limite = int(request.query_params['limite'])
+    except (KeyError, ValueError):
+        # Sin límite válido, el de BUSQUEDA['AUTOCOMPLETAR']; el índice lo acota a 10
+        limite = None
+    sugerencias = autocompletar(search, limite)
+    return Response({'consulta': search, **sugerencias})
 
 # 🏠 PRODUCTOS POR CATEGORÍA
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
+@cachear_respuesta(*MODELOS_CATALOGO, revalidar=True)
 def productos_por_categoria(request, categoria_slug):
     """
     Obtener productos por slug de categoría
@@ -462,20 +560,16 @@ def productos_por_categoria(request, categoria_slug):
         if marca:
             productos = productos.filter(id_marca=marca)
             
-        orden = request.query_params.get('orden', None)
-        if orden == 'precio_asc':
-            productos = productos.order_by('precio')
-        elif orden == 'precio_desc':
-            productos = productos.order_by('-precio')
-        elif orden == 'nombre':
-            productos = productos.order_by('nombre')
-        serializer = ProductoSerializer(productos, many=True)
+        paginador = PaginacionKeyset()
+        pagina = paginador.paginate_queryset(ordenar_productos(productos, request), request)
+        serializer = ProductoSerializer(pagina, many=True)
 
         return Response({
             'categoria': CategoriaSerializer(categoria).data,
             'productos': serializer.data,
-            'total': productos.count()
-        })
+            'total': productos.count(),
+            'siguiente': paginador.get_next_link()
+        }, headers=paginador.encabezados())
 
     except Categoria.DoesNotExist:
         return Response({'error': 'Categoría no encontrada'}, status=status.HTTP_404_NOT_FOUND)
@@ -483,6 +577,7 @@ def productos_por_categoria(request, categoria_slug):
 # 🔥 PRODUCTOS MÁS VENDIDOS
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
+@cachear_respuesta(*MODELOS_CATALOGO)
 def productos_mas_vendidos(request):
     """
     Obtener los productos más vendidos
@@ -502,35 +597,40 @@ def productos_mas_vendidos(request):
 class CarritoViewSet(viewsets.ViewSet):
     permission_classes = [permissions.AllowAny]
     
-    def get_carrito_actual(self, request):
-        """Obtener o crear el carrito actual"""
-        user = request.user if request.user.is_authenticated else None
-        session_id = request.session.session_key
-        
-        if not session_id:
-            request.session.create()
-            session_id = request.session.session_key
-        
-        if user and user.is_authenticated:
-            # Usuario autenticado
-            carrito, created = Carrito.objects.get_or_create(id_usuario=user)
-        else:
-            # Usuario anónimo
-            carrito, created = Carrito.objects.get_or_create(session_id=session_id)
-        
-        return carrito
+    def get_carrito_actual(self, request, crear=False):
+        """Carrito actual; solo se crea (y con él la sesión anónima) si `crear`"""
+        return carrito_actual(request, crear=crear)
 
     def list(self, request):
         """Obtener el carrito actual - GET /api/carrito/"""
-        carrito = self.get_carrito_actual(request)
+        carrito = leer_carrito(request)
+        if carrito is None:
+            # Visitante sin carrito: se responde vacío sin crear sesión ni fila
+            return Response({
+                'id_carrito': None,
+                'id_usuario': request.user.pk if request.user.is_authenticated else None,
+                'session_id': None,
+                'items': [],
+                'total_items': 0,
+                'subtotal': '0.00',
+                'created_at': None
+            })
         serializer = CarritoSerializer(carrito)
         return Response(serializer.data)
 
     def create(self, request):
         """Agregar item al carrito - POST /api/carrito/"""
-        carrito = self.get_carrito_actual(request)
         producto_id = request.data.get('id_producto')
-        cantidad = int(request.data.get('cantidad', 1))
+        try:
+            cantidad = int(request.data.get('cantidad', 1))
+        except (TypeError, ValueError):
+            cantidad = 0
+        if cantidad < 1:
+            # Sin esto una cantidad negativa liberaba stock que nadie había apartado
+            return Response(
+                {'error': 'La cantidad a agregar debe ser un entero mayor o igual a 1'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
         try:
             producto = Producto.objects.get(id_producto=producto_id, activo=True)
@@ -540,27 +640,15 @@ class CarritoViewSet(viewsets.ViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        # Verificar stock
-        if producto.stock < cantidad:
+        try:
+            # Incremento atómico del item y reserva del stock (ver core.carrito)
+            item = sumar_al_carrito(request, producto, cantidad)
+        except StockInsuficiente as error:
             return Response(
-                {'error': f'Stock insuficiente. Disponible: {producto.stock}'}, 
+                {'error': f'Stock insuficiente. Disponible: {error.disponibles[producto.pk]}'}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Buscar o crear item
-        item, created = CarritoItem.objects.get_or_create(
-            id_carrito=carrito,
-            id_producto=producto,
-            defaults={
-                'cantidad': cantidad,
-                'precio_unitario': producto.precio
-            }
-        )
-        
-        if not created:
-            item.cantidad += cantidad
-            item.save()
-        
         serializer = CarritoItemSerializer(item)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -576,21 +664,31 @@ class CarritoViewSet(viewsets.ViewSet):
         
         nueva_cantidad = request.data.get('cantidad')
         if nueva_cantidad is not None:
-            nueva_cantidad = int(nueva_cantidad)
-            
-            # Verificar stock
-            if item.id_producto.stock < nueva_cantidad:
+            try:
+                nueva_cantidad = int(nueva_cantidad)
+            except (TypeError, ValueError):
                 return Response(
-                    {'error': f'Stock insuficiente. Disponible: {item.id_producto.stock}'}, 
+                    {'error': 'La cantidad debe ser un número entero'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
             if nueva_cantidad <= 0:
+                # La señal post_delete libera la reserva
                 item.delete()
                 return Response({'message': 'Item eliminado del carrito'})
             
-            item.cantidad = nueva_cantidad
-            item.save()
+            # Apartar o liberar la diferencia de stock
+            try:
+                with transaction.atomic():
+                    item = CarritoItem.objects.select_for_update().get(id_item=item.id_item)
+                    reservar_item(item, nueva_cantidad)
+                    item.cantidad = nueva_cantidad
+                    item.save(update_fields=['cantidad', 'reservado', 'reserva_expira', 'updated_at'])
+            except StockInsuficiente as error:
+                return Response(
+                    {'error': f'Stock insuficiente. Disponible: {error.disponibles[item.id_producto_id]}'}, 
+                    status=status.HTTP_400_BAD_REQUEST
+                )
         
         serializer = CarritoItemSerializer(item)
         return Response(serializer.data)
@@ -607,11 +705,25 @@ class CarritoViewSet(viewsets.ViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
 
+    @action(detail=False, methods=['post'])
+    def lote(self, request):
+        """Agregar, fijar o quitar varios productos a la vez (todo o nada) - POST /api/carrito/lote/"""
+        serializer = LoteCarritoSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        errores = aplicar_lote(request, serializer.validated_data['operaciones'])
+        if errores:
+            return Response(
+                {'error': 'No se aplicó ningún cambio', 'detalle': errores},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return self.list(request)
+
     @action(detail=False, methods=['delete'])
     def vaciar(self, request):
         """Vaciar carrito - DELETE /api/carrito/vaciar/"""
         carrito = self.get_carrito_actual(request)
-        carrito.items.all().delete()
+        if carrito is not None:
+            eliminar_items(carrito.items.all())
         return Response({'message': 'Carrito vaciado'})
 
 # Vistas simples del carrito
@@ -794,7 +906,7 @@ class ResenaViewSet(viewsets.ModelViewSet):
             
             producto.calificacion_promedio = round(calificacion_promedio, 1)
             producto.total_resenas = reseñas_aprobadas.count()
-            producto.save()
+            producto.save(update_fields=['calificacion_promedio', 'total_resenas', 'updated_at'])
             
             return Response({'message': 'Reseña aprobada exitosamente'})
             